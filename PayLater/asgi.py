@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PayLater.settings')
+# * sync code runs on a new thread per request here, a persistent connection would never be reused
+# * and just stay open; reuse connections with DB_POOL instead
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
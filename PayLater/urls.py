@@ -8,4 +8,5 @@ urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('accounts/', include('accounts.urls')),
     path('transactions/', include('transactions.urls')),
+    path('api/', include('api.urls')),
 ]
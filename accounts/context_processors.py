@@ -0,0 +1,3 @@
+def account(request):
+    # * the same lazy object CurrentAccountMiddleware put on the request, so templates add no query of their own
+    return {'account': getattr(request, 'account', None)}
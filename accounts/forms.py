@@ -3,7 +3,9 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from .constants import GENDER_TYPE, ACCOUNT_TYPE
 from django import forms
+from django.db import transaction
 from .models import UserBankAccount, UserAddress
+from .numbers import next_account_number
 
 class UserRegistrationForm(UserCreationForm):
     birth_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
@@ -21,31 +23,33 @@ class UserRegistrationForm(UserCreationForm):
     def save(self, commit=True):
         user =  super().save(commit=False)
         if commit == True:
-            user.save() #* saving user model data
+            #* number ta transaction er baire nite hoy, ei block rollback holeo onno process same number pay na
+            account_no = next_account_number()
             street = self.cleaned_data.get('street')
             city = self.cleaned_data.get('city')
             post_code = self.cleaned_data.get('post_code')
             country = self.cleaned_data.get('country')
-
-            UserAddress.objects.create(
-                user = user,
-                street = street,
-                city = city,
-                post_code = post_code,
-                country = country
-            )
-
             birth_date = self.cleaned_data.get('birth_date')
             gender = self.cleaned_data.get('gender')
             account_type = self.cleaned_data.get('account_type')
 
-            UserBankAccount.objects.create(
-                user = user,
-                account_type = account_type,
-                gender = gender,
-                birth_date = birth_date,
-                account_no = 10000 + user.id
-            )
+            #* user, address ar account ekshathe save hobe, na hoy kichui na
+            with transaction.atomic():
+                user.save() #* saving user model data
+                UserAddress.objects.create(
+                    user = user,
+                    street = street,
+                    city = city,
+                    post_code = post_code,
+                    country = country
+                )
+                UserBankAccount.objects.create(
+                    user = user,
+                    account_type = account_type,
+                    gender = gender,
+                    birth_date = birth_date,
+                    account_no = account_no
+                )
         return user
         
     def __init__(self, *args, **kwargs):
@@ -107,14 +111,22 @@ class UserUpdateForm(forms.ModelForm):
         if commit:
             user.save()
 
-            user_account, created = UserBankAccount.objects.get_or_create(user=user) 
+            #* request.account thakle sei object tai bodlay, tai save er pore request e purono data thake na
+            try:
+                user_account = user.account
+            except UserBankAccount.DoesNotExist:
+                user_account, created = UserBankAccount.objects.get_or_create(user=user) 
             #* jodi account thake taile seta jabe user_account ar jodi account na thake taile create hobe ar seta created er moddhe jabe
-            user_address, created = UserAddress.objects.get_or_create(user=user) 
+            try:
+                user_address = user.address
+            except UserAddress.DoesNotExist:
+                user_address, created = UserAddress.objects.get_or_create(user=user) 
 
             user_account.account_type = self.cleaned_data['account_type']
             user_account.gender = self.cleaned_data['gender']
             user_account.birth_date = self.cleaned_data['birth_date']
-            user_account.save()
+            #* shudhu profile er field, balance/open_loans ledger chhara keu likhbe na
+            user_account.save(update_fields=['account_type', 'gender', 'birth_date'])
 
             user_address.street = self.cleaned_data['street']
             user_address.city = self.cleaned_data['city']
@@ -0,0 +1,57 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.models import User
+from django.utils.functional import SimpleLazyObject
+from .models import UserBankAccount
+
+
+def load_account(user):
+    """
+    The user's bank account with its user and address, in one query. The rows
+    are cached on the given user too, so request.user.account and
+    request.user.address hand back the same objects instead of querying again.
+    """
+    if not user.is_authenticated:
+        return None
+    account = UserBankAccount.objects.select_related('user__address').filter(user_id=user.pk).first()
+    if account is None:
+        return None
+    try:
+        address = account.user.address
+    except User.address.RelatedObjectDoesNotExist:
+        address = None
+    user.account = account
+    User.address.related.set_cached_value(user, address)
+    return account
+
+
+def refresh_account(request):
+    """
+    Re-read the balance of the request's account, for when a ledger call was
+    refused because another request changed it in the meantime.
+    """
+    account = request.account
+    if account:
+        account.refresh_from_db(fields=['balance', 'open_loans'])
+    return account
+
+
+class CurrentAccountMiddleware:
+    """
+    Puts the logged in user's bank account on request.account, loaded on first
+    use and then shared by views, forms and templates for the rest of the
+    request. transactions.ledger updates the balance on the object it is given,
+    so passing request.account keeps it in step with the db after a mutation.
+    Has to come after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # * async views load the account with the async ORM and overwrite this before it is touched
+        request.account = SimpleLazyObject(lambda: load_account(request.user))
+        return self.get_response(request)
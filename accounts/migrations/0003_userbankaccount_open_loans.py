@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_rename_userbackaccount_userbankaccount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbankaccount',
+            name='open_loans',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:41
+
+from django.db import migrations, models
+from django.db.models import Max
+
+FIRST_NUMBER = 100000
+
+
+def create_sequence(apps, schema_editor):
+    # * continue after the existing 10000 + user.id numbers, never below FIRST_NUMBER
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    AccountNumberSequence = apps.get_model('accounts', 'AccountNumberSequence')
+    db = schema_editor.connection.alias
+    highest = UserBankAccount.objects.using(db).aggregate(highest=Max('account_no'))['highest'] or 0
+    AccountNumberSequence.objects.using(db).create(pk=1, next_value=max(FIRST_NUMBER, highest + 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
@@ -10,6 +10,8 @@ class UserBankAccount(models.Model):
     gender = models.CharField(max_length=15, choices=GENDER_TYPE)
     initial_deposit_date = models.DateField(auto_now_add=True)
     balance = models.DecimalField(default=0, max_digits=12, decimal_places=2)
+    # * approved and not yet repaid loans, kept by transactions.ledger so the loan limit is one read
+    open_loans = models.PositiveIntegerField(default=0)
  
     #* its called str dunder method
     def __str__(self):
@@ -23,4 +25,8 @@ class UserAddress(models.Model):
     country = models.CharField(max_length=100)
 
     def __str__(self):
-        return f"Address of {self.user.username}"
\ No newline at end of file
+        return f"Address of {self.user.username}"
+
+class AccountNumberSequence(models.Model):
+    # * a single row; accounts.numbers reserves blocks of account numbers from it
+    next_value = models.BigIntegerField()
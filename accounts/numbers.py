@@ -0,0 +1,59 @@
+import os
+import threading
+from django.db import transaction
+from django.db.models import F, Max
+from .models import AccountNumberSequence, UserBankAccount
+
+#* Account numbers come from one counter row, but a process never goes to it
+#* for a single number: it reserves a block and hands numbers out of it from
+#* memory. Numbers left in a block when the process exits are never used, so
+#* account numbers are unique and increasing but can have gaps.
+
+BLOCK_SIZE = 50
+FIRST_NUMBER = 100000
+
+
+def _create_sequence():
+    # * normally made by migration 0004, this covers a flushed table
+    highest = UserBankAccount.objects.aggregate(highest=Max('account_no'))['highest'] or 0
+    AccountNumberSequence.objects.get_or_create(pk=1, defaults={'next_value': max(FIRST_NUMBER, highest + 1)})
+
+
+def reserve_block(count):
+    """Reserve count numbers in one short transaction. Returns them as a range."""
+    with transaction.atomic():
+        # * the update takes the row lock, the read after it sees our own write
+        if not AccountNumberSequence.objects.filter(pk=1).update(next_value=F('next_value') + count):
+            _create_sequence()
+            AccountNumberSequence.objects.filter(pk=1).update(next_value=F('next_value') + count)
+        end = AccountNumberSequence.objects.values_list('next_value', flat=True).get(pk=1)
+    return range(end - count, end)
+
+
+class AccountNumberAllocator:
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.block = iter(())
+        self.pid = None
+
+    def next(self):
+        if transaction.get_connection().in_atomic_block:
+            # * the reservation would roll back with the caller's transaction, so keep nothing from it
+            return reserve_block(1).start
+        with self.lock:
+            # * a forked worker must not hand out numbers from its parent's block
+            if self.pid != os.getpid():
+                self.block, self.pid = iter(()), os.getpid()
+            number = next(self.block, None)
+            if number is None:
+                self.block = iter(reserve_block(self.block_size))
+                number = next(self.block)
+            return number
+
+
+allocator = AccountNumberAllocator()
+
+
+def next_account_number():
+    return allocator.next()
@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+from datetime import date
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from .constants import ACCOUNT_TYPE, GENDER_TYPE
+from .models import UserBankAccount, UserAddress
+from .numbers import reserve_block
+
+CHUNK_SIZE = 1000
+FIELDS = [
+    'username', 'email', 'first_name', 'last_name', 'birth_date', 'gender', 'account_type',
+    'street', 'city', 'post_code', 'country',
+]
+OPTIONAL = {'first_name', 'last_name'}
+
+OK = 'ok'
+INVALID_ROW = 'invalid_row'
+DUPLICATE_USERNAME = 'duplicate_username'
+
+
+class CustomerRow:
+    def __init__(self, line, data):
+        self.line = line
+        self.data = data
+        self.account_no = None
+        self.status = None
+        self.error = ''
+
+    def fail(self, status, error):
+        self.status = status
+        self.error = error
+
+    def as_dict(self):
+        return {
+            'line': self.line,
+            'username': self.data.get('username', ''),
+            'account_no': self.account_no or '',
+            'status': self.status,
+            'error': self.error,
+        }
+
+
+def parse_customer_file(fileobj, fmt):
+    """
+    Read customers from a CSV file with a header row of FIELDS, or from JSONL
+    objects with those keys. Bad lines stay in as rows with an error status.
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8') if isinstance(fileobj.read(0), bytes) else fileobj
+    rows = []
+    if fmt == 'jsonl':
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                data = json.loads(raw)
+                if not isinstance(data, dict):
+                    raise TypeError('expected an object')
+                rows.append(CustomerRow(line, data))
+            except (ValueError, TypeError) as exc:
+                row = CustomerRow(line, {})
+                row.fail(INVALID_ROW, f'Could not parse line: {exc}')
+                rows.append(row)
+    else:
+        # * line 1 is the header
+        for line, record in enumerate(csv.DictReader(text), start=2):
+            rows.append(CustomerRow(line, record))
+    return rows
+
+
+def _clean(row):
+    data = {key: str(row.data.get(key) or '').strip() for key in FIELDS}
+    missing = [key for key in FIELDS if not data[key] and key not in OPTIONAL]
+    if missing:
+        raise ValueError(f'Missing {", ".join(missing)}')
+    data['birth_date'] = date.fromisoformat(data['birth_date'])
+    data['post_code'] = int(data['post_code'])
+    if data['gender'] not in dict(GENDER_TYPE):
+        raise ValueError(f'Unknown gender {data["gender"]}')
+    if data['account_type'] not in dict(ACCOUNT_TYPE):
+        raise ValueError(f'Unknown account type {data["account_type"]}')
+    return data
+
+
+def onboard(rows, chunk_size=CHUNK_SIZE):
+    """
+    Create a user, address and bank account for every valid row with
+    bulk_create, chunk_size customers per transaction. Account numbers for a
+    chunk are reserved as one block. Users get an unusable password and set
+    their own through password reset. Returns the rows with their final status.
+    """
+    seen = set()
+    for row in rows:
+        if row.status:
+            continue
+        try:
+            row.data = _clean(row)
+        except (ValueError, TypeError) as exc:
+            row.fail(INVALID_ROW, str(exc))
+            continue
+        if row.data['username'] in seen:
+            row.fail(DUPLICATE_USERNAME, 'Username appears earlier in the file')
+        seen.add(row.data['username'])
+
+    pending = [row for row in rows if not row.status]
+    for start in range(0, len(pending), chunk_size):
+        _create_chunk(pending[start:start + chunk_size])
+    return rows
+
+
+def _create_chunk(chunk):
+    taken = set(User.objects.filter(username__in=[row.data['username'] for row in chunk]).values_list('username', flat=True))
+    for row in chunk:
+        if row.data['username'] in taken:
+            row.fail(DUPLICATE_USERNAME, 'Username already exists')
+    chunk = [row for row in chunk if not row.status]
+    if not chunk:
+        return
+
+    with transaction.atomic():
+        numbers = reserve_block(len(chunk))
+        users = User.objects.bulk_create([
+            User(
+                username=row.data['username'], email=row.data['email'], password=make_password(None),
+                first_name=row.data['first_name'], last_name=row.data['last_name'],
+            )
+            for row in chunk
+        ])
+        if users and users[0].pk is None:
+            # * backends that can not return ids from a bulk insert
+            ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+            for user in users:
+                user.pk = ids[user.username]
+        UserAddress.objects.bulk_create([
+            UserAddress(
+                user=user, street=row.data['street'], city=row.data['city'],
+                post_code=row.data['post_code'], country=row.data['country'],
+            )
+            for row, user in zip(chunk, users)
+        ])
+        UserBankAccount.objects.bulk_create([
+            UserBankAccount(
+                user=user, account_no=number, account_type=row.data['account_type'],
+                gender=row.data['gender'], birth_date=row.data['birth_date'],
+            )
+            for row, user, number in zip(chunk, users, numbers)
+        ])
+    for row, number in zip(chunk, numbers):
+        row.account_no = number
+        row.status = OK
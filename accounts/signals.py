@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.account_cache import invalidate_account
+from .models import UserBankAccount
+
+
+@receiver(post_save, sender=UserBankAccount)
+@receiver(post_delete, sender=UserBankAccount)
+def invalidate_account_cache(sender, instance, **kwargs):
+    invalidate_account(instance.user_id)
@@ -1,3 +1,186 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from core.testing import QueryBudgetMixin
+from transactions.ledger import withdraw
+from . import urls
+from .forms import UserUpdateForm
+from .middleware import CurrentAccountMiddleware
+from .models import UserAddress, UserBankAccount
+from .numbers import AccountNumberAllocator, FIRST_NUMBER
+from .onboarding import parse_customer_file, onboard, OK, INVALID_ROW, DUPLICATE_USERNAME
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    registration = {
+        'username': 'alice', 'first_name': 'Alice', 'last_name': 'A', 'email': 'alice@example.com',
+        'password1': 'a-long-Passw0rd', 'password2': 'a-long-Passw0rd',
+        'birth_date': '1990-01-01', 'gender': 'Female', 'account_type': 'Savings',
+        'street': 'Road 1', 'city': 'Dhaka', 'post_code': 1000, 'country': 'BD',
+    }
+
+    def test_every_url_declares_a_budget(self):
+        self.assertAllUrlsBudgeted(urls.urlpatterns)
+
+    def test_account_flows(self):
+        response = self.client.post(reverse('registration'), self.registration)
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget(response)
+        self.assertTrue(User.objects.filter(username='alice', account__isnull=False).exists())
+
+        for name in ['profile', 'pass_change']:
+            self.assertWithinQueryBudget(self.client.get(reverse(name)))
+
+        profile = {key: self.registration[key] for key in [
+            'first_name', 'last_name', 'email', 'birth_date', 'gender', 'account_type',
+            'street', 'city', 'post_code', 'country',
+        ]}
+        self.assertWithinQueryBudget(self.client.post(reverse('profile'), profile))
+
+        self.client.logout()
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'a-long-Passw0rd'})
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget(response)
+
+
+class CurrentAccountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', account_no=12345,
+            birth_date=date(1990, 1, 1), gender='Female', balance=500,
+        )
+        UserAddress.objects.create(user=self.user, street='Road 1', city='Dhaka', post_code=1000, country='BD')
+
+    def request_for(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        CurrentAccountMiddleware(lambda request: HttpResponse())(request)
+        return request
+
+    def test_account_and_address_load_once(self):
+        user = User.objects.get(pk=self.user.pk)
+        request = self.request_for(user)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.account.account_no, 12345)
+            self.assertIs(user.account, request.account._wrapped)
+            self.assertEqual(user.address.city, 'Dhaka')
+            self.assertIs(request.account.user, user)
+
+    def test_anonymous_and_accountless_users(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(self.request_for(AnonymousUser()).account)
+        staff = User.objects.create_user(username='staff')
+        self.assertFalse(self.request_for(staff).account)
+
+    def test_pages_show_the_balance_after_a_mutation(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('deposit_money'), {'amount': 250, 'transaction_type': 1}, follow=True)
+        self.assertEqual(response.context['account'].balance, Decimal(750))
+        self.assertContains(response, 'balance : 750')
+
+    def test_refused_withdrawal_shows_the_current_balance(self):
+        UserBankAccount.objects.filter(pk=self.account.pk).update(balance=1000)
+        self.client.force_login(self.user)
+
+        def spent_elsewhere(account, amount):
+            # * another request spends the money between clean_amount and the ledger call
+            UserBankAccount.objects.filter(pk=account.pk).update(balance=10)
+            return withdraw(account, amount)
+
+        with mock.patch('transactions.views.withdraw', side_effect=spent_elsewhere):
+            response = self.client.post(reverse('withdraw_money'), {'amount': 600, 'transaction_type': 2})
+        self.assertContains(response, 'You can not withdraw more than your account balance')
+        self.assertEqual(response.context['account'].balance, Decimal(10))
+
+    def test_profile_update_keeps_money_moved_meanwhile(self):
+        user = User.objects.get(pk=self.user.pk)
+        request = self.request_for(user)
+        bool(request.account)
+        # * a deposit commits after the view loaded the account
+        UserBankAccount.objects.filter(pk=self.account.pk).update(balance=900, open_loans=1)
+        form = UserUpdateForm({
+            'username': 'alice', 'first_name': 'Alice', 'last_name': 'A', 'email': 'alice@example.com',
+            'account_type': 'Current', 'gender': 'Female', 'birth_date': '1990-01-01',
+            'street': 'Road 2', 'city': 'Dhaka', 'post_code': 1000, 'country': 'BD',
+        }, instance=user)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.account_type, self.account.balance, self.account.open_loans), ('Current', Decimal(900), 1))
+
+
+class RegistrationTests(TestCase):
+    registration = QueryBudgetTests.registration
+
+    def test_account_number_does_not_follow_the_user_id(self):
+        self.client.post(reverse('registration'), self.registration)
+        account = UserBankAccount.objects.get(user__username='alice')
+        self.assertGreaterEqual(account.account_no, FIRST_NUMBER)
+        self.assertNotEqual(account.account_no, 10000 + account.user_id)
+
+    def test_registration_is_all_or_nothing(self):
+        with mock.patch('accounts.forms.UserBankAccount.objects.create', side_effect=IntegrityError('boom')):
+            with self.assertRaises(IntegrityError):
+                self.client.post(reverse('registration'), self.registration)
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        self.assertFalse(UserAddress.objects.exists())
+
+
+class AccountNumberAllocatorTests(TransactionTestCase):
+    def test_numbers_come_from_reserved_blocks(self):
+        first = AccountNumberAllocator(block_size=3)
+        second = AccountNumberAllocator(block_size=3)
+        numbers = [first.next(), second.next(), first.next(), first.next(), first.next()]
+        self.assertEqual(len(set(numbers)), 5)
+        self.assertEqual(numbers[:4], [FIRST_NUMBER, FIRST_NUMBER + 3, FIRST_NUMBER + 1, FIRST_NUMBER + 2])
+        # * the rest of a block costs no queries
+        with self.assertNumQueries(0):
+            second.next()
+            second.next()
+
+
+class OnboardingTests(TestCase):
+    csv = (
+        'username,email,first_name,last_name,birth_date,gender,account_type,street,city,post_code,country\n'
+        'c1,c1@example.com,C,One,1990-01-01,Female,Savings,Road 1,Dhaka,1000,BD\n'
+        'c2,c2@example.com,,,1991-02-03,Male,Current,Road 2,Dhaka,1000,BD\n'
+        'c3,c3@example.com,,,not-a-date,Male,Current,Road 3,Dhaka,1000,BD\n'
+        'taken,t@example.com,,,1990-01-01,Male,Savings,Road 4,Dhaka,1000,BD\n'
+        'c1,again@example.com,,,1990-01-01,Male,Savings,Road 5,Dhaka,1000,BD\n'
+        'c4,c4@example.com,,,1990-01-01,Male,Savings,Road 6,Dhaka,1000,BD\n'
+    )
+
+    def test_bulk_onboarding(self):
+        User.objects.create_user(username='taken')
+        rows = parse_customer_file(io.StringIO(self.csv), 'csv')
+        # * per chunk: taken usernames, the number block (update, read), users, addresses, accounts and two savepoints each
+        with self.assertNumQueries(10):
+            rows = onboard(rows, chunk_size=10)
+        self.assertEqual(
+            [row.status for row in rows],
+            [OK, OK, INVALID_ROW, DUPLICATE_USERNAME, DUPLICATE_USERNAME, OK],
+        )
+        numbers = [row.account_no for row in rows if row.status == OK]
+        self.assertEqual(numbers, list(range(numbers[0], numbers[0] + 3)))
+        account = UserBankAccount.objects.select_related('user__address').get(user__username='c2')
+        self.assertEqual((account.account_type, account.user.address.street), ('Current', 'Road 2'))
+        self.assertFalse(account.user.has_usable_password())
+
+    def test_command_reports_every_row(self):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write(self.csv)
+            f.flush()
+            call_command('onboard_customers', f.name, stdout=out, stderr=io.StringIO())
+        self.assertEqual(len(out.getvalue().strip().splitlines()), 7)
+        self.assertEqual(UserBankAccount.objects.count(), 4)
 
-# Create your tests here.
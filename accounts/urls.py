@@ -1,10 +1,13 @@
 from django.urls import path
+from core.middleware import query_budget
+from core.ratelimit import rate_limit
 from .import views
 
+#* registration: account number block ar atomic save er savepoint gulo test e count hoy
 urlpatterns = [
-    path('registration/', views.UserRegistrationView.as_view(), name='registration'),
-    path('login/', views.UserLoginView.as_view(), name='login'),
-    path('logout/', views.UserLogoutView.as_view(), name='logout'),
-    path('profile/', views.UserBankAccountUpdateView.as_view(), name='profile'),
-    path('pass_change/', views.PasswordUpdateView.as_view(), name='pass_change'),
+    path('registration/', rate_limit(query_budget(views.UserRegistrationView.as_view(), 20), '5/h'), name='registration'),
+    path('login/', rate_limit(query_budget(views.UserLoginView.as_view(), 10), '5/m'), name='login'),
+    path('logout/', query_budget(views.UserLogoutView.as_view(), 6), name='logout'),
+    path('profile/', query_budget(views.UserBankAccountUpdateView.as_view(), 12), name='profile'),
+    path('pass_change/', rate_limit(query_budget(views.PasswordUpdateView.as_view(), 10), '5/m'), name='pass_change'),
 ]
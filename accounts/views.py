@@ -10,7 +10,7 @@ from django.shortcuts import redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
 from django.contrib import messages
-from transactions.views import send_transaction_email
+from transactions.emails import send_transaction_email
 
 
 class UserRegistrationView(FormView):
@@ -39,6 +39,11 @@ class UserLogoutView(LogoutView):
 class UserBankAccountUpdateView(View):
     template_name = 'accounts/profile.html'
 
+    def dispatch(self, request, *args, **kwargs):
+        #* account ar address ek query te request.user e cache hoy, form duitai pore
+        bool(request.account)
+        return super().dispatch(request, *args, **kwargs)
+
     def get(self, request):
         form = UserUpdateForm(instance=request.user)
         return render(request, self.template_name, {'form': form})
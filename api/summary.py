@@ -0,0 +1,60 @@
+from django.db.models import Count, Q
+from accounts.models import UserBankAccount
+from core.account_cache import cached_for_account
+from transactions.constants import LOAN_STATUS
+from transactions.models import Transactions, TransactionArchive, Loan
+
+RECENT_LIMIT = 20
+
+
+def _transaction(row):
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'].isoformat(),
+        'type': row['transaction_type'],
+        'amount': str(row['amount']),
+        'balance_after_transaction': str(row['balance_after_transaction']),
+    }
+
+
+def _loan(row):
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'].isoformat(),
+        'amount': str(row['amount']),
+        'status': row['status'],
+    }
+
+
+def build_summary(user_id):
+    account = UserBankAccount.objects.select_related('user').get(user_id=user_id)
+    history = Transactions.objects.filter(account=account).order_by('-timestamp', '-id')
+    fields = ['id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction']
+    recent = list(history.values(*fields)[:RECENT_LIMIT])
+    if len(recent) < RECENT_LIMIT:
+        # * a quiet account's last rows may be archived already
+        archived = TransactionArchive.objects.filter(account=account).order_by('-timestamp', '-id')
+        recent += archived.values(*fields)[:RECENT_LIMIT - len(recent)]
+    loans = Loan.objects.filter(account=account).order_by('-timestamp', '-id')
+    counts = loans.aggregate(**{
+        status: Count('id', filter=Q(status=status)) for status, label in LOAN_STATUS
+    })
+    return {
+        'account': {
+            'username': account.user.username,
+            'account_no': account.account_no,
+            'account_type': account.account_type,
+            'balance': str(account.balance),
+            'initial_deposit_date': account.initial_deposit_date.isoformat(),
+        },
+        'transactions': [_transaction(row) for row in recent],
+        'loans': {
+            'open': account.open_loans,
+            'counts': counts,
+            'recent': [_loan(row) for row in loans.values('id', 'timestamp', 'amount', 'status')[:RECENT_LIMIT]],
+        },
+    }
+
+
+def account_summary(user_id):
+    return cached_for_account(user_id, 'api_summary', lambda: build_summary(user_id))
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from core.testing import QueryBudgetMixin
+from transactions.ledger import deposit, transfer, request_loan, approve_loan
+from transactions.tests import make_account
+from .urls import urlpatterns
+
+
+class AccountSummaryApiTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice', 1000)
+        self.bob = make_account('bob', 0)
+        self.client.force_login(self.alice.user)
+
+    def test_summary(self):
+        deposit(self.alice, 200)
+        request_loan(self.alice, Decimal(50))
+        response = self.client.get(reverse('api_summary'))
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual(data['account']['balance'], '1200.00')
+        self.assertEqual(len(data['transactions']), 1)
+        self.assertEqual(data['loans']['counts'], {'requested': 1, 'approved': 0, 'repaid': 0, 'rejected': 0})
+        self.assertEqual(self.client.get(reverse('api_loans')).json()['recent'][0]['status'], 'requested')
+
+    def test_revalidation_costs_no_account_queries(self):
+        response = self.client.get(reverse('api_account'))
+        etag = response['ETag']
+        # * only the session and the user are loaded, the summary comes from the cached version
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_account'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('api_account'), headers={'If-Modified-Since': response['Last-Modified']}
+            )
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse('api_transactions')).status_code, 200)
+
+    def test_money_movements_invalidate(self):
+        etag = self.client.get(reverse('api_account'))['ETag']
+        transfer(self.alice, self.bob, Decimal(300))
+        response = self.client.get(reverse('api_account'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['balance'], '700.00')
+
+        etag = response['ETag']
+        loan = request_loan(self.alice, Decimal(100))
+        approve_loan(loan)
+        response = self.client.get(reverse('api_account'), headers={'If-None-Match': etag})
+        self.assertEqual(response.json()['balance'], '800.00')
+
+        etag = response['ETag']
+        self.alice.account_type = 'Current'
+        self.alice.save()
+        response = self.client.get(reverse('api_account'), headers={'If-None-Match': etag})
+        self.assertEqual(response.json()['account_type'], 'Current')
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_summary')).status_code, 403)
+
+    def test_all_urls_budgeted(self):
+        self.assertAllUrlsBudgeted(urlpatterns)
@@ -0,0 +1,11 @@
+from django.urls import path
+from core.middleware import query_budget
+from .views import AccountSummaryView
+
+#* 304 hole shudhu session ar user er query, cache miss hole summary er 4 ta beshi (history 20 tar kom hole archive er ekta)
+urlpatterns = [
+    path("summary/", query_budget(AccountSummaryView.as_view(), 7), name="api_summary"),
+    path("account/", query_budget(AccountSummaryView.as_view(section='account'), 7), name="api_account"),
+    path("transactions/", query_budget(AccountSummaryView.as_view(section='transactions'), 7), name="api_transactions"),
+    path("loans/", query_budget(AccountSummaryView.as_view(section='loans'), 7), name="api_loans"),
+]
@@ -0,0 +1,42 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from core.account_cache import account_version, version_modified
+from .summary import account_summary
+
+
+def _version(request):
+    if not request.user.is_authenticated:
+        return None
+    if not hasattr(request, 'account_version'):
+        request.account_version = account_version(request.user.pk)
+    return request.account_version
+
+
+def summary_etag(request, *args, **kwargs):
+    version = _version(request)
+    return f'{request.user.pk}-{version}' if version else None
+
+
+def summary_last_modified(request, *args, **kwargs):
+    version = _version(request)
+    return version_modified(version) if version else None
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=summary_etag, last_modified_func=summary_last_modified), name='get')
+class AccountSummaryView(LoginRequiredMixin, View):
+    """
+    Balance, recent transactions and loan status as JSON. A client that sends
+    back the ETag or Last-Modified it got gets a 304 decided from the cached
+    account version alone, without touching the account tables.
+    """
+    raise_exception = True
+    section = None
+
+    def get(self, request):
+        summary = account_summary(request.user.pk)
+        return JsonResponse(summary if self.section is None else summary[self.section], safe=False)
@@ -0,0 +1,70 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .replicas import reads_from_replica
+from .shared_cache import shared_timeout
+
+TIMEOUT = 24 * 60 * 60
+
+
+def _version_key(user_id):
+    return f'core:account:{user_id}:version'
+
+
+def _stamp():
+    # * microseconds, so it doubles as the Last-Modified time
+    return time.time_ns() // 1000
+
+
+def account_version(user_id):
+    """
+    Version of everything cached for one account, keyed by user id so a request
+    can check it without loading the account. It is the time of the last change
+    in microseconds and serves as both ETag and Last-Modified.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _stamp(), shared_timeout(TIMEOUT))
+        version = cache.get(key)
+    return version
+
+
+def version_modified(version):
+    return datetime.fromtimestamp(version // 1_000_000, tz=dt_timezone.utc)
+
+
+def _bump(user_ids):
+    keys = [_version_key(user_id) for user_id in user_ids]
+    current = cache.get_many(keys)
+    now = _stamp()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, shared_timeout(TIMEOUT))
+
+
+def invalidate_account(*user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    _bump(user_ids)
+    # * a reader could cache the old rows under the new version before we commit, so bump again after
+    transaction.on_commit(lambda: _bump(user_ids))
+
+
+def cached_for_account(user_id, name, build, timeout=TIMEOUT):
+    """
+    build() cached under the account's current version. Entries of older
+    versions are never read again and just expire. On a read_from_replica url
+    build() reads the replica, which may not have the change that bumped the
+    version yet (an incoming transfer does not pin the receiver), so such an
+    entry is only kept for REPLICA_CACHE_SECONDS.
+    """
+    key = f'core:account:{user_id}:{name}:{account_version(user_id)}'
+    value = cache.get(key)
+    if value is None:
+        if reads_from_replica():
+            timeout = min(timeout, getattr(settings, 'REPLICA_CACHE_SECONDS', 5))
+        value = build()
+        cache.set(key, value, shared_timeout(timeout))
+    return value
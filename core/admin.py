@@ -1,5 +1,11 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Bank
-admin.site.register(Bank)
\ No newline at end of file
+from .models import Bank, OutboundEmail
+admin.site.register(Bank)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to', 'subject', 'status', 'attempts', 'next_attempt_at', 'claimed_at', 'sent_at']
+    list_filter = ['status']
@@ -0,0 +1,56 @@
+import time
+from collections import namedtuple
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .models import Bank
+from .shared_cache import shared_timeout
+
+CACHE_KEY = 'core:bank_state'
+# * only with a shared cache backend, a per-process one keeps it for UNSHARED_TIMEOUT
+SHARED_TTL = 60 * 60
+# * other processes pick up an admin change from the shared cache within this many seconds
+LOCAL_TTL = 5
+
+BankState = namedtuple('BankState', ['bankrupt', 'frozen'])
+
+_local = {'state': None, 'expires': 0.0}
+
+
+def _load():
+    flags = Bank.objects.aggregate(
+        bankrupt=Count('id', filter=Q(is_bankrupt=True)),
+        frozen=Count('id', filter=Q(is_frozen=True)),
+    )
+    return BankState(bool(flags['bankrupt']), bool(flags['frozen']))
+
+
+def get_bank_state():
+    """
+    Bank flags from an in-process copy, then the shared cache, and only then the
+    Bank table, so the withdrawal path normally runs without touching the db.
+    """
+    now = time.monotonic()
+    if _local['state'] is not None and _local['expires'] > now:
+        return _local['state']
+    state = cache.get(CACHE_KEY)
+    if state is None:
+        state = _load()
+        cache.set(CACHE_KEY, tuple(state), shared_timeout(SHARED_TTL))
+    state = BankState(*state)
+    _local.update(state=state, expires=now + LOCAL_TTL)
+    return state
+
+
+def invalidate_bank_state():
+    cache.delete(CACHE_KEY)
+    _local.update(state=None, expires=0.0)
+
+
+def withdrawals_blocked():
+    state = get_bank_state()
+    return state.bankrupt or state.frozen
+
+
+def operations_frozen():
+    # * kill switch: withdrawals, transfers and loan requests stop together
+    return get_bank_state().frozen
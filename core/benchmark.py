@@ -0,0 +1,292 @@
+import itertools
+import json
+import random
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from urllib.parse import urlencode
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test import Client
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from accounts.models import UserBankAccount, UserAddress
+from accounts.numbers import reserve_block
+from transactions.constants import DEPOSIT, LOAN, LOAN_APPROVED, OPENING_BALANCE, BOOK_OPENING
+from transactions.models import Transactions, Loan
+from transactions.postings import move, record_postings
+from transactions.snapshots import backfill
+
+PASSWORD = 'benchmark-pass'
+
+
+def seed(users, transactions_per_user, loans_per_user=2, batch_size=1000):
+    """
+    Create users with an address, an account, a deposit history and some
+    approved loans using bulk_create. Returns the seeded accounts.
+    """
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'bench{i}', email=f'bench{i}@example.com', password=password) for i in range(users)],
+        batch_size=batch_size,
+    )
+    created = list(User.objects.filter(username__startswith='bench').order_by('id'))
+    UserAddress.objects.bulk_create(
+        [UserAddress(user=user, street='Road 1', city='Dhaka', post_code=1000, country='BD') for user in created],
+        batch_size=batch_size,
+    )
+    balance = Decimal(100) * transactions_per_user
+    numbers = reserve_block(len(created))
+    UserBankAccount.objects.bulk_create(
+        [
+            UserBankAccount(
+                user=user, account_type='Savings', account_no=number,
+                birth_date=date(1990, 1, 1), gender='Male', balance=balance, open_loans=loans_per_user,
+            )
+            for user, number in zip(created, numbers)
+        ],
+        batch_size=batch_size,
+    )
+    accounts = list(UserBankAccount.objects.filter(user__username__startswith='bench').select_related('user'))
+    history = (
+        Transactions(
+            account=account, amount=100, transaction_type=DEPOSIT,
+            balance_after_transaction=Decimal(100) * (n + 1),
+        )
+        for account in accounts for n in range(transactions_per_user)
+    )
+    loans = (
+        Transactions(
+            account=account, amount=100, transaction_type=LOAN,
+            balance_after_transaction=balance,
+        )
+        for account in accounts for n in range(loans_per_user)
+    )
+    # * seeded balances get an opening entry so reconcile_ledger sees no drift
+    record_postings(
+        [posting for account in accounts for posting in move(OPENING_BALANCE, BOOK_OPENING, account, balance)],
+        batch_size=batch_size,
+    )
+    Loan.objects.bulk_create(
+        [Loan(account=account, amount=100, status=LOAN_APPROVED) for account in accounts for n in range(loans_per_user)],
+        batch_size=batch_size,
+    )
+    batch = []
+    for txn in itertools.chain(history, loans):
+        batch.append(txn)
+        if len(batch) == batch_size:
+            Transactions.objects.bulk_create(batch)
+            batch = []
+    Transactions.objects.bulk_create(batch)
+    backfill()
+    return accounts
+
+
+def load_scenario(path):
+    """
+    One step per line, e.g.
+    {"name": "deposit", "method": "post", "url": "deposit_money", "data": {"amount": 100, "transaction_type": 1}, "repeat": 200}
+    "url" is a url name; string values "{receiver}" and "{loan}" are filled in per request.
+    "anonymous": true sends the step's requests without logging in.
+    """
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Runner:
+    def __init__(self, accounts, seed_value=0):
+        self.accounts = accounts
+        self.random = random.Random(seed_value)
+        self.clients = {}
+
+    def client_for(self, account):
+        if account.pk not in self.clients:
+            client = Client()
+            client.force_login(account.user)
+            self.clients[account.pk] = client
+        return self.clients[account.pk]
+
+    def anonymous_client(self):
+        if None not in self.clients:
+            self.clients[None] = Client()
+        return self.clients[None]
+
+    def fill(self, value, account):
+        if value == '{receiver}':
+            other = self.random.choice(self.accounts)
+            return other.account_no if other.pk != account.pk else self.accounts[0].account_no
+        return value
+
+    def url_for(self, step, account):
+        args = []
+        if step.get('args') == ['{loan}']:
+            loan = Loan.objects.filter(
+                account=account, status=LOAN_APPROVED
+            ).values_list('pk', flat=True).first()
+            if loan is None:
+                return None
+            args = [loan]
+        return reverse(step['url'], args=args)
+
+    def run_step(self, step):
+        method = step.get('method', 'get').lower()
+        latencies, queries, statuses = [], [], {}
+        started = time.perf_counter()
+        for _ in range(step.get('repeat', 1)):
+            account = self.random.choice(self.accounts)
+            url = self.url_for(step, account)
+            if url is None:
+                continue
+            data = {key: self.fill(value, account) for key, value in step.get('data', {}).items()}
+            client = self.anonymous_client() if step.get('anonymous') else self.client_for(account)
+            request_started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            # * set by core.middleware.QueryCountMiddleware
+            queries.append(getattr(response, 'query_count', 0))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started
+        if not latencies:
+            return {'requests': 0}
+        return {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+    def run(self, scenario):
+        return {step.get('name', step['url']): self.run_step(step) for step in scenario}
+
+
+def session_cookies(user):
+    """Cookies of a logged in session and a CSRF token, for talking to a running server over HTTP."""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return {
+        settings.SESSION_COOKIE_NAME: session.session_key,
+        settings.CSRF_COOKIE_NAME: get_random_string(32, CSRF_ALLOWED_CHARS),
+    }
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # * a redirect is the answer we measure, do not follow it to the report page
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class HttpRunner(Runner):
+    """
+    Same scenario format as Runner, but sent to a running server by a pool of
+    threads, so it measures what the deployment does under concurrency.
+    """
+
+    def __init__(self, base_url, accounts, concurrency, seed_value=0, timeout=30):
+        super().__init__(accounts, seed_value)
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(NoRedirect)
+        self.cookies = {account.pk: session_cookies(account.user) for account in accounts}
+
+    def send(self, method, url, data, account):
+        cookies = self.cookies[account.pk]
+        headers = {
+            'Cookie': '; '.join(f'{name}={value}' for name, value in cookies.items()),
+            'X-CSRFToken': cookies[settings.CSRF_COOKIE_NAME],
+        }
+        body = None
+        if method == 'post':
+            body = urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif data:
+            url = f'{url}?{urlencode(data)}'
+        request = urllib.request.Request(self.base_url + url, data=body, headers=headers, method=method.upper())
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                status, timing = response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as error:
+            error.read()
+            status, timing = error.code, error.headers.get('Server-Timing', '')
+        except OSError:
+            status, timing = 0, ''
+        latency = (time.perf_counter() - started) * 1000
+        match = SERVER_TIMING_QUERIES.search(timing)
+        return latency, int(match.group(1)) if match else 0, status
+
+    def run_step(self, step):
+        method = step.get('method', 'get').lower()
+        # * pick accounts and fill the data up front, random.Random is not shared between threads
+        jobs = []
+        for _ in range(step.get('repeat', 1)):
+            account = self.random.choice(self.accounts)
+            url = self.url_for(step, account)
+            if url is not None:
+                data = {key: self.fill(value, account) for key, value in step.get('data', {}).items()}
+                jobs.append((method, url, data, account))
+        if not jobs:
+            return {'requests': 0}
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda job: self.send(*job), jobs))
+        elapsed = time.perf_counter() - started
+        latencies = [latency for latency, queries, status in results]
+        statuses = {}
+        for latency, queries, status in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            'requests': len(results),
+            'concurrency': self.concurrency,
+            'throughput_rps': round(len(results) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries_mean': round(statistics.fmean(queries for latency, queries, status in results), 2),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+
+def compare(old, new):
+    """Rows of (endpoint, metric, old, new, change %) for the metrics that moved."""
+    rows = []
+    for endpoint, metrics in new['endpoints'].items():
+        before = old['endpoints'].get(endpoint)
+        if not before:
+            continue
+        for metric in ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_mean']:
+            if metric in before and metric in metrics and before[metric]:
+                change = (metrics[metric] - before[metric]) / before[metric] * 100
+                rows.append((endpoint, metric, before[metric], metrics[metric], round(change, 1)))
+    return rows
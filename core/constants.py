@@ -0,0 +1,11 @@
+EMAIL_PENDING = 1
+EMAIL_SENT = 2
+EMAIL_FAILED = 3
+EMAIL_SENDING = 4
+
+EMAIL_STATUS = (
+    (EMAIL_PENDING, 'Pending'),
+    (EMAIL_SENT, 'Sent'),
+    (EMAIL_FAILED, 'Failed'),
+    (EMAIL_SENDING, 'Sending'),
+)
@@ -0,0 +1,131 @@
+import uuid
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def claim_lease():
+    # * longer than any request may run, or a slow first request would run twice
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE_SECONDS', 300))
+
+
+def purge_expired(ttl=None):
+    ttl = ttl or timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+    return deleted
+
+
+class IdempotentMixin:
+    """
+    Money moving views: a request carrying an Idempotency-Key header (or an
+    idempotency_key form/query field) runs at most once per user. A retry gets
+    the original redirect back instead of moving the money again, a retry
+    while the first request is still running gets 409. A claim whose request
+    never finished (the worker died) is taken over by a retry once its lease
+    of IDEMPOTENCY_CLAIM_LEASE_SECONDS ran out.
+    Put it after LoginRequiredMixin so only authenticated requests get here.
+    """
+    idempotent_methods = ('POST',)
+
+    def get_idempotency_key(self, request):
+        key = request.headers.get(HEADER) or request.POST.get(FORM_FIELD) or request.GET.get(FORM_FIELD)
+        return key[:255] if key else None
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_idempotency_key(request) if request.method in self.idempotent_methods else None
+        if not key or not request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self.adispatch_idempotent(key, request, *args, **kwargs)
+
+        record, response = self.claim_idempotency_key(request, key)
+        if response is not None:
+            return response
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        self.complete_idempotency_key(record, response)
+        return response
+
+    async def adispatch_idempotent(self, key, request, *args, **kwargs):
+        # * atomic() is sync only, so claiming and storing the key run in a thread
+        record, response = await sync_to_async(self.claim_idempotency_key)(request, key)
+        if response is not None:
+            return response
+        try:
+            response = await super().dispatch(request, *args, **kwargs)
+        except Exception:
+            await record.adelete()
+            raise
+        await sync_to_async(self.complete_idempotency_key)(record, response)
+        return response
+
+    def claim_idempotency_key(self, request, key):
+        """(record, None) when this request owns the key, else (None, response to send instead)."""
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=request.user, key=key, path=request.path), None
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, key=key)
+            if record.path != request.path:
+                return None, HttpResponse('This Idempotency-Key was used for a different request.', status=422)
+            if not record.completed:
+                now = timezone.now()
+                #* lease shesh, ager request ta mara geche; update ta ekta retry kei claim dey
+                taken = IdempotencyKey.objects.filter(
+                    pk=record.pk, completed=False, claimed_at__lt=now - claim_lease(),
+                ).update(claimed_at=now)
+                if taken:
+                    record.claimed_at = now
+                    return record, None
+                return None, HttpResponse('A request with this Idempotency-Key is still being processed.', status=409)
+            return None, self.replay(record)
+
+    def complete_idempotency_key(self, record, response):
+        if self.is_idempotent_success(response):
+            #* taka move hoye geche, response ta mone rakhi
+            if hasattr(response, 'render'):
+                response.render()
+            record.completed = True
+            record.response_status = response.status_code
+            if response.has_header('Location'):
+                record.response_location = response['Location']
+            else:
+                record.response_content_type = response.get('Content-Type', '')
+                record.response_body = response.content.decode(response.charset)
+            record.save()
+        else:
+            # * form errors and refusals moved no money, let the client retry with the same key
+            record.delete()
+
+    def is_idempotent_success(self, response):
+        # * every money moving view redirects after a successful post
+        return response.status_code in (301, 302, 303)
+
+    def replay(self, record):
+        if record.response_location:
+            response = HttpResponseRedirect(record.response_location, status=record.response_status)
+        else:
+            response = HttpResponse(
+                record.response_body, status=record.response_status, content_type=record.response_content_type,
+            )
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context[FORM_FIELD] = new_idempotency_key()
+        return context
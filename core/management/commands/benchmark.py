@@ -0,0 +1,97 @@
+import json
+import subprocess
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.benchmark import seed, load_scenario, Runner, compare
+from core.middleware import QueryCountMiddleware
+
+DEFAULT_SCENARIO = Path(__file__).resolve().parents[2] / 'benchmarks' / 'default.jsonl'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and replay a JSONL scenario against the real views, '
+        'reporting p50/p95/p99 latency, throughput and query counts per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--transactions', type=int, default=200, help='history rows per user')
+        parser.add_argument('--scenario', default=str(DEFAULT_SCENARIO))
+        parser.add_argument('--output', default='benchmark_results', help='directory the result JSON is written to')
+        parser.add_argument('--compare', help='earlier result JSON to diff against')
+        parser.add_argument('--seed', type=int, default=0, help='random seed for picking users and receivers')
+
+    def handle(self, *args, **options):
+        scenario = load_scenario(options['scenario'])
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        # * never touch the real database, run against a fresh test_<NAME> one
+        setup_test_environment()
+        settings.DEBUG = False
+        # * a handful of benchmark users would hit the per-user limits within seconds
+        settings.RATE_LIMIT_ENABLED = False
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            accounts = seed(options['users'], options['transactions'])
+            self.stderr.write(f'seeded {len(accounts)} accounts in {time.perf_counter() - started:.1f}s')
+            QueryCountMiddleware.reset_stats()
+            endpoints = Runner(accounts, options['seed']).run(scenario)
+            views = QueryCountMiddleware.slowest(len(QueryCountMiddleware.stats))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        result = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': self.revision(),
+            'database': connection.vendor,
+            'users': options['users'],
+            'transactions_per_user': options['transactions'],
+            'scenario': options['scenario'],
+            'endpoints': endpoints,
+            # * from QueryCountMiddleware, slowest average db time first
+            'views': [
+                {'view': view, 'requests': calls, 'queries_mean': round(queries, 2), 'db_ms_mean': round(db_ms, 3), 'queries_max': worst}
+                for view, calls, queries, db_ms, worst in views
+            ],
+        }
+        output = Path(options['output'])
+        output.mkdir(parents=True, exist_ok=True)
+        path = output / f"{result['created'].replace(':', '')}-{connection.vendor}.json"
+        path.write_text(json.dumps(result, indent=2))
+
+        self.stdout.write(f"{'endpoint':<16}{'req':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}")
+        for name, m in endpoints.items():
+            if not m['requests']:
+                self.stdout.write(f'{name:<16}{0:>6}')
+                continue
+            self.stdout.write(
+                f"{name:<16}{m['requests']:>6}{m['throughput_rps']:>9}{m['p50_ms']:>9}"
+                f"{m['p95_ms']:>9}{m['p99_ms']:>9}{m['queries_mean']:>9}"
+            )
+        self.stdout.write(f'\n{"view":<32}{"req":>6}{"queries":>9}{"db ms":>9}{"worst":>7}')
+        for view, calls, queries, db_ms, worst in views:
+            self.stdout.write(f'{view:<32}{calls:>6}{queries:>9.1f}{db_ms:>9.2f}{worst:>7}')
+        self.stdout.write(f'results written to {path}')
+
+        if baseline:
+            self.stdout.write(f"\n{'endpoint':<16}{'metric':<16}{'before':>10}{'after':>10}{'change %':>10}")
+            for row in compare(baseline, result):
+                self.stdout.write('{:<16}{:<16}{:>10}{:>10}{:>10}'.format(*row))
+
+    def revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
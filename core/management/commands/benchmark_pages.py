@@ -0,0 +1,63 @@
+import json
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.benchmark import seed, load_scenario, Runner, compare
+
+DEFAULT_SCENARIO = Path(__file__).resolve().parents[2] / 'benchmarks' / 'pages.jsonl'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and replay the page scenario twice, first with '
+        'PAGE_CACHE_ENABLED off and then on, to show the render time the fragment and '
+        'anonymous page caches save.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--transactions', type=int, default=200, help='history rows per user')
+        parser.add_argument('--scenario', default=str(DEFAULT_SCENARIO))
+        parser.add_argument('--output', help='also write both runs as JSON to this file')
+        parser.add_argument('--seed', type=int, default=0, help='random seed for picking users')
+
+    def handle(self, *args, **options):
+        scenario = load_scenario(options['scenario'])
+        # * never touch the real database, run against a fresh test_<NAME> one
+        setup_test_environment()
+        settings.DEBUG = False
+        settings.RATE_LIMIT_ENABLED = False
+        enabled = getattr(settings, 'PAGE_CACHE_ENABLED', True)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        runs = {}
+        try:
+            started = time.perf_counter()
+            accounts = seed(options['users'], options['transactions'])
+            self.stderr.write(f'seeded {len(accounts)} accounts in {time.perf_counter() - started:.1f}s')
+            for name, page_cache in (('uncached', False), ('cached', True)):
+                settings.PAGE_CACHE_ENABLED = page_cache
+                # * the cached run starts cold, every user's first hit renders
+                cache.clear()
+                runs[name] = {'endpoints': Runner(accounts, options['seed']).run(scenario)}
+        finally:
+            settings.PAGE_CACHE_ENABLED = enabled
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<16}{'metric':<16}{'uncached':>10}{'cached':>10}{'change %':>10}")
+        for row in compare(runs['uncached'], runs['cached']):
+            self.stdout.write('{:<16}{:<16}{:>10}{:>10}{:>10}'.format(*row))
+        for endpoint, metrics in runs['cached']['endpoints'].items():
+            before = runs['uncached']['endpoints'].get(endpoint, {})
+            if metrics.get('requests') and before.get('requests'):
+                saved = (before['mean_ms'] - metrics['mean_ms']) * metrics['requests']
+                self.stdout.write(f'{endpoint}: {saved:.0f} ms of render time saved over {metrics["requests"]} requests')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(runs, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
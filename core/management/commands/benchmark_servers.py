@@ -0,0 +1,158 @@
+import json
+import os
+import shlex
+import socket
+import subprocess
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.benchmark import seed, load_scenario, HttpRunner
+
+DEFAULT_SCENARIO = Path(__file__).resolve().parents[2] / 'benchmarks' / 'servers.jsonl'
+
+# * {port} and {workers} are filled in, override with --wsgi-command / --asgi-command
+SERVERS = {
+    'wsgi': 'gunicorn PayLater.wsgi:application --bind 127.0.0.1:{port} --workers {workers} --log-level warning',
+    'asgi': 'uvicorn PayLater.asgi:application --port {port} --workers {workers} --log-level warning',
+}
+
+# * environment for the server processes, read by the DB_* connection settings
+CONNECTIONS = {
+    'fresh': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'false'},
+    'persistent': {'DB_CONN_MAX_AGE': '60', 'DB_POOL': 'false'},
+    'pool': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'true'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database, start the project under gunicorn (WSGI, sync views) and '
+        'uvicorn (ASGI, async views) in turn and drive both with the same scenario at several '
+        'concurrency levels. With --connections every server runs once per connection mode: '
+        'fresh (a connection per request), persistent (CONN_MAX_AGE) and pool (psycopg pool).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,asgi')
+        parser.add_argument('--concurrency', default='1,8,32', help='comma separated client thread counts')
+        parser.add_argument('--connections', default='persistent', help='comma separated: fresh, persistent, pool')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--wsgi-command', default=SERVERS['wsgi'])
+        parser.add_argument('--asgi-command', default=SERVERS['asgi'])
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--transactions', type=int, default=200, help='history rows per user')
+        parser.add_argument('--scenario', default=str(DEFAULT_SCENARIO))
+        parser.add_argument('--output', default='benchmark_results')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        scenario = load_scenario(options['scenario'])
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        for name in servers:
+            if name not in SERVERS:
+                raise CommandError(f'unknown server {name}, use wsgi and/or asgi')
+        modes = [mode.strip() for mode in options['connections'].split(',') if mode.strip()]
+        for mode in modes:
+            if mode not in CONNECTIONS:
+                raise CommandError(f'unknown connection mode {mode}, use {", ".join(CONNECTIONS)}')
+        if 'pool' in modes and connection.vendor != 'postgresql':
+            raise CommandError('the pool mode needs postgres and psycopg 3')
+
+        # * the servers are separate processes, so unlike the benchmark command this
+        # * needs a real database they can connect to; DB_NAME points them at the test one
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = {}
+        try:
+            accounts = seed(options['users'], options['transactions'])
+            env = dict(
+                os.environ, DB_NAME=str(connection.settings_dict['NAME']), DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE,
+                RATE_LIMIT_ENABLED='false',
+            )
+            for name in servers:
+                steps = scenario if name == 'wsgi' else [dict(step, url=step.get('async_url', step['url'])) for step in scenario]
+                command = options[f'{name}_command'].format(port=options['port'], workers=options['workers'])
+                for mode in modes:
+                    results[f'{name}/{mode}'] = self.run_server(
+                        command, dict(env, **CONNECTIONS[mode]), options['port'], accounts, steps, levels, options['seed'],
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        result = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': connection.vendor,
+            'users': options['users'],
+            'workers': options['workers'],
+            'connections': modes,
+            'scenario': options['scenario'],
+            'servers': results,
+        }
+        output = Path(options['output'])
+        output.mkdir(parents=True, exist_ok=True)
+        path = output / f"{result['created'].replace(':', '')}-servers-{connection.vendor}.json"
+        path.write_text(json.dumps(result, indent=2))
+
+        self.stdout.write(f"{'server':<18}{'endpoint':<16}{'conc':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+        for name, levels_result in results.items():
+            for level, endpoints in levels_result.items():
+                for endpoint, m in endpoints.items():
+                    if not m['requests']:
+                        continue
+                    errors = sum(count for code, count in m['statuses'].items() if not 200 <= int(code) < 400)
+                    self.stdout.write(
+                        f"{name:<18}{endpoint:<16}{level:>6}{m['throughput_rps']:>9}{m['p50_ms']:>9}"
+                        f"{m['p95_ms']:>9}{m['p99_ms']:>9}{errors:>8}"
+                    )
+        self.stdout.write(f'results written to {path}')
+        if len(modes) > 1:
+            self.compare_modes(results, servers, modes)
+
+    def compare_modes(self, results, servers, modes):
+        # * p50 of every mode next to the first one, e.g. persistent and pool against fresh
+        self.stdout.write(f"\n{'server':<8}{'endpoint':<16}{'conc':>6}" + ''.join(f'{mode:>12}' for mode in modes) + f"{'change %':>10}")
+        for name in servers:
+            first = results[f'{name}/{modes[0]}']
+            for level, endpoints in first.items():
+                for endpoint, m in endpoints.items():
+                    if not m['requests']:
+                        continue
+                    p50s = [results[f'{name}/{mode}'][level][endpoint].get('p50_ms') for mode in modes]
+                    change = ''
+                    if p50s[0] and p50s[-1] is not None:
+                        change = round((p50s[-1] - p50s[0]) / p50s[0] * 100, 1)
+                    self.stdout.write(
+                        f'{name:<8}{endpoint:<16}{level:>6}' + ''.join(f'{p50!s:>12}' for p50 in p50s) + f'{change!s:>10}'
+                    )
+
+    def run_server(self, command, env, port, accounts, steps, levels, seed_value):
+        self.stderr.write(f'starting {command}')
+        try:
+            process = subprocess.Popen(shlex.split(command), env=env, cwd=settings.BASE_DIR)
+        except OSError as error:
+            raise CommandError(f'could not start {command}: {error}')
+        try:
+            self.wait_for_port(port, process)
+            base_url = f'http://127.0.0.1:{port}'
+            return {
+                str(level): HttpRunner(base_url, accounts, level, seed_value).run(steps)
+                for level in levels
+            }
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    def wait_for_port(self, port, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'server exited with code {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'server did not listen on port {port} within {timeout}s')
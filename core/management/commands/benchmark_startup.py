@@ -0,0 +1,94 @@
+import json
+import sys
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.startup import WSGI_BOOT, WSGI_FIRST_REQUEST, import_profile, loaded_modules, time_command, top_modules
+
+PROJECT_APPS = ('PayLater', 'accounts', 'transactions', 'core', 'api')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure worker cold start: wall time of `manage.py check` and of importing the WSGI '
+        'application, with the slowest modules by cumulative and own import time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='runs per wall clock measurement')
+        parser.add_argument('--top', type=int, default=15, help='modules listed per table')
+        parser.add_argument('--project-only', action='store_true', help='only list the project apps in the tables')
+        parser.add_argument('--output', help='also write the result as JSON to this file')
+
+    def handle(self, *args, **options):
+        repeat, top = options['repeat'], options['top']
+        prefix = PROJECT_APPS if options['project_only'] else None
+        manage = str(Path(settings.BASE_DIR) / 'manage.py')
+        try:
+            result = {
+                'check': time_command([sys.executable, manage, 'check'], repeat),
+                'wsgi_import': time_command([sys.executable, '-c', WSGI_BOOT], repeat),
+                'first_request_import': time_command([sys.executable, '-c', WSGI_FIRST_REQUEST], repeat),
+            }
+            total, modules = import_profile(WSGI_BOOT)
+            urls_total, urls_modules = import_profile(WSGI_FIRST_REQUEST)
+            boot_names = loaded_modules(WSGI_BOOT)
+            request_names = loaded_modules(WSGI_FIRST_REQUEST)
+        except RuntimeError as exc:
+            raise CommandError(f'startup measurement failed: {exc}')
+
+        result['import_profile'] = {
+            'total_s': round(total, 4),
+            'modules': len(modules),
+            'by_cumulative': top_modules(modules, 'cumulative_us', top, prefix),
+            'by_self': top_modules(modules, 'self_us', top, prefix),
+        }
+        # * modules the urlconf pulls in on the first request, not at boot
+        booted = {module['module'] for module in modules}
+        late = [module for module in urls_modules if module['module'] not in booted]
+        result['first_request_profile'] = {
+            'total_s': round(urls_total, 4),
+            'extra_modules': len(late),
+            'by_cumulative': top_modules(late, 'cumulative_us', top, prefix),
+        }
+
+        project = lambda names: [name for name in names if name.split('.')[0] in PROJECT_APPS]
+        result['project_modules'] = {
+            'boot': project(boot_names),
+            'first_request': [name for name in project(request_names) if name not in boot_names],
+        }
+
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def report(self, result):
+        self.stdout.write(f'{"measurement":<24}{"min s":>10}{"median s":>10}{"max s":>10}')
+        for name in ('check', 'wsgi_import', 'first_request_import'):
+            row = result[name]
+            self.stdout.write(f'{name:<24}{row["min_s"]:>10.3f}{row["median_s"]:>10.3f}{row["max_s"]:>10.3f}')
+
+        profile = result['import_profile']
+        self.stdout.write(f'\nWSGI import: {profile["total_s"]:.3f}s over {profile["modules"]} modules')
+        for title, key in (('cumulative', 'by_cumulative'), ('self', 'by_self')):
+            self.stdout.write(f'\nslowest by {title} time')
+            self.table(profile[key])
+
+        late = result['first_request_profile']
+        self.stdout.write(
+            f'\nfirst request (urlconf): {late["total_s"]:.3f}s, {late["extra_modules"]} more modules, slowest'
+        )
+        self.table(late['by_cumulative'])
+
+        loaded = result['project_modules']
+        self.stdout.write(f'\nproject modules loaded at boot: {", ".join(loaded["boot"])}')
+        self.stdout.write(f'project modules left to the first request: {", ".join(loaded["first_request"])}')
+
+    def table(self, modules):
+        self.stdout.write(f'  {"self ms":>9}{"cumul. ms":>11}  module')
+        for module in modules:
+            self.stdout.write(
+                f'  {module["self_us"] / 1000:>9.1f}{module["cumulative_us"] / 1000:>11.1f}  {module["module"]}'
+            )
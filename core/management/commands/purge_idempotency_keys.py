@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from core.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS. Run it from cron, e.g. hourly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='override IDEMPOTENCY_KEY_TTL_HOURS')
+
+    def handle(self, *args, **options):
+        ttl = timedelta(hours=options['hours']) if options['hours'] else None
+        self.stdout.write(f'{purge_expired(ttl)} idempotency keys deleted')
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from core.outbox import deliver_pending, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued transaction emails from the outbox over a pooled SMTP connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f'sent={sent} failed={failed}')
+            elif not options['loop']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,138 @@
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.queries')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(view, queries):
+    """
+    Declare how many queries a url may run, e.g.
+    path('deposit/', query_budget(DepositMoneyView.as_view(), 12), name='deposit_money')
+    """
+    view.query_budget = queries
+    return view
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class QueryCountMiddleware:
+    """
+    Counts queries and DB time for every request, reports them in a
+    Server-Timing header, logs slow views and views over their query budget.
+    Per view totals of this process are kept in `stats` and logged as a
+    slowest-first table every QUERY_STATS_LOG_EVERY requests (0 turns it off),
+    `manage.py benchmark` prints them after its run.
+    """
+    # * resolved view name -> [requests, total queries, total db seconds, worst query count].
+    # * only resolved urls are counted, so it never has more entries than the urlconf
+    stats = {}
+    recorded = 0
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'QUERY_LOG_SLOW_MS', 200)
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        self.log_every = getattr(settings, 'QUERY_STATS_LOG_EVERY', 0)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self.watch(stack, counter)
+            response = self.get_response(request)
+        return self.finish(request, response, counter, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        stack = ExitStack()
+        # * the async ORM runs its queries on the request's sync thread, so the wrappers go on that thread's connections
+        await sync_to_async(self.watch)(stack, counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, counter, time.perf_counter() - started)
+
+    def watch(self, stack, counter):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+
+    def finish(self, request, response, counter, total):
+        resolved = getattr(request, 'query_view_name', None)
+        view = resolved or request.path
+        budget = getattr(request, 'query_budget', None)
+        response.query_count = counter.count
+        response.query_budget = budget
+        response['Server-Timing'] = (
+            f'db;dur={counter.duration * 1000:.1f};desc="{counter.count} queries", '
+            f'total;dur={total * 1000:.1f}'
+        )
+        if resolved:
+            self.record(resolved, counter)
+
+        if counter.duration * 1000 >= self.slow_ms:
+            logger.warning('slow view %s: %d queries, %.1f ms in db', view, counter.count, counter.duration * 1000)
+        if budget is not None and counter.count > budget:
+            message = f'{view} ran {counter.count} queries, budget is {budget}'
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.error(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
+        match = request.resolver_match
+        request.query_view_name = match.view_name if match else None
+
+    def record(self, view, counter):
+        entry = self.stats.setdefault(view, [0, 0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += counter.count
+        entry[2] += counter.duration
+        entry[3] = max(entry[3], counter.count)
+        QueryCountMiddleware.recorded += 1
+        if self.log_every and self.recorded % self.log_every == 0:
+            for row in self.slowest():
+                logger.info('%s: %d requests, %.1f queries, %.1f ms in db on average, worst %d queries', *row)
+
+    @classmethod
+    def slowest(cls, n=10):
+        """(view, requests, avg queries, avg db ms, worst query count), slowest average db time first."""
+        rows = [
+            (view, calls, queries / calls, duration * 1000 / calls, worst)
+            for view, (calls, queries, duration, worst) in cls.stats.items()
+        ]
+        return sorted(rows, key=lambda row: row[3], reverse=True)[:n]
+
+    @classmethod
+    def reset_stats(cls):
+        cls.stats.clear()
+        cls.recorded = 0
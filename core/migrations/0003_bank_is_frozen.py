@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bank',
+            name='is_frozen',
+            field=models.BooleanField(default=False),
+        ),
+    ]
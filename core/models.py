@@ -1,5 +1,55 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+from .constants import EMAIL_STATUS, EMAIL_PENDING
 
 # Create your models here.
 class Bank(models.Model):
-    is_bankrupt = models.BooleanField(default=False)
\ No newline at end of file
+    is_bankrupt = models.BooleanField(default=False)
+    # * kill switch, blocks withdrawals, transfers and loan requests together
+    is_frozen = models.BooleanField(default=False)
+
+
+class OutboundEmail(models.Model):
+    # * durable outbox. views only insert rows here, the send_queued_emails worker talks to SMTP
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    html_body = models.TextField()
+    status = models.IntegerField(choices=EMAIL_STATUS, default=EMAIL_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True) # when a worker took it for sending
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to}"
+
+
+class IdempotencyKey(models.Model):
+    # * one row per (user, Idempotency-Key); a replayed request gets the stored response back
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="idempotency_keys", on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    completed = models.BooleanField(default=False)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_location = models.CharField(max_length=255, blank=True)
+    response_content_type = models.CharField(max_length=100, blank=True)
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    claimed_at = models.DateTimeField(default=timezone.now) # lease of the request running it, see IdempotentMixin
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for {self.user}"
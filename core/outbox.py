@@ -0,0 +1,102 @@
+from datetime import timedelta
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .constants import EMAIL_PENDING, EMAIL_SENT, EMAIL_FAILED, EMAIL_SENDING
+from .models import OutboundEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30 # seconds, doubled on every failed attempt
+BACKOFF_MAX = 60 * 60
+# * a claimed email still not sent after this is claimed again, its worker is gone
+SEND_LEASE = timedelta(minutes=10)
+
+
+def enqueue_email(to, subject, html_body):
+    # * same db transaction as the caller, so a rolled back deposit never sends a mail
+    return OutboundEmail.objects.create(to=to, subject=subject, html_body=html_body)
+
+
+async def aenqueue_email(to, subject, html_body):
+    return await OutboundEmail.objects.acreate(to=to, subject=subject, html_body=html_body)
+
+
+def enqueue_emails(messages):
+    # * messages is an iterable of (to, subject, html_body), inserted with one query per 500 rows
+    return OutboundEmail.objects.bulk_create(
+        [OutboundEmail(to=to, subject=subject, html_body=html_body) for to, subject, html_body in messages],
+        batch_size=500,
+    )
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def claim_batch(batch_size=100, lease=SEND_LEASE):
+    """
+    Mark one batch of due emails as sending in a short transaction, so the row
+    locks are not held while talking to SMTP. Rows of a worker that died while
+    sending are due again once their lease ran out.
+    """
+    now = timezone.now()
+    due = Q(status=EMAIL_PENDING, next_attempt_at__lte=now) | Q(status=EMAIL_SENDING, claimed_at__lt=now - lease)
+    with transaction.atomic():
+        # * skip_locked lets several workers drain the outbox without picking the same rows
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(due).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(status=EMAIL_SENDING, claimed_at=now)
+    return batch
+
+
+def deliver_pending(batch_size=100, max_attempts=MAX_ATTEMPTS, connection=None):
+    """
+    Send one batch of due emails over a single SMTP connection.
+    Returns a (sent, failed) tuple for the batch.
+    """
+    sent = failed = 0
+    batch = claim_batch(batch_size)
+    if not batch:
+        return sent, failed
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for email in batch:
+            _record_failure(email, exc, max_attempts)
+        return sent, len(batch)
+
+    try:
+        for email in batch:
+            message = EmailMultiAlternatives(email.subject, '', to=[email.to], connection=connection)
+            message.attach_alternative(email.html_body, "text/html")
+            try:
+                message.send()
+            except Exception as exc:
+                _record_failure(email, exc, max_attempts)
+                failed += 1
+            else:
+                email.status = EMAIL_SENT
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def _record_failure(email, exc, max_attempts):
+    email.attempts += 1
+    email.last_error = repr(exc)
+    if email.attempts >= max_attempts:
+        email.status = EMAIL_FAILED
+    else:
+        email.status = EMAIL_PENDING
+        email.next_attempt_at = timezone.now() + backoff_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
@@ -0,0 +1,82 @@
+PAGE_WIDTH = 595 # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 40
+FONT_SIZE = 9
+LEADING = 12
+
+#* Just enough PDF 1.4 for monospaced text pages: one built-in font, no
+#* compression, no images. Pages are written as soon as they are full, so
+#* only the current page is ever held in memory.
+
+
+def _escape(text):
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    # * Courier only knows latin-1, anything else becomes ?
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+class TextPdfWriter:
+    """
+    Writes lines of text into a binary file object as a PDF, e.g.
+
+        with open(path, 'wb') as out:
+            pdf = TextPdfWriter(out)
+            pdf.write_line('hello')
+            pdf.close()
+    """
+    lines_per_page = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+    def __init__(self, out, title=''):
+        self.out = out
+        self.offset = 0
+        # * 1 catalog, 2 page tree, 3 font, 4 info; every page adds a content stream and a page object
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 5
+        self.lines = []
+        self.title = title
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data):
+        self.out.write(data)
+        self.offset += len(data)
+
+    def _object(self, object_id, body):
+        self.offsets[object_id] = self.offset
+        self._write(f'{object_id} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    def write_line(self, text=''):
+        self.lines.append(text)
+        if len(self.lines) == self.lines_per_page:
+            self._flush_page()
+
+    def _flush_page(self):
+        commands = [f'BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td']
+        commands += [f'({_escape(line)}) Tj T*' for line in self.lines]
+        commands.append('ET')
+        stream = '\n'.join(commands).encode('latin-1')
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, f'<< /Length {len(stream)} >>\nstream\n'.encode() + stream + b'\nendstream')
+        self._object(page_id, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode())
+        self.page_ids.append(page_id)
+        self.lines = []
+
+    def close(self):
+        if self.lines or not self.page_ids:
+            self._flush_page()
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>'.encode())
+        self._object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+        self._object(4, f'<< /Title ({_escape(self.title)}) /Producer (PayLater) >>'.encode('latin-1'))
+
+        xref_offset = self.offset
+        size = self.next_id
+        xref = [f'xref\n0 {size}\n', '0000000000 65535 f \n']
+        xref += [f'{self.offsets[object_id]:010d} 00000 n \n' for object_id in range(1, size)]
+        self._write(''.join(xref).encode())
+        self._write(f'trailer\n<< /Size {size} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
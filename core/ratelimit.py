@@ -0,0 +1,87 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+
+#* Token buckets in the Django cache, one per (route, user, ip). A bucket holds
+#* up to `burst` tokens and gains `rate` tokens per second; a request spends
+#* one or gets a 429. The bucket is a plain get/set, so two requests racing on
+#* the same key can both spend the last token; a limiter can live with that.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60): 10 requests per 60 seconds."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def rate_limit(view, rate, burst=None, methods=('POST',), scope=None):
+    """
+    Declare a url's rate limit, e.g.
+    path('transfer/', rate_limit(query_budget(TransferMoneyView.as_view(), 30), '10/m'), name='transfer')
+    burst defaults to the count in rate. Urls with the same scope share their
+    buckets; by default every url name has its own. Checked by RateLimitMiddleware.
+    """
+    count, seconds = parse_rate(rate)
+    view.rate_limit = (count / seconds, burst or count, tuple(methods), scope)
+    return view
+
+
+def client_ip(request):
+    header = getattr(settings, 'RATE_LIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        # * X-Forwarded-For: client, proxy1, proxy2
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take_token(key, rate, burst, now=None):
+    """Spend a token from the bucket at key. Returns 0 if there was one, else seconds until the next one."""
+    cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+    now = time.time() if now is None else now
+    tokens, updated = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    # * an idle bucket is full again after burst / rate seconds, no need to keep it longer
+    cache.set(key, (tokens - 1, now), timeout=int(burst / rate) + 1)
+    return 0
+
+
+class RateLimitMiddleware:
+    """
+    Answers requests over their url's rate_limit with a 429 before the view,
+    its forms or the auth middleware's user lookup run. The user comes from the
+    session, so the only db work is the session read.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        limit = getattr(view_func, 'rate_limit', None)
+        if limit is None or not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+            return None
+        rate, burst, methods, scope = limit
+        if request.method not in methods:
+            return None
+        user_id = request.session.get(SESSION_KEY, 'anon') if hasattr(request, 'session') else 'anon'
+        if scope is None:
+            scope = request.resolver_match.view_name if request.resolver_match else request.path
+        wait = take_token(f'core:ratelimit:{scope}:{user_id}:{client_ip(request)}', rate, burst)
+        if not wait:
+            return None
+        response = HttpResponse('Too many requests, please slow down.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(int(wait) + 1)
+        return response
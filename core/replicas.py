@@ -0,0 +1,153 @@
+import random
+from contextlib import contextmanager
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+#* Read replicas. Urls wrapped in read_from_replica (and the admin changelists)
+#* read from one of settings.DATABASE_REPLICAS, everything else reads and
+#* writes on default. A request that writes anything sets a cookie that keeps
+#* that client on default for REPLICA_PIN_SECONDS, long enough for the
+#* replicas to catch up, so a deposit shows up in the very next report.
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = Local()
+
+
+def read_from_replica(view):
+    """
+    Declare a url as safe to serve from a replica, e.g.
+    path('report/', read_from_replica(query_budget(TransactionReportView.as_view(), 8)), name='transaction_report')
+    Only GET and HEAD requests are routed, and only for clients that are not pinned.
+    """
+    view.read_from_replica = True
+    return view
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+class Routing:
+    def __init__(self, replica=False):
+        self.replica = replica
+        self.primary = False
+        self.wrote = False
+
+
+def current_routing():
+    return getattr(_state, 'routing', None)
+
+
+@contextmanager
+def routing(replica=False, state=None):
+    """Routing state for one request (or a test). Reads go to a replica only while replica is set."""
+    previous = current_routing()
+    _state.routing = state or Routing(replica)
+    try:
+        yield _state.routing
+    finally:
+        _state.routing = previous
+
+
+def _stream(content, state):
+    # * a streaming body is read after the middleware returned, so its queries need the state again
+    with routing(state=state):
+        yield from content
+
+
+def reads_from_replica():
+    """Whether a read right now would go to a replica."""
+    state = current_routing()
+    return state is not None and state.replica and not state.primary and not state.wrote and bool(replicas())
+
+
+@contextmanager
+def use_primary():
+    """
+    Reads inside the block go to default even on a replica url, for the few
+    reads that must see the latest commit of other clients too.
+    """
+    state = current_routing()
+    if state is None:
+        yield
+        return
+    previous, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = previous
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_routing()
+        if state is None or not state.replica or state.primary or state.wrote:
+            return None
+        # * reads inside a transaction on default (select_for_update and friends) must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        aliases = replicas()
+        return random.choice(aliases) if aliases else None
+
+    def db_for_write(self, model, **hints):
+        state = current_routing()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # * a replica holds the same rows as default
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Sets up the routing state for ReplicaRouter. Put it before SessionMiddleware
+    so a login or any other session write pins the client too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with routing() as state:
+            response = self.get_response(request)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        with routing() as state:
+            response = await self.get_response(request)
+        return self.pin(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = current_routing()
+        if state is None or request.method not in SAFE_METHODS or request.COOKIES.get(PIN_COOKIE):
+            return None
+        match = request.resolver_match
+        admin_changelist = match is not None and match.app_name == 'admin' and (match.url_name or '').endswith('_changelist')
+        if getattr(view_func, 'read_from_replica', False) or admin_changelist:
+            state.replica = True
+        return None
+
+    def pin(self, response, state):
+        if state.replica and response.streaming and not response.is_async:
+            response.streaming_content = _stream(response.streaming_content, state)
+        if state.wrote and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10), httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,31 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+#* The bank state and the account versions are invalidated by deleting or
+#* bumping a cache key. With a per-process cache (locmem, the default without
+#* CACHE_URL) only the worker that made the change sees it, so entries are
+#* kept just briefly there and the deploy check asks for a shared backend.
+
+# * worst case staleness in the other workers when the cache is not shared
+UNSHARED_TIMEOUT = 5
+
+
+def cache_is_shared():
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def shared_timeout(timeout):
+    return timeout if cache_is_shared() else min(timeout, UNSHARED_TIMEOUT)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [Warning(
+        'The default cache is per process, so a bank freeze or an account change only reaches the other '
+        f'workers after {UNSHARED_TIMEOUT}s and pages are barely cached.',
+        hint='Set CACHE_URL to a shared backend, e.g. rediscache://127.0.0.1:6379/1.',
+        id='core.W001',
+    )]
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .bank_state import invalidate_bank_state
+from .models import Bank
+
+
+@receiver(post_save, sender=Bank)
+@receiver(post_delete, sender=Bank)
+def bank_changed(sender, **kwargs):
+    invalidate_bank_state()
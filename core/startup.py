@@ -0,0 +1,88 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+#* Cold start measurements for benchmark_startup. Everything runs in a fresh
+#* interpreter, the current process has loaded the whole project already.
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+WSGI_BOOT = 'import PayLater.wsgi'
+# * the first request also builds the urlconf, which imports every view module
+WSGI_FIRST_REQUEST = WSGI_BOOT + '; from django.urls import get_resolver; get_resolver().url_patterns'
+
+
+def parse_importtime(stderr):
+    """
+    Read `python -X importtime` output into a list of
+    {'module', 'self_us', 'cumulative_us', 'depth'} dicts, in import order.
+    Time spent in modules importtime does not report lands in the importer's self time.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        own, cumulative, indent, name = match.groups()
+        modules.append({
+            'module': name,
+            'self_us': int(own),
+            'cumulative_us': int(cumulative),
+            'depth': (len(indent) - 1) // 2,
+        })
+    return modules
+
+
+def import_profile(code=WSGI_BOOT, env=None):
+    """Import profile of `code` run in a fresh interpreter. Returns (total seconds, modules)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=env or os.environ.copy(),
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    modules = parse_importtime(result.stderr)
+    total = sum(module['cumulative_us'] for module in modules if module['depth'] == 0)
+    return total / 1e6, modules
+
+
+def loaded_modules(code=WSGI_BOOT, env=None):
+    """
+    Names in sys.modules after running `code` in a fresh interpreter. -X importtime
+    does not see modules loaded with importlib.import_module, which is how
+    django.setup() loads the apps, their models and admin modules.
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', code + '; import json, sys; print(json.dumps(sorted(sys.modules)))'],
+        capture_output=True, text=True, env=env or os.environ.copy(),
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def time_command(args, repeat=5, env=None):
+    """Wall clock seconds of `args` in a new process, one sample per run."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(args, capture_output=True, text=True, env=env or os.environ.copy())
+        samples.append(time.perf_counter() - started)
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip() or f'{args[0]} exited with {result.returncode}')
+    return {
+        'runs': repeat,
+        'min_s': round(min(samples), 4),
+        'median_s': round(statistics.median(samples), 4),
+        'max_s': round(max(samples), 4),
+    }
+
+
+def top_modules(modules, key, count=15, prefix=None):
+    if prefix:
+        modules = [module for module in modules if module['module'].split('.')[0] in prefix]
+    return sorted(modules, key=lambda module: module[key], reverse=True)[:count]
@@ -0,0 +1,42 @@
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from core.account_cache import cached_for_account
+
+register = template.Library()
+
+
+class AccountCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        request = context.get('request')
+        user = getattr(request, 'user', None)
+        if not getattr(settings, 'PAGE_CACHE_ENABLED', True) or user is None or not user.is_authenticated:
+            return self.nodelist.render(context)
+        key = make_template_fragment_key(self.fragment_name, [var.resolve(context) for var in self.vary_on])
+        return cached_for_account(user.pk, key, lambda: self.nodelist.render(context))
+
+
+@register.tag('accountcache')
+def do_account_cache(parser, token):
+    """
+    Cache a fragment for the logged in user until their account changes:
+
+        {% accountcache "report" request.GET.urlencode %} .. {% endaccountcache %}
+
+    Like {% cache %}, but instead of a timeout the key holds the account
+    version that every Transactions / UserBankAccount / Loan save bumps.
+    Anonymous requests are never cached. Anything the fragment reads must be
+    loaded lazily, otherwise a cache hit still pays for the queries.
+    """
+    nodelist = parser.parse(('endaccountcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    fragment_name = bits[1].strip('"\'')
+    return AccountCacheNode(nodelist, fragment_name, [parser.compile_filter(bit) for bit in bits[2:]])
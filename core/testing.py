@@ -0,0 +1,29 @@
+from django.urls import URLPattern, URLResolver
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for the budgets declared with core.middleware.query_budget.
+    Responses that went through QueryCountMiddleware carry query_count and
+    query_budget attributes.
+    """
+
+    def assertWithinQueryBudget(self, response):
+        # * WSGI test requests carry PATH_INFO, ASGI ones path
+        path = response.request.get('PATH_INFO', response.request.get('path'))
+        budget = getattr(response, 'query_budget', None)
+        self.assertIsNotNone(budget, f'{path} has no query budget')
+        self.assertLessEqual(
+            response.query_count, budget,
+            f'{path} ran {response.query_count} queries, budget is {budget}',
+        )
+
+    def assertAllUrlsBudgeted(self, urlpatterns):
+        for pattern in urlpatterns:
+            if isinstance(pattern, URLResolver):
+                self.assertAllUrlsBudgeted(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern):
+                self.assertIsNotNone(
+                    getattr(pattern.callback, 'query_budget', None),
+                    f'url {pattern.name} does not declare a query budget',
+                )
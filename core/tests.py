@@ -1,3 +1,390 @@
-from django.test import TestCase
+import io
+import re
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserBankAccount
+from transactions.constants import DEPOSIT
+from transactions.models import Transactions
+from .account_cache import TIMEOUT as ACCOUNT_CACHE_TIMEOUT, cached_for_account
+from .bank_state import SHARED_TTL, get_bank_state, invalidate_bank_state, withdrawals_blocked, operations_frozen
+from .benchmark import Runner, compare, percentile, seed
+from .constants import EMAIL_PENDING, EMAIL_SENT, EMAIL_FAILED, EMAIL_SENDING
+from .models import Bank, OutboundEmail
+from .outbox import enqueue_email, deliver_pending, claim_batch, SEND_LEASE
+from .pdf import TextPdfWriter
+from .middleware import QueryCountMiddleware
+from .ratelimit import take_token
+from .shared_cache import UNSHARED_TIMEOUT, check_shared_cache, shared_timeout
+from .replicas import PIN_COOKIE, ReplicaRouter, routing, use_primary
+from .startup import WSGI_BOOT, WSGI_FIRST_REQUEST, parse_importtime, loaded_modules
 
-# Create your tests here.
+
+class BrokenConnection:
+    def open(self):
+        return True
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError('smtp down')
+
+
+class OutboxTests(TestCase):
+    def test_enqueue_does_not_send(self):
+        enqueue_email('a@example.com', 'Deposit Message', '<h3>hi</h3>')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status=EMAIL_PENDING).count(), 1)
+
+    def test_worker_sends_batch(self):
+        for i in range(3):
+            enqueue_email(f'user{i}@example.com', 'Deposit Message', '<h3>hi</h3>')
+        self.assertEqual(deliver_pending(batch_size=10), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutboundEmail.objects.filter(status=EMAIL_SENT).count(), 3)
+        self.assertEqual(deliver_pending(batch_size=10), (0, 0))
+
+    def test_failure_backs_off_then_gives_up(self):
+        email = enqueue_email('a@example.com', 'Deposit Message', '<h3>hi</h3>')
+        self.assertEqual(deliver_pending(connection=BrokenConnection()), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # * not due yet, so the worker leaves it alone
+        self.assertEqual(deliver_pending(connection=BrokenConnection()), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        deliver_pending(max_attempts=2, connection=BrokenConnection())
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_FAILED)
+
+    def test_claimed_rows_are_marked_before_sending(self):
+        email = enqueue_email('a@example.com', 'Deposit Message', '<h3>hi</h3>')
+        statuses = []
+
+        class WatchingConnection(BrokenConnection):
+            def send_messages(self, messages):
+                # * the claim is committed already, another worker would skip the row
+                statuses.append(OutboundEmail.objects.get(pk=email.pk).status)
+                return len(messages)
+
+        self.assertEqual(deliver_pending(connection=WatchingConnection()), (1, 0))
+        self.assertEqual(statuses, [EMAIL_SENDING])
+
+    def test_stale_claims_are_taken_again(self):
+        email = enqueue_email('a@example.com', 'Deposit Message', '<h3>hi</h3>')
+        self.assertEqual(claim_batch(), [email])
+        self.assertEqual(claim_batch(), [])
+        OutboundEmail.objects.update(claimed_at=timezone.now() - SEND_LEASE - timedelta(seconds=1))
+        self.assertEqual(deliver_pending(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EMAIL_SENT)
+
+
+class BankStateTests(TestCase):
+    def setUp(self):
+        invalidate_bank_state()
+
+    def test_state_is_cached(self):
+        self.assertFalse(withdrawals_blocked())
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.assertFalse(withdrawals_blocked())
+
+    def test_saving_a_bank_invalidates(self):
+        get_bank_state()
+        bank = Bank.objects.create(is_bankrupt=True)
+        self.assertTrue(withdrawals_blocked())
+        self.assertFalse(operations_frozen())
+        bank.is_frozen = True
+        bank.save()
+        self.assertTrue(operations_frozen())
+        bank.delete()
+        self.assertFalse(withdrawals_blocked())
+
+    def test_per_process_cache_keeps_state_briefly(self):
+        with mock.patch('core.bank_state.cache') as shared:
+            shared.get.return_value = None
+            get_bank_state()
+        self.assertEqual(shared.set.call_args.args[2], UNSHARED_TIMEOUT)
+        self.assertEqual([w.id for w in check_shared_cache(None)], ['core.W001'])
+
+        dummy = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy):
+            self.assertEqual(shared_timeout(SHARED_TTL), SHARED_TTL)
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class QueryStatsTests(TestCase):
+    def setUp(self):
+        QueryCountMiddleware.reset_stats()
+        self.addCleanup(QueryCountMiddleware.reset_stats)
+
+    def test_only_resolved_views_are_counted(self):
+        for i in range(3):
+            self.client.get(reverse('home'))
+            self.client.get(f'/no/such/page/{i}/')
+        self.assertEqual(list(QueryCountMiddleware.stats), ['home'])
+        view, calls, queries, db_ms, worst = QueryCountMiddleware.slowest()[0]
+        self.assertEqual((view, calls), ('home', 3))
+
+    @override_settings(QUERY_STATS_LOG_EVERY=2)
+    def test_summary_is_logged(self):
+        with self.assertLogs('core.queries', 'INFO') as logs:
+            self.client.get(reverse('home'))
+            self.client.get(reverse('home'))
+        self.assertIn('home: 2 requests', logs.output[0])
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class BenchmarkHarnessTests(TestCase):
+    def test_seed_and_run_a_scenario(self):
+        cache.clear()
+        accounts = seed(2, 3, loans_per_user=1)
+        self.assertEqual(len(accounts), 2)
+        self.assertEqual(Transactions.objects.filter(account=accounts[0]).count(), 4)
+        scenario = [
+            {'name': 'report', 'url': 'transaction_report', 'repeat': 3},
+            {'name': 'deposit', 'method': 'post', 'url': 'deposit_money', 'data': {'amount': 100, 'transaction_type': DEPOSIT}, 'repeat': 2},
+        ]
+        result = Runner(accounts).run(scenario)
+        self.assertEqual(result['report']['requests'], 3)
+        self.assertEqual(result['report']['statuses'], {'200': 3})
+        self.assertGreater(result['report']['queries_mean'], 0)
+        self.assertEqual(result['deposit']['statuses'], {'302': 2})
+
+    def test_percentile_and_compare(self):
+        values = list(range(10, 0, -1))
+        self.assertEqual([percentile(values, pct) for pct in (0, 50, 95, 99)], [1, 5, 10, 10])
+        self.assertEqual(percentile([7], 99), 7)
+        old = {'endpoints': {'report': {'p50_ms': 10, 'queries_mean': 4, 'throughput_rps': 0}, 'gone': {'p50_ms': 1}}}
+        new = {'endpoints': {'report': {'p50_ms': 5, 'queries_mean': 4, 'throughput_rps': 9}, 'new': {'p50_ms': 1}}}
+        self.assertEqual(compare(old, new), [('report', 'p50_ms', 10, 5, -50.0), ('report', 'queries_mean', 4, 4, 0.0)])
+
+
+class TextPdfWriterTests(TestCase):
+    def test_pages_and_xref(self):
+        out = io.BytesIO()
+        pdf = TextPdfWriter(out, title='Statement (test)')
+        for i in range(TextPdfWriter.lines_per_page + 5):
+            pdf.write_line(f'line {i} (with parens) \\ and tk\u09f3')
+        pdf.close()
+        data = out.getvalue()
+
+        self.assertTrue(data.startswith(b'%PDF-1.4'))
+        self.assertTrue(data.endswith(b'%%EOF\n'))
+        self.assertIn(b'/Count 2', data)
+        self.assertIn(b'(line 0 \\(with parens\\) ', data)
+        startxref = int(re.search(rb'startxref\n(\d+)', data).group(1))
+        self.assertTrue(data[startxref:].startswith(b'xref'))
+        entries = re.findall(rb'(\d{10}) 00000 n', data[startxref:])
+        for object_id, offset in enumerate(entries, start=1):
+            self.assertTrue(data[int(offset):].startswith(f'{object_id} 0 obj'.encode()), object_id)
+
+    def test_empty_document_has_one_page(self):
+        out = io.BytesIO()
+        TextPdfWriter(out).close()
+        self.assertIn(b'/Count 1', out.getvalue())
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # * a frozen clock, so slow password hashing can not refill a bucket mid test
+        clock = mock.patch('core.ratelimit.time')
+        clock.start().time.return_value = 1_000_000.0
+        self.addCleanup(clock.stop)
+
+    def test_token_bucket(self):
+        self.assertEqual(take_token('bucket', rate=1, burst=2, now=100), 0)
+        self.assertEqual(take_token('bucket', rate=1, burst=2, now=100), 0)
+        self.assertAlmostEqual(take_token('bucket', rate=1, burst=2, now=100.25), 0.75)
+        self.assertEqual(take_token('bucket', rate=1, burst=2, now=101), 0)
+
+    def test_login_is_limited_before_any_db_work(self):
+        for i in range(5):
+            response = self.client.post(reverse('login'), {'username': 'nobody', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('login'), {'username': 'nobody', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # * other addresses and plain GETs are not affected
+        self.assertEqual(self.client.post(reverse('login'), {'username': 'nobody'}, REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.assertEqual(self.client.get(reverse('login')).status_code, 200)
+
+    async def test_users_get_their_own_buckets_shared_across_sync_and_async(self):
+        alice = await User.objects.acreate(username='alice')
+        bob = await User.objects.acreate(username='bob')
+        client = AsyncClient()
+        await client.aforce_login(alice)
+        # * no bank account, so every post is cheap; only the bucket matters here
+        statuses = [(await client.post(reverse(name))).status_code for name in ['transfer', 'async_transfer'] * 5]
+        self.assertNotIn(429, statuses)
+        self.assertEqual((await client.post(reverse('async_transfer'))).status_code, 429)
+        await client.aforce_login(bob)
+        self.assertNotEqual((await client.post(reverse('transfer'))).status_code, 429)
+
+
+class StartupTests(TestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     core.outbox\n'
+            'import time:       394 |        514 |   transactions.emails\n'
+            'import time:     40000 |     280000 | PayLater.wsgi\n'
+            'some warning\n'
+        )
+        modules = parse_importtime(stderr)
+        self.assertEqual([m['module'] for m in modules], ['core.outbox', 'transactions.emails', 'PayLater.wsgi'])
+        self.assertEqual([m['depth'] for m in modules], [2, 1, 0])
+        self.assertEqual(modules[1]['self_us'], 394)
+        self.assertEqual(modules[1]['cumulative_us'], 514)
+
+    def test_wsgi_boot_does_not_load_views(self):
+        #* views, forms ar bulk shudhu prothom request e urlconf load hole
+        lazy = ['transactions.views', 'transactions.forms', 'transactions.bulk', 'transactions.statements', 'accounts.views']
+        booted = set(loaded_modules(WSGI_BOOT))
+        self.assertIn('transactions.admin', booted)
+        self.assertEqual([name for name in lazy if name in booted], [])
+        self.assertTrue(set(lazy) <= set(loaded_modules(WSGI_FIRST_REQUEST)))
+
+
+class HomePageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_is_cached(self):
+        first = self.client.get(reverse('home'))
+        with self.assertTemplateNotUsed('index.html'):
+            second = self.client.get(reverse('home'))
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'Welcome to PayLater')
+
+    def test_logged_in_and_disabled_render(self):
+        user = User.objects.create_user(username='alice', first_name='Alice', password='pass')
+        self.client.get(reverse('home'))
+        self.client.force_login(user)
+        with self.assertTemplateUsed('index.html'):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Welcome, Alice')
+        self.client.logout()
+        with override_settings(PAGE_CACHE_ENABLED=False), self.assertTemplateUsed('index.html'):
+            self.client.get(reverse('home'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_a_replica_only_when_routed(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(User))
+        with routing(replica=False):
+            self.assertIsNone(router.db_for_read(User))
+        with routing(replica=True):
+            self.assertIn(router.db_for_read(User), ['replica1', 'replica2'])
+            with use_primary():
+                self.assertIsNone(router.db_for_read(User))
+            self.assertIn(router.db_for_read(User), ['replica1', 'replica2'])
+
+    def test_a_write_keeps_the_rest_of_the_request_on_default(self):
+        router = ReplicaRouter()
+        with routing(replica=True) as state:
+            self.assertEqual(router.db_for_write(User), 'default')
+            self.assertTrue(state.wrote)
+            self.assertIsNone(router.db_for_read(User))
+
+    @mock.patch('core.account_cache.shared_timeout', lambda timeout: timeout)
+    @mock.patch('core.account_cache.cache')
+    def test_replica_builds_are_cached_briefly(self, shared):
+        shared.get.return_value = None
+        with routing(replica=True):
+            cached_for_account(1, 'rows', lambda: 'from replica')
+            with use_primary():
+                cached_for_account(1, 'rows', lambda: 'from primary')
+        timeouts = [call.args[2] for call in shared.set.call_args_list]
+        self.assertEqual(timeouts, [5, ACCOUNT_CACHE_TIMEOUT])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        with routing(replica=True):
+            self.assertIsNone(ReplicaRouter().db_for_read(User))
+
+
+@skipUnless(getattr(settings, 'DATABASE_REPLICAS', None), 'set DB_REPLICA_URLS to test against a second database')
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Two real databases and no replication between them: rows only the replica
+    has show which database a page was read from.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.replica = settings.DATABASE_REPLICAS[0]
+        user = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        account = UserBankAccount.objects.create(
+            user=user, account_type='Savings', account_no=100001, birth_date=date(1990, 1, 1), gender='Male', balance=1000,
+        )
+        self.client.force_login(user)
+        # * what replication would have copied so far
+        for obj in [user, account, *Session.objects.all()]:
+            obj.save(using=self.replica, force_insert=True)
+        Transactions.objects.using(self.replica).bulk_create([
+            Transactions(account=account, amount=4242, balance_after_transaction=1000, transaction_type=DEPOSIT),
+        ])
+
+    def export(self):
+        response = self.client.get(reverse('transaction_export'), {'format': 'csv'})
+        return b''.join(response.streaming_content).decode()
+
+    def test_reports_read_the_replica(self):
+        self.assertIn('4242', self.export())
+        self.assertContains(self.client.get(reverse('transaction_report')), '4,242')
+        # * not a replica url
+        self.assertEqual(self.client.get(reverse('deposit_money')).status_code, 200)
+        self.assertNotIn(PIN_COOKIE, self.client.cookies)
+
+    async def test_async_report_reads_the_replica(self):
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse('async_transaction_report'))
+        self.assertContains(response, '4,242')
+
+    def test_cached_report_is_built_on_the_replica(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[self.replica]) as replica:
+            self.assertContains(self.client.get(reverse('transaction_report')), '4,242')
+        self.assertTrue([q for q in replica if 'transactions_transactions' in q['sql']])
+        self.assertFalse([q for q in primary if 'transactions_' in q['sql']])
+
+        # * a second view of the page comes from the fragment cache
+        with CaptureQueriesContext(connections[self.replica]) as replica:
+            self.assertContains(self.client.get(reverse('transaction_report')), '4,242')
+        self.assertFalse([q for q in replica if 'transactions_transactions' in q['sql']])
+
+    def test_own_write_pins_the_client_to_default(self):
+        response = self.client.post(reverse('deposit_money'), {'amount': 200, 'transaction_type': DEPOSIT})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        export = self.export()
+        self.assertIn('200', export)
+        self.assertNotIn('4242', export)
+        # * once the pin expires the replica is read again
+        del self.client.cookies[PIN_COOKIE]
+        self.assertIn('4242', self.export())
+
+    def test_transactions_stay_on_default(self):
+        with routing(replica=True):
+            self.assertEqual(Transactions.objects.count(), 1)
+            with transaction.atomic():
+                self.assertEqual(Transactions.objects.count(), 0)
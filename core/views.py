@@ -1,5 +1,41 @@
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.translation import get_language
 from django.views.generic import TemplateView
 # Create your views here.
-class HomeView(TemplateView):
-    template_name = 'index.html'
\ No newline at end of file
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve the rendered page from the cache to visitors who are not logged in.
+    Logged in users and requests with pending messages always get a fresh
+    render, the cached copy is the same bytes for everyone else.
+    """
+    page_cache_seconds = None
+
+    def get_page_cache_key(self):
+        return f'core:page:{self.request.path}:{get_language()}'
+
+    def get(self, request, *args, **kwargs):
+        if (
+            not getattr(settings, 'PAGE_CACHE_ENABLED', True)
+            or request.user.is_authenticated
+            or list(get_messages(request))
+        ):
+            return super().get(request, *args, **kwargs)
+        key = self.get_page_cache_key()
+        cached = cache.get(key)
+        if cached is None:
+            response = super().get(request, *args, **kwargs).render()
+            cached = (response.content, response['Content-Type'])
+            timeout = self.page_cache_seconds or getattr(settings, 'HOME_PAGE_CACHE_SECONDS', 600)
+            cache.set(key, cached, timeout)
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+
+class HomeView(AnonymousPageCacheMixin, TemplateView):
+    template_name = 'index.html'
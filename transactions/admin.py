@@ -1,20 +1,156 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-from .models import Transactions, TransferMoney
-from .views import send_transaction_email
+from .constants import LOAN_REQUESTED, LOAN_APPROVED, LOAN_REJECTED, LOAN_REPAID
+from .models import Transactions, TransactionArchive, TransferMoney, Loan, Posting, StatementJob
+from .emails import send_transaction_email
+from .ledger import approve_loan, reject_loan, repay_loan, InvalidLoanState, InsufficientFunds
+from core.bank_state import operations_frozen
 # admin.site.register(Transactions)
 
 # *this decorator allows us to modify what to show in the admin interface
 @admin.register(Transactions)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['account', 'amount', 'balance_after_transaction', 'transaction_type', 'loan_approve']
-    
+    list_display = ['account', 'amount', 'balance_after_transaction', 'transaction_type', 'timestamp']
+
+    #* history shudhu ledger likhe, admin theke bodlale DailyBalance, postings ar open_loans mele na
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    # * only archive_transactions writes here
+    list_display = ['id', 'account', 'amount', 'balance_after_transaction', 'transaction_type', 'timestamp', 'archived_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Loan)
+class LoanAdmin(admin.ModelAdmin):
+    list_display = ['id', 'account', 'amount', 'status', 'timestamp', 'decided_at', 'repaid_at']
+    list_filter = ['status']
+    readonly_fields = ['decided_at', 'repaid_at']
+    actions = ['approve_selected', 'reject_selected']
+    transitions = {
+        LOAN_APPROVED: approve_loan,
+        LOAN_REJECTED: reject_loan,
+        LOAN_REPAID: repay_loan,
+    }
+
+    def get_readonly_fields(self, request, obj=None):
+        #* decide howar pore taka, postings ar open_loans ei amount/account dhore ache
+        if obj is not None and obj.status != LOAN_REQUESTED:
+            return [*self.readonly_fields, 'account', 'amount']
+        return self.readonly_fields
+
+    def has_delete_permission(self, request, obj=None):
+        # * only loans nobody decided on yet, the rest are part of the ledger
+        if obj is not None and obj.status != LOAN_REQUESTED:
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def get_actions(self, request):
+        # * bulk delete would not look at the status of each loan
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
     def save_model(self, request, obj, form, change):
-        if obj.loan_approve == True:
-            obj.account.balance += obj.amount
-            obj.balance_after_transaction = obj.account.balance
-            obj.account.save()
-            send_transaction_email(obj.account.user, obj.amount, "Loan Approved",'transactions/loan_approve.html')
-        super().save_model(request, obj, form, change)
-
-admin.site.register(TransferMoney)
\ No newline at end of file
+        #* status admin form theke save hoy na, ledger bodlay ar taka o tokhon move kore
+        status = obj.status
+        if change and 'status' in form.changed_data:
+            fields = [name for name in form.changed_data if name != 'status']
+            if fields:
+                obj.save(update_fields=fields)
+            self.move(request, obj, status)
+        elif not change and status != LOAN_REQUESTED:
+            obj.status = LOAN_REQUESTED
+            obj.save()
+            self.move(request, obj, status)
+        else:
+            super().save_model(request, obj, form, change)
+
+    def move(self, request, loan, status):
+        if status == LOAN_APPROVED and operations_frozen():
+            self.message_user(request, 'Transactions are frozen, the loan was not approved.', messages.ERROR)
+            return
+        transition = self.transitions.get(status)
+        try:
+            if transition is None:
+                raise InvalidLoanState(f'Loan {loan.pk} can not become {status}')
+            transition(loan)
+        except (InvalidLoanState, InsufficientFunds) as error:
+            self.message_user(request, str(error), messages.ERROR)
+            return
+        if status == LOAN_APPROVED:
+            send_transaction_email(loan.account.user, loan.amount, "Loan Approved",'transactions/loan_approve.html')
+
+    @admin.action(description='Approve selected loans')
+    def approve_selected(self, request, queryset):
+        if operations_frozen():
+            self.message_user(request, 'Transactions are frozen, no loan was approved.', messages.ERROR)
+            return
+        self.decide(request, queryset, LOAN_APPROVED)
+
+    @admin.action(description='Reject selected loans')
+    def reject_selected(self, request, queryset):
+        self.decide(request, queryset, LOAN_REJECTED)
+
+    def decide(self, request, queryset, status):
+        #* ek ek kore na, chunk e transaction + bulk F() credit + bulk mail
+        # * imported here so the admin does not load the bulk csv machinery at startup
+        from .bulk import decide_loans
+        batches = list(decide_loans(queryset.values_list('pk', flat=True), status))
+        selected = sum(batch.selected for batch in batches)
+        decided = sum(batch.decided for batch in batches)
+        seconds = sum(batch.seconds for batch in batches)
+        rate = decided / seconds if seconds else 0
+        # * loans that were already decided are skipped, so decided can be less than selected
+        self.message_user(
+            request,
+            f'{decided} of {selected} selected loans {status} in {len(batches)} batches ({rate:.0f} loans/s).',
+            messages.SUCCESS,
+        )
+
+
+@admin.register(Posting)
+class PostingAdmin(admin.ModelAdmin):
+    #* ledger shudhu dekha jabe, bodlano jabe na
+    list_display = ['id', 'entry', 'kind', 'book', 'account', 'amount', 'timestamp']
+    list_filter = ['kind', 'book']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransferMoney)
+class TransferMoneyAdmin(admin.ModelAdmin):
+    list_display = ['id', 'sender', 'receiver', 'amount', 'timestamp']
+    list_select_related = ['sender', 'receiver']
+    raw_id_fields = ['sender', 'receiver']
+
+
+@admin.register(StatementJob)
+class StatementJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'account', 'month', 'format', 'status', 'rows', 'requested_at', 'started_at', 'generated_at']
+    list_filter = ['status', 'format', 'month']
+    raw_id_fields = ['account']
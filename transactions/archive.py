@@ -0,0 +1,83 @@
+import heapq
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+from .models import Transactions, TransactionArchive
+
+#* Transactions older than TRANSACTION_ARCHIVE_MONTHS whole months move to
+#* TransactionArchive, run monthly by manage.py archive_transactions. Rows keep
+#* their id, so a (timestamp, id) cursor or ordering covers both tables. Readers
+#* only look at the archive when the range they read starts before
+#* archive_cutoff(), anything after it is always in Transactions.
+
+FIELDS = ['id', 'account_id', 'amount', 'balance_after_transaction', 'transaction_type', 'timestamp']
+
+
+def archive_months():
+    return getattr(settings, 'TRANSACTION_ARCHIVE_MONTHS', 12)
+
+
+def archive_cutoff(months=None, today=None):
+    """
+    First moment that is never archived: the start of the month `months`
+    months before the current one.
+    """
+    month = (today or timezone.localdate()).replace(day=1)
+    for _ in range(archive_months() if months is None else months):
+        month = (month - timedelta(days=1)).replace(day=1)
+    return timezone.make_aware(datetime.combine(month, time.min), timezone.get_current_timezone())
+
+
+def reaches_archive(start):
+    """Whether rows from `start` on (None for the whole history) may be in the archive."""
+    return start is None or start < archive_cutoff()
+
+
+def by_time(row):
+    return row.timestamp, row.pk
+
+
+def merge_history(live, archived, key=by_time):
+    """Two (timestamp, id) ordered iterables as one, e.g. a .iterator() over each table."""
+    return heapq.merge(archived, live, key=key)
+
+
+def archive_chunk(cutoff, chunk_size=2000):
+    """
+    Move the oldest chunk_size rows before cutoff in one short transaction.
+    Returns how many moved, 0 once nothing is left.
+    """
+    db = router.db_for_write(Transactions)
+    with transaction.atomic(using=db):
+        rows = list(
+            Transactions.objects.using(db).filter(timestamp__lt=cutoff)
+            .order_by('id').values(*FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return 0
+        # * a crashed run may have copied some of these already
+        TransactionArchive.objects.using(db).bulk_create(
+            [TransactionArchive(**row) for row in rows], ignore_conflicts=True,
+        )
+        # * plain DELETE on purpose: queryset.delete() sends post_delete for every row, and the
+        # * Transactions receiver loads each row's account to invalidate its cache. Nothing points at
+        # * Transactions and nothing cached changes, readers see the same history from either table
+        ids = [row['id'] for row in rows]
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE id IN (%s)' % (
+                    connections[db].ops.quote_name(Transactions._meta.db_table), ', '.join(['%s'] * len(ids)),
+                ),
+                ids,
+            )
+    return len(rows)
+
+
+def archive_before(cutoff, chunk_size=2000):
+    """Move every row before cutoff, chunk by chunk. Yields the size of each chunk."""
+    while True:
+        moved = archive_chunk(cutoff, chunk_size)
+        if not moved:
+            return
+        yield moved
@@ -0,0 +1,112 @@
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseRedirect
+from accounts.models import UserBankAccount
+from transactions.emails import asend_transaction_email
+from transactions.ledger import deposit, withdraw, transfer, InsufficientFunds
+from transactions.snapshots import range_summary
+from transactions.views import DepositMoneyView, WithdrawMoneyView, TransferMoneyView, TransactionReportView
+
+#* ASGI er jonno async version. Plain read gulo async ORM diye, ledger er kaj
+#* transaction.atomic lage tai sync_to_async diye thread e chole.
+
+
+class AsyncAccountMixin:
+    """
+    Loads the user and account without blocking the event loop and puts them on
+    the request, so the sync mixins and templates further down never hit the db
+    for request.user or request.account.
+    """
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await sync_to_async(get_user)(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        try:
+            self.account = await UserBankAccount.objects.select_related('user').aget(user_id=user.pk)
+        except UserBankAccount.DoesNotExist:
+            raise Http404('No bank account for this user')
+        request.user = self.account.user
+        request.account = self.account
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncFormMixin(AsyncAccountMixin):
+    async def get(self, request, *args, **kwargs):
+        self.object = None
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        self.object = None
+        form = self.get_form()
+        # * clean methods may read the bank state or look up the receiver
+        if await sync_to_async(form.is_valid)():
+            return await self.aform_valid(form)
+        return self.form_invalid(form)
+
+
+class AsyncDepositMoneyView(AsyncFormMixin, DepositMoneyView):
+    async def aform_valid(self, form):
+        amount = form.cleaned_data.get('amount')
+        self.object = await sync_to_async(deposit)(self.account, amount)
+        messages.success(
+            self.request,
+            f'{"{:,.2f}".format(float(amount))}$ was deposited to your account.'
+        )
+        await asend_transaction_email(self.request.user, amount, "Deposit Message",'transactions/deposit_email.html')
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class AsyncWithdrawMoneyView(AsyncFormMixin, WithdrawMoneyView):
+    async def aform_valid(self, form):
+        amount = form.cleaned_data.get('amount')
+        try:
+            self.object = await sync_to_async(withdraw)(self.account, amount)
+        except InsufficientFunds:
+            await self.account.arefresh_from_db(fields=['balance', 'open_loans'])
+            form.add_error('amount', 'You can not withdraw more than your account balance')
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request,
+            f'Successfully withdrawn {"{:,.2f}".format(float(amount))}$ from your account'
+        )
+        await asend_transaction_email(self.request.user, amount, "Withdrawal Message",'transactions/withdraw_email.html')
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class AsyncTransferMoneyView(AsyncFormMixin, TransferMoneyView):
+    async def aform_valid(self, form):
+        amount = form.cleaned_data.get('amount')
+        receiver_account = form.cleaned_data.get('receiver')
+        try:
+            self.object = await sync_to_async(transfer)(self.account, receiver_account, amount)
+        except InsufficientFunds:
+            await self.account.arefresh_from_db(fields=['balance', 'open_loans'])
+            form.add_error('amount', 'Enter a valid amount!')
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request,
+            f'Successfully sent {"{:,.2f}".format(float(amount))}$ to {receiver_account.account_no}.'
+        )
+        await asend_transaction_email(self.request.user, amount, "Money Transferred",'transactions/transfer_email.html')
+        await asend_transaction_email(receiver_account.user, amount, "Money Received!",'transactions/receiver_email.html')
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class AsyncTransactionReportView(AsyncAccountMixin, TransactionReportView):
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.filter_report(self.model.objects.all())
+        if self.date_range:
+            self.summary = await sync_to_async(range_summary)(self.account, *self.date_range)
+            self.balance = self.summary['total']
+        else:
+            self.balance = self.account.balance
+        self.object_list = await self.apaginate_keyset(queryset, *self.archived)
+        return self.render_to_response(self.get_context_data())
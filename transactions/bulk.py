@@ -0,0 +1,285 @@
+import csv
+import io
+import json
+import time
+from collections import defaultdict, namedtuple
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from accounts.models import UserBankAccount
+from core.account_cache import invalidate_account
+from core.outbox import enqueue_email, enqueue_emails
+from .constants import TRANSFER_SENT, TRANSFER_RECEIVED, LOAN, LOAN_APPROVED, LOAN_REJECTED, BOOK_LOANS
+from .ledger import transition_sources
+from .models import Transactions, TransferMoney, Loan
+from .postings import move, record_postings
+from .snapshots import record_transactions
+
+CHUNK_SIZE = 500
+LOAN_CHUNK_SIZE = 500
+MAX_AMOUNT = Decimal(10) ** 10 # DecimalField(max_digits=12, decimal_places=2)
+
+OK = 'ok'
+INVALID_ROW = 'invalid_row'
+INVALID_AMOUNT = 'invalid_amount'
+UNKNOWN_RECEIVER = 'unknown_receiver'
+SELF_TRANSFER = 'self_transfer'
+INSUFFICIENT_FUNDS = 'insufficient_funds'
+
+
+class BulkRow:
+    def __init__(self, line, receiver, amount):
+        self.line = line
+        self.receiver = receiver
+        self.amount = amount
+        self.status = None
+        self.error = ''
+
+    def fail(self, status, error):
+        self.status = status
+        self.error = error
+
+    def as_dict(self):
+        return {
+            'line': self.line,
+            'receiver': self.receiver,
+            'amount': str(self.amount),
+            'status': self.status,
+            'error': self.error,
+        }
+
+
+def parse_transfer_file(fileobj, fmt):
+    """
+    Read (receiver, amount) pairs from a CSV or JSONL file. Bad lines are kept
+    as rows with an error status so they still show up in the report.
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8') if isinstance(fileobj.read(0), bytes) else fileobj
+    rows = []
+    if fmt == 'jsonl':
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                data = json.loads(raw)
+                rows.append(BulkRow(line, data['receiver'], data['amount']))
+            except (ValueError, KeyError, TypeError) as exc:
+                row = BulkRow(line, '', '')
+                row.fail(INVALID_ROW, f'Could not parse line: {exc}')
+                rows.append(row)
+    else:
+        for line, record in enumerate(csv.reader(text), start=1):
+            if not record:
+                continue
+            if line == 1 and record[0].strip().lower() == 'receiver':
+                continue # header
+            if len(record) != 2:
+                row = BulkRow(line, '', '')
+                row.fail(INVALID_ROW, 'Expected two columns: receiver, amount')
+                rows.append(row)
+                continue
+            rows.append(BulkRow(line, record[0].strip(), record[1].strip()))
+    return rows
+
+
+def _clean(rows, sender):
+    for row in rows:
+        if row.status:
+            continue
+        try:
+            row.receiver = int(row.receiver)
+            row.amount = Decimal(str(row.amount))
+        except (ValueError, TypeError, InvalidOperation):
+            row.fail(INVALID_ROW, 'Receiver must be an account number and amount a number')
+            continue
+        if not row.amount.is_finite() or not 0 < row.amount < MAX_AMOUNT or row.amount.as_tuple().exponent < -2:
+            row.fail(INVALID_AMOUNT, 'Enter a valid amount!')
+        elif row.receiver == sender.account_no:
+            row.fail(SELF_TRANSFER, 'Can not transfer to your own account')
+
+    # * one query for every receiver in the file
+    wanted = {row.receiver for row in rows if not row.status}
+    receivers = UserBankAccount.objects.select_related('user').in_bulk(list(wanted), field_name='account_no')
+    for row in rows:
+        if not row.status and row.receiver not in receivers:
+            row.fail(UNKNOWN_RECEIVER, 'Account not found!')
+    return receivers
+
+
+def run_bulk_transfer(sender, rows, chunk_size=CHUNK_SIZE, notify=True):
+    """
+    Pay every valid row from sender. Each chunk is applied in its own
+    transaction: the sender is debited once for the chunk total, receivers are
+    credited with one bulk_update and the TransferMoney / Transactions rows are
+    written with bulk_create. A chunk the sender can not cover is skipped as a
+    whole. Returns the rows with their final status.
+    """
+    receivers = _clean(rows, sender)
+    pending = [row for row in rows if not row.status]
+    for start in range(0, len(pending), chunk_size):
+        _apply_chunk(sender, pending[start:start + chunk_size], receivers, notify)
+
+    sent = sum(row.amount for row in pending if row.status == OK)
+    if notify and sent:
+        enqueue_email(
+            sender.user.email,
+            "Money Transferred",
+            render_to_string('transactions/transfer_email.html', {'user': sender.user, 'amount': sent}),
+        )
+    return rows
+
+
+def _apply_chunk(sender, chunk, receivers, notify):
+    total = sum(row.amount for row in chunk)
+    credits = defaultdict(Decimal)
+    for row in chunk:
+        credits[receivers[row.receiver].pk] += row.amount
+
+    with transaction.atomic():
+        ids = sorted(set(credits) | {sender.pk})
+        locked = {
+            pk: balance
+            for pk, balance in UserBankAccount.objects.select_for_update()
+            .filter(pk__in=ids).order_by('pk').values_list('pk', 'balance')
+        }
+        debited = UserBankAccount.objects.filter(pk=sender.pk, balance__gte=total).update(
+            balance=F('balance') - total
+        )
+        if not debited:
+            for row in chunk:
+                row.fail(INSUFFICIENT_FUNDS, 'Chunk total is more than the sender balance')
+            return
+
+        accounts = []
+        for pk, amount in credits.items():
+            account = UserBankAccount(pk=pk)
+            account.balance = F('balance') + amount
+            accounts.append(account)
+        UserBankAccount.objects.bulk_update(accounts, ['balance'])
+
+        sender_balance = locked[sender.pk]
+        running = dict(locked)
+        transfers = []
+        history = []
+        postings = []
+        for row in chunk:
+            receiver = receivers[row.receiver]
+            sender_balance -= row.amount
+            running[receiver.pk] += row.amount
+            transfers.append(TransferMoney(sender=sender, receiver=receiver, amount=row.amount))
+            postings += move(TRANSFER_SENT, sender, receiver, row.amount)
+            history.append(Transactions(
+                account=sender, amount=row.amount,
+                balance_after_transaction=sender_balance, transaction_type=TRANSFER_SENT,
+            ))
+            history.append(Transactions(
+                account=receiver, amount=row.amount,
+                balance_after_transaction=running[receiver.pk], transaction_type=TRANSFER_RECEIVED,
+            ))
+            row.status = OK
+        TransferMoney.objects.bulk_create(transfers)
+        record_postings(postings)
+        record_transactions(Transactions.objects.bulk_create(history))
+        invalidate_account(sender.user_id, *{receivers[row.receiver].user_id for row in chunk})
+        sender.balance = sender_balance
+
+        if notify:
+            by_pk = {receivers[row.receiver].pk: receivers[row.receiver] for row in chunk}
+            mails = []
+            for pk, amount in credits.items():
+                receiver = by_pk[pk]
+                receiver.balance = running[pk]
+                mails.append((
+                    receiver.user.email,
+                    "Money Received!",
+                    render_to_string('transactions/receiver_email.html', {'user': receiver.user, 'amount': amount}),
+                ))
+            enqueue_emails(mails)
+
+
+LoanBatch = namedtuple('LoanBatch', ['selected', 'decided', 'seconds'])
+
+LOAN_EMAILS = {
+    LOAN_APPROVED: ("Loan Approved", 'transactions/loan_approve.html'),
+    LOAN_REJECTED: ("Loan Rejected", 'transactions/loan_reject.html'),
+}
+
+
+def decide_loans(loan_ids, status, chunk_size=LOAN_CHUNK_SIZE, notify=True):
+    """
+    Approve or reject many loans, one transaction per chunk of ids. Loans that
+    can not move to status any more (decided by someone else meanwhile) are
+    skipped. Yields a LoanBatch per chunk so callers can report throughput.
+    """
+    if status not in LOAN_EMAILS:
+        raise ValueError(f'Loans can only be approved or rejected in bulk, not {status}')
+    loan_ids = sorted(set(loan_ids))
+    for start in range(0, len(loan_ids), chunk_size):
+        chunk = loan_ids[start:start + chunk_size]
+        started = time.perf_counter()
+        decided = _decide_chunk(chunk, status, notify)
+        yield LoanBatch(len(chunk), decided, time.perf_counter() - started)
+
+
+def _decide_chunk(loan_ids, status, notify):
+    with transaction.atomic():
+        # * same lock order as ledger.approve_loan: loan rows first, then accounts in pk order
+        loans = list(
+            Loan.objects.select_for_update(of=('self',)).select_related('account__user')
+            .filter(pk__in=loan_ids, status__in=transition_sources(status)).order_by('pk')
+        )
+        if not loans:
+            return 0
+        Loan.objects.filter(pk__in=[loan.pk for loan in loans]).update(status=status, decided_at=timezone.now())
+        if status == LOAN_APPROVED:
+            _credit_loans(loans)
+        invalidate_account(*{loan.account.user_id for loan in loans})
+
+        if notify:
+            subject, template = LOAN_EMAILS[status]
+            enqueue_emails(
+                (
+                    loan.account.user.email,
+                    subject,
+                    render_to_string(template, {'user': loan.account.user, 'amount': loan.amount}),
+                )
+                for loan in loans
+            )
+    return len(loans)
+
+
+def _credit_loans(loans):
+    credits = defaultdict(Decimal)
+    counts = defaultdict(int)
+    for loan in loans:
+        credits[loan.account_id] += loan.amount
+        counts[loan.account_id] += 1
+
+    balances = dict(
+        UserBankAccount.objects.select_for_update()
+        .filter(pk__in=sorted(credits)).order_by('pk').values_list('pk', 'balance')
+    )
+    accounts = []
+    for pk, amount in credits.items():
+        account = UserBankAccount(pk=pk)
+        account.balance = F('balance') + amount
+        account.open_loans = F('open_loans') + counts[pk]
+        accounts.append(account)
+    UserBankAccount.objects.bulk_update(accounts, ['balance', 'open_loans'])
+
+    history = []
+    postings = []
+    for loan in loans:
+        postings += move(LOAN, BOOK_LOANS, loan.account, loan.amount)
+        balances[loan.account_id] += loan.amount
+        history.append(Transactions(
+            account=loan.account, amount=loan.amount,
+            balance_after_transaction=balances[loan.account_id], transaction_type=LOAN,
+        ))
+    record_postings(postings)
+    record_transactions(Transactions.objects.bulk_create(history))
+    # * the approval mail shows the balance, keep the loaded accounts in step
+    for loan in loans:
+        loan.account.balance = balances[loan.account_id]
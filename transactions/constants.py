@@ -2,11 +2,79 @@ DEPOSIT = 1
 WITHDRAWAL = 2
 LOAN = 3
 LOAN_PAID = 4
+TRANSFER_SENT = 5
+TRANSFER_RECEIVED = 6
 
 TRANSACTION_TYPE = (
     (DEPOSIT, 'Deposite'),
     (WITHDRAWAL, 'Withdrawal'),
     (LOAN, 'Loan'),
     (LOAN_PAID, 'Loan Paid'),
+    (TRANSFER_SENT, 'Transfer Sent'),
+    (TRANSFER_RECEIVED, 'Transfer Received'),
     
-)
\ No newline at end of file
+)
+
+LOAN_REQUESTED = 'requested'
+LOAN_APPROVED = 'approved'
+LOAN_REPAID = 'repaid'
+LOAN_REJECTED = 'rejected'
+
+LOAN_STATUS = (
+    (LOAN_REQUESTED, 'Requested'),
+    (LOAN_APPROVED, 'Approved'),
+    (LOAN_REPAID, 'Repaid'),
+    (LOAN_REJECTED, 'Rejected'),
+)
+
+#* kon state theke kon state e jawa jay, ledger._transition er baire keu status bodlay na
+LOAN_TRANSITIONS = {
+    LOAN_REQUESTED: (LOAN_APPROVED, LOAN_REJECTED),
+    LOAN_APPROVED: (LOAN_REPAID,),
+}
+
+MAX_OPEN_LOANS = 3
+
+#* double entry posting er dui pasher "book": customer account, na hoy bank er nijer hishab
+BOOK_CUSTOMER = 'customer'
+BOOK_CASH = 'cash'
+BOOK_LOANS = 'loans'
+BOOK_OPENING = 'opening'
+
+BOOKS = (
+    (BOOK_CUSTOMER, 'Customer account'),
+    (BOOK_CASH, 'Cash'),
+    (BOOK_LOANS, 'Loans receivable'),
+    (BOOK_OPENING, 'Opening balances'),
+)
+
+OPENING_BALANCE = 0
+
+POSTING_KINDS = (
+    (DEPOSIT, 'Deposit'),
+    (WITHDRAWAL, 'Withdrawal'),
+    (LOAN, 'Loan'),
+    (LOAN_PAID, 'Loan Paid'),
+    (TRANSFER_SENT, 'Transfer'),
+    (OPENING_BALANCE, 'Opening balance'),
+)
+
+STATEMENT_PENDING = 1
+STATEMENT_RUNNING = 2
+STATEMENT_DONE = 3
+STATEMENT_FAILED = 4
+
+STATEMENT_STATUS = (
+    (STATEMENT_PENDING, 'Pending'),
+    (STATEMENT_RUNNING, 'Generating'),
+    (STATEMENT_DONE, 'Ready'),
+    (STATEMENT_FAILED, 'Failed'),
+)
+
+STATEMENT_CSV = 'csv'
+STATEMENT_PDF = 'pdf'
+
+STATEMENT_FORMATS = (
+    (STATEMENT_CSV, 'CSV'),
+    (STATEMENT_PDF, 'PDF'),
+)
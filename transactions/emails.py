@@ -0,0 +1,23 @@
+from core.outbox import enqueue_email, aenqueue_email
+
+#* Customer notification mails. Views, the admin and accounts all import this
+#* small module instead of transactions.views, so loading the admin at startup
+#* does not pull in every view and form. The template engine is only touched
+#* when a mail is actually rendered.
+
+
+def render_transaction_email(user, amount, template):
+    from django.template.loader import render_to_string
+    return render_to_string(template, {
+        'user' : user,
+        'amount' : amount,
+    })
+
+
+def send_transaction_email(user, amount, subject, template):
+    #* mail ta outbox e jabe, send_queued_emails worker pore pathabe
+    enqueue_email(user.email, subject, render_transaction_email(user, amount, template))
+
+
+async def asend_transaction_email(user, amount, subject, template):
+    await aenqueue_email(user.email, subject, render_transaction_email(user, amount, template))
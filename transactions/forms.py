@@ -1,8 +1,12 @@
 from typing import Any
 from django import forms
-from .models import Transactions, TransferMoney
+from django.utils import timezone
+from .constants import STATEMENT_FORMATS
+from .models import Transactions, TransferMoney, Loan
 from accounts.models import UserBankAccount
-from core.models import Bank
+from core.bank_state import withdrawals_blocked, operations_frozen
+
+FROZEN_MESSAGE = 'Transactions are temporarily suspended. Please try again later.'
 
 class TransactionForm(forms.ModelForm):
     class Meta:
@@ -46,9 +50,10 @@ class WithdrawForm(TransactionForm):
         balance = account.balance # 1000
         amount = self.cleaned_data.get('amount')
         
-        if Bank.objects.filter(is_bankrupt= True).exists():
+        #* Bank table e query na kore cache theke
+        if withdrawals_blocked():
             raise forms.ValidationError(
-                f'Bank is bankrupt and no money to withdraw!'
+                FROZEN_MESSAGE if operations_frozen() else f'Bank is bankrupt and no money to withdraw!'
             )
         
         if amount < min_withdraw_amount:
@@ -70,13 +75,31 @@ class WithdrawForm(TransactionForm):
         return amount
 
 
-class LoanRequestForm(TransactionForm):
+class LoanRequestForm(forms.ModelForm):
+    class Meta:
+        model = Loan
+        fields = ['amount']
+
+    def __init__(self, *args, **kwargs):
+        self.account = kwargs.pop('account')
+        super().__init__(*args, **kwargs)
+
     def clean_amount(self):
         amount = self.cleaned_data.get('amount')
+        if operations_frozen():
+            raise forms.ValidationError(FROZEN_MESSAGE)
         return amount 
 
 
 class TransferMoneyForm(forms.ModelForm):
+    #* account_no diye khuje, user shoho ek query te; view ar ledger ei account tai use kore
+    receiver = forms.ModelChoiceField(
+        queryset=UserBankAccount.objects.select_related('user'),
+        to_field_name='account_no',
+        widget=forms.NumberInput,
+        error_messages={'invalid_choice': 'Account not found!'},
+    )
+
     class Meta:
         model = TransferMoney
         fields = ['receiver', 'amount']
@@ -90,20 +113,41 @@ class TransferMoneyForm(forms.ModelForm):
         self.instance.sender = self.sender
         return super().save()
     
-    def clean_receiver(self):
-        receiver = self.cleaned_data.get('receiver')
-        
-        try:
-            UserBankAccount.objects.get(account_no=receiver)
-        except UserBankAccount.DoesNotExist:
-            raise forms.ValidationError("Account not found!")
-        return receiver
-
     def clean_amount(self):
         amount = self.cleaned_data.get('amount')
         balance = self.sender.balance
 
+        if operations_frozen():
+            raise forms.ValidationError(FROZEN_MESSAGE)
+
         if amount < 0 or amount > balance:
             raise forms.ValidationError('Enter a valid amount!')
         return amount
-        
\ No newline at end of file
+
+
+class BulkTransferForm(forms.Form):
+    file = forms.FileField(help_text='CSV (receiver,amount) or JSONL ({"receiver": ..., "amount": ...}) file')
+
+    def clean_file(self):
+        file = self.cleaned_data.get('file')
+        if operations_frozen():
+            raise forms.ValidationError(FROZEN_MESSAGE)
+        name = file.name.lower()
+        if name.endswith('.jsonl'):
+            self.file_format = 'jsonl'
+        elif name.endswith('.csv'):
+            self.file_format = 'csv'
+        else:
+            raise forms.ValidationError('Upload a .csv or .jsonl file')
+        return file
+
+
+class StatementForm(forms.Form):
+    month = forms.DateField(input_formats=['%Y-%m'], help_text='YYYY-MM')
+    format = forms.ChoiceField(choices=STATEMENT_FORMATS)
+
+    def clean_month(self):
+        month = self.cleaned_data.get('month')
+        if month > timezone.localdate():
+            raise forms.ValidationError('That month has not started yet')
+        return month
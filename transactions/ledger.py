@@ -0,0 +1,165 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from accounts.models import UserBankAccount
+from core.account_cache import invalidate_account
+from .constants import (
+    DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER_SENT, TRANSFER_RECEIVED,
+    LOAN_APPROVED, LOAN_REPAID, LOAN_REJECTED, LOAN_TRANSITIONS, MAX_OPEN_LOANS, BOOK_CASH, BOOK_LOANS,
+)
+from .models import Transactions, TransferMoney, Loan
+from .postings import move, record_postings
+from .snapshots import record_transactions
+
+#* Every money movement goes through this module. Each operation runs in one
+#* transaction.atomic block, locks the touched accounts in primary key order
+#* (so two opposite transfers can never deadlock) and changes the balance with
+#* an F() expression so a concurrent writer can never be overwritten.
+#* Every movement is also written to the append-only Posting ledger as a
+#* double entry, which is what reconcile_ledger checks the balances against.
+
+
+class LedgerError(Exception):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class InvalidLoanState(LedgerError):
+    pass
+
+
+class LoanLimitReached(LedgerError):
+    pass
+
+
+def _lock_accounts(*accounts):
+    ids = sorted({account.pk for account in accounts})
+    list(UserBankAccount.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk'))
+
+
+def _credit(account, amount, **changes):
+    UserBankAccount.objects.filter(pk=account.pk).update(balance=F('balance') + amount, **changes)
+    return _sync_balance(account)
+
+
+def _debit(account, amount, keep_positive=False, **changes):
+    guard = {'balance__gt': amount} if keep_positive else {'balance__gte': amount}
+    updated = UserBankAccount.objects.filter(pk=account.pk, **guard).update(balance=F('balance') - amount, **changes)
+    if not updated:
+        raise InsufficientFunds(f'Account {account.account_no} can not cover {amount}')
+    return _sync_balance(account)
+
+
+def _sync_balance(account):
+    # * the request keeps using this object (templates, emails), so keep it in step with the db
+    account.balance, account.open_loans = UserBankAccount.objects.values_list('balance', 'open_loans').get(pk=account.pk)
+    return account.balance
+
+
+def deposit(account, amount):
+    with transaction.atomic():
+        _lock_accounts(account)
+        balance = _credit(account, amount)
+        record_postings(move(DEPOSIT, BOOK_CASH, account, amount))
+        return Transactions.objects.create(
+            account=account,
+            amount=amount,
+            balance_after_transaction=balance,
+            transaction_type=DEPOSIT,
+        )
+
+
+def withdraw(account, amount):
+    with transaction.atomic():
+        _lock_accounts(account)
+        balance = _debit(account, amount)
+        record_postings(move(WITHDRAWAL, account, BOOK_CASH, amount))
+        return Transactions.objects.create(
+            account=account,
+            amount=amount,
+            balance_after_transaction=balance,
+            transaction_type=WITHDRAWAL,
+        )
+
+
+def transfer(sender, receiver, amount):
+    with transaction.atomic():
+        _lock_accounts(sender, receiver)
+        sender_balance = _debit(sender, amount)
+        receiver_balance = _credit(receiver, amount)
+        record_postings(move(TRANSFER_SENT, sender, receiver, amount))
+        record_transactions(Transactions.objects.bulk_create([
+            Transactions(account=sender, amount=amount, balance_after_transaction=sender_balance, transaction_type=TRANSFER_SENT),
+            Transactions(account=receiver, amount=amount, balance_after_transaction=receiver_balance, transaction_type=TRANSFER_RECEIVED),
+        ]))
+        # * bulk_create sends no post_save
+        invalidate_account(sender.user_id, receiver.user_id)
+        return TransferMoney.objects.create(sender=sender, receiver=receiver, amount=amount)
+
+
+def request_loan(account, amount):
+    # * open_loans is a column on the account, no count over the loans table
+    if account.open_loans >= MAX_OPEN_LOANS:
+        raise LoanLimitReached(f'Account {account.account_no} already has {account.open_loans} open loans')
+    return Loan.objects.create(account=account, amount=amount)
+
+
+def transition_sources(status):
+    return [source for source, targets in LOAN_TRANSITIONS.items() if status in targets]
+
+
+def _transition(loan, status, **changes):
+    """
+    The only place a loan changes state. The conditional update claims the row,
+    so of two requests moving the same loan only one gets through; the caller's
+    atomic block undoes the claim if moving the money fails.
+    """
+    claimed = Loan.objects.filter(pk=loan.pk, status__in=transition_sources(status)).update(status=status, **changes)
+    if not claimed:
+        raise InvalidLoanState(f'Loan {loan.pk} can not become {status}')
+    loan.status = status
+    for field, value in changes.items():
+        setattr(loan, field, value)
+    invalidate_account(loan.account.user_id)
+
+
+def approve_loan(loan):
+    """Credit a requested loan to its account. Raises InvalidLoanState if it is not waiting for a decision."""
+    with transaction.atomic():
+        _transition(loan, LOAN_APPROVED, decided_at=timezone.now())
+        account = loan.account
+        _lock_accounts(account)
+        balance = _credit(account, loan.amount, open_loans=F('open_loans') + 1)
+        record_postings(move(LOAN, BOOK_LOANS, account, loan.amount))
+        Transactions.objects.create(
+            account=account,
+            amount=loan.amount,
+            balance_after_transaction=balance,
+            transaction_type=LOAN,
+        )
+        return loan
+
+
+def reject_loan(loan):
+    with transaction.atomic():
+        _transition(loan, LOAN_REJECTED, decided_at=timezone.now())
+        return loan
+
+
+def repay_loan(loan):
+    with transaction.atomic():
+        _transition(loan, LOAN_REPAID, repaid_at=timezone.now())
+        account = loan.account
+        _lock_accounts(account)
+        balance = _debit(account, loan.amount, keep_positive=True, open_loans=F('open_loans') - 1)
+        record_postings(move(LOAN_PAID, account, BOOK_LOANS, loan.amount))
+        Transactions.objects.create(
+            account=account,
+            amount=loan.amount,
+            balance_after_transaction=balance,
+            transaction_type=LOAN_PAID,
+        )
+        return loan
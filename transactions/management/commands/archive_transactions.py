@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from transactions.archive import archive_before, archive_cutoff, archive_months
+
+
+class Command(BaseCommand):
+    help = (
+        'Move Transactions rows older than TRANSACTION_ARCHIVE_MONTHS whole months to the archive '
+        'table, one short transaction per chunk. Meant to run once a month.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, help='keep this many whole months, at least TRANSACTION_ARCHIVE_MONTHS')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='rows moved per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='seconds to sleep between chunks, e.g. for replicas to catch up')
+
+    def handle(self, *args, **options):
+        months = options['months'] if options['months'] is not None else archive_months()
+        # * the report only reads the archive before the configured cutoff, newer rows must stay put
+        if months < archive_months():
+            raise CommandError(f'--months can not be below TRANSACTION_ARCHIVE_MONTHS ({archive_months()})')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        cutoff = archive_cutoff(months)
+
+        started = time.perf_counter()
+        moved = chunks = 0
+        for count in archive_before(cutoff, options['chunk_size']):
+            moved += count
+            chunks += 1
+            self.stderr.write(f'{moved} rows archived', ending='\r')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(
+            f'{moved} rows before {cutoff:%Y-%m-%d} archived in {chunks} chunks, in {time.perf_counter() - started:.1f}s'
+        )
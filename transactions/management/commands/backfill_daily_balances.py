@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from transactions.snapshots import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-account DailyBalance snapshots from the Transactions history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, action='append', dest='accounts', help='account id, can be repeated')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = backfill(options['accounts'], options['chunk_size'])
+        self.stdout.write(f'{written} snapshots written in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,49 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import UserBankAccount
+from core.bank_state import operations_frozen
+from transactions.bulk import parse_transfer_file, run_bulk_transfer, CHUNK_SIZE, OK
+
+
+class Command(BaseCommand):
+    help = 'Pay a CSV/JSONL file of (receiver, amount) rows from one account and print a per-row status report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sender', type=int, help='account_no of the paying account')
+        parser.add_argument('file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--report', help='write the status report to this CSV file instead of stdout')
+        parser.add_argument('--no-email', action='store_true')
+
+    def handle(self, *args, **options):
+        if operations_frozen():
+            raise CommandError('Transactions are frozen, see core.Bank.is_frozen')
+        try:
+            sender = UserBankAccount.objects.select_related('user').get(account_no=options['sender'])
+        except UserBankAccount.DoesNotExist:
+            raise CommandError(f"Account {options['sender']} not found")
+
+        fmt = options['format'] or ('jsonl' if options['file'].endswith('.jsonl') else 'csv')
+        started = time.perf_counter()
+        with open(options['file'], newline='', encoding='utf-8') as f:
+            rows = run_bulk_transfer(
+                sender, parse_transfer_file(f, fmt),
+                chunk_size=options['chunk_size'], notify=not options['no_email'],
+            )
+        elapsed = time.perf_counter() - started
+
+        fields = ['line', 'receiver', 'amount', 'status', 'error']
+        if options['report']:
+            out = open(options['report'], 'w', newline='', encoding='utf-8')
+        else:
+            out = self.stdout
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(row.as_dict() for row in rows)
+        if options['report']:
+            out.close()
+
+        ok = sum(1 for row in rows if row.status == OK)
+        self.stderr.write(f'{ok}/{len(rows)} transfers applied in {elapsed:.2f}s')
@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.bank_state import operations_frozen
+from transactions.bulk import decide_loans, LOAN_CHUNK_SIZE
+from transactions.constants import LOAN_REQUESTED, LOAN_APPROVED, LOAN_REJECTED
+from transactions.models import Loan
+
+ACTIONS = {'approve': LOAN_APPROVED, 'reject': LOAN_REJECTED}
+
+
+class Command(BaseCommand):
+    help = 'Approve or reject requested loans in chunked transactions, printing throughput per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=sorted(ACTIONS))
+        parser.add_argument('ids', nargs='*', type=int, help='loan ids, default is every requested loan')
+        parser.add_argument('--account', type=int, help='only loans of this account_no')
+        parser.add_argument('--max-amount', help='only loans up to this amount')
+        parser.add_argument('--limit', type=int, help='at most this many loans, oldest first')
+        parser.add_argument('--chunk-size', type=int, default=LOAN_CHUNK_SIZE)
+        parser.add_argument('--no-email', action='store_true')
+
+    def handle(self, *args, **options):
+        status = ACTIONS[options['action']]
+        if status == LOAN_APPROVED and operations_frozen():
+            raise CommandError('Transactions are frozen, see core.Bank.is_frozen')
+
+        loans = Loan.objects.filter(status=LOAN_REQUESTED).order_by('timestamp', 'id')
+        if options['ids']:
+            loans = loans.filter(pk__in=options['ids'])
+        if options['account']:
+            loans = loans.filter(account__account_no=options['account'])
+        if options['max_amount']:
+            loans = loans.filter(amount__lte=options['max_amount'])
+        loan_ids = list(loans.values_list('pk', flat=True)[:options['limit']])
+
+        started = time.perf_counter()
+        decided = 0
+        batches = decide_loans(loan_ids, status, chunk_size=options['chunk_size'], notify=not options['no_email'])
+        for number, batch in enumerate(batches, 1):
+            decided += batch.decided
+            rate = batch.decided / batch.seconds if batch.seconds else 0
+            self.stdout.write(
+                f'batch {number}: {batch.decided}/{batch.selected} {status} in {batch.seconds:.2f}s ({rate:.0f} loans/s)'
+            )
+        elapsed = time.perf_counter() - started
+        rate = decided / elapsed if elapsed else 0
+        self.stderr.write(f'{decided}/{len(loan_ids)} loans {status} in {elapsed:.2f}s ({rate:.0f} loans/s)')
@@ -0,0 +1,39 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from transactions.constants import STATEMENT_FORMATS
+from transactions.statements import pregenerate, previous_month
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate a closed month\'s statements for every account, over a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='YYYY-MM, defaults to last month')
+        parser.add_argument('--format', action='append', choices=[value for value, label in STATEMENT_FORMATS],
+                            help='repeat for several formats, defaults to all of them')
+        parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to the cpu count; 0 runs in this process')
+        parser.add_argument('--chunk-size', type=int, default=500, help='accounts per worker task')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                month = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must look like 2024-01')
+        else:
+            month = previous_month()
+        formats = options['format'] or [value for value, label in STATEMENT_FORMATS]
+
+        started = time.perf_counter()
+        generated = skipped = 0
+        try:
+            for done, cached in pregenerate(month, formats, options['workers'], options['chunk_size']):
+                generated += done
+                skipped += cached
+                self.stderr.write(f'{generated + skipped} statements', ending='\r')
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f'{month:%Y-%m}: {generated} generated, {skipped} already final, in {time.perf_counter() - started:.1f}s'
+        )
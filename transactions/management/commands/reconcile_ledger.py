@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from transactions.postings import reconcile, unbalanced_entries, repair_balance
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute every account balance from the posting ledger in one streamed, grouped pass '
+        'and report accounts whose stored balance drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='rows fetched per round trip')
+        parser.add_argument('--check-entries', action='store_true', help='also check that every entry sums to zero')
+        parser.add_argument('--repair', action='store_true', help='overwrite drifted balances with the ledger value')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drifts = []
+        self.stdout.write('account_no,stored,ledger,drift')
+        for drift in reconcile(options['chunk_size']):
+            drifts.append(drift)
+            self.stdout.write(f'{drift.account_no},{drift.stored},{drift.computed},{drift.stored - drift.computed}')
+        self.stderr.write(f'{len(drifts)} accounts drifted, checked in {time.perf_counter() - started:.2f}s')
+
+        unbalanced = 0
+        if options['check_entries']:
+            for entry, total in unbalanced_entries(options['chunk_size']):
+                unbalanced += 1
+                self.stderr.write(f'entry {entry} does not balance: {total}')
+            self.stderr.write(f'{unbalanced} unbalanced entries')
+
+        # * repaired after the scan, each in its own short transaction with the account locked
+        if options['repair']:
+            for drift in drifts:
+                repair_balance(drift.account_id)
+            self.stderr.write(f'{len(drifts)} balances repaired')
+        elif drifts or unbalanced:
+            raise CommandError('ledger does not reconcile')
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from transactions.statements import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Generate the monthly statements customers asked for.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs instead of exiting when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls when the queue is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = run_pending_jobs(options['batch_size'])
+            if done or failed:
+                self.stdout.write(f'done={done} failed={failed}')
+            elif not options['loop']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_alter_transfermoney_receiver'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactions',
+            name='transaction_type',
+            field=models.IntegerField(choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Transfer Sent'), (6, 'Transfer Received')], null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_rename_userbackaccount_userbankaccount'),
+        ('transactions', '0008_transfer_transaction_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('deposits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('withdrawals', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('loans', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('loans_paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transfers_sent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transfers_received', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('last_transaction_id', models.BigIntegerField(null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='accounts.userbankaccount')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='unique_daily_balance')],
+            },
+        ),
+    ]
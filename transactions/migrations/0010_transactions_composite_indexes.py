@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_rename_userbackaccount_userbankaccount'),
+        ('transactions', '0009_dailybalance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['account', 'transaction_type', 'loan_approve'], name='txn_account_type_loan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactions',
+            index=models.Index(fields=['account', 'timestamp'], name='txn_account_timestamp_idx'),
+        ),
+    ]
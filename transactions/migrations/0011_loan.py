@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+        ('transactions', '0010_transactions_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Loan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('requested', 'Requested'), ('approved', 'Approved'), ('repaid', 'Repaid'), ('rejected', 'Rejected')], default='requested', max_length=10)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+                ('repaid_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['timestamp'],
+            },
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='accounts.userbankaccount'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['account', 'timestamp'], name='loan_account_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', 'timestamp'], name='loan_status_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+from collections import defaultdict
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+LOAN = 3
+LOAN_PAID = 4
+CHUNK_SIZE = 1000
+
+
+def move_loans(apps, schema_editor):
+    """
+    One Loan per LOAN / LOAN_PAID Transactions row, with the state the row's
+    type and loan_approve flag stood for. Unapproved requests never moved money,
+    so their Transactions rows are deleted and taken out of the daily snapshots.
+    Approved and repaid rows stay as history.
+    """
+    Transactions = apps.get_model('transactions', 'Transactions')
+    Loan = apps.get_model('transactions', 'Loan')
+    DailyBalance = apps.get_model('transactions', 'DailyBalance')
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    db = schema_editor.connection.alias
+    # * keep the original request time instead of the migration's
+    Loan._meta.get_field('timestamp').auto_now_add = False
+
+    rows = (
+        Transactions.objects.using(db).filter(transaction_type__in=[LOAN, LOAN_PAID]).order_by('pk')
+        .values_list('pk', 'account_id', 'amount', 'transaction_type', 'loan_approve', 'timestamp')
+    )
+    loans = []
+    pending = []
+    open_loans = defaultdict(int)
+    for pk, account_id, amount, transaction_type, approved, timestamp in rows.iterator(chunk_size=CHUNK_SIZE):
+        loan = Loan(account_id=account_id, amount=amount, timestamp=timestamp)
+        if transaction_type == LOAN_PAID:
+            loan.status, loan.decided_at, loan.repaid_at = 'repaid', timestamp, timestamp
+        elif approved:
+            loan.status, loan.decided_at = 'approved', timestamp
+            open_loans[account_id] += 1
+        else:
+            loan.status = 'requested'
+            pending.append((pk, account_id, amount, timestamp))
+        loans.append(loan)
+        if len(loans) == CHUNK_SIZE:
+            Loan.objects.using(db).bulk_create(loans)
+            loans = []
+    Loan.objects.using(db).bulk_create(loans)
+
+    UserBankAccount.objects.using(db).bulk_update(
+        [UserBankAccount(pk=account_id, open_loans=count) for account_id, count in open_loans.items()],
+        ['open_loans'], batch_size=CHUNK_SIZE,
+    )
+
+    days = defaultdict(lambda: [0, 0])
+    for pk, account_id, amount, timestamp in pending:
+        day = days[(account_id, timezone.localdate(timestamp))]
+        day[0] += amount
+        day[1] += 1
+    for start in range(0, len(pending), CHUNK_SIZE):
+        Transactions.objects.using(db).filter(pk__in=[row[0] for row in pending[start:start + CHUNK_SIZE]]).delete()
+    for (account_id, date), (amount, count) in days.items():
+        DailyBalance.objects.using(db).filter(account_id=account_id, date=date).update(
+            loans=F('loans') - amount, transaction_count=F('transaction_count') - count,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_loan'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_loans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0012_move_loans_off_transactions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transactions',
+            name='txn_account_type_loan_idx',
+        ),
+        migrations.RemoveField(
+            model_name='transactions',
+            name='loan_approve',
+        ),
+    ]
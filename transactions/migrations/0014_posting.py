@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+        ('transactions', '0013_remove_transactions_loan_approve'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Posting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry', models.UUIDField(db_index=True)),
+                ('book', models.CharField(choices=[('customer', 'Customer account'), ('cash', 'Cash'), ('loans', 'Loans receivable'), ('opening', 'Opening balances')], default='customer', max_length=10)),
+                ('kind', models.IntegerField(choices=[(1, 'Deposit'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Transfer'), (0, 'Opening balance')])),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='postings', to='accounts.userbankaccount')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['account', 'amount'], name='posting_account_amount_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+import uuid
+from django.db import migrations
+
+OPENING_BALANCE = 0
+CHUNK_SIZE = 1000
+
+
+def open_balances(apps, schema_editor):
+    """
+    Balances from before the posting ledger existed become one opening entry per
+    account (opening book -> account), so reconcile starts from zero drift.
+    """
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    Posting = apps.get_model('transactions', 'Posting')
+    db = schema_editor.connection.alias
+    postings = []
+    accounts = UserBankAccount.objects.using(db).exclude(balance=0).order_by('pk').values_list('pk', 'balance')
+    for pk, balance in accounts.iterator(chunk_size=CHUNK_SIZE):
+        entry = uuid.uuid4()
+        postings.append(Posting(entry=entry, kind=OPENING_BALANCE, book='opening', amount=-balance))
+        postings.append(Posting(entry=entry, kind=OPENING_BALANCE, book='customer', account_id=pk, amount=balance))
+        if len(postings) >= CHUNK_SIZE:
+            Posting.objects.using(db).bulk_create(postings)
+            postings = []
+    Posting.objects.using(db).bulk_create(postings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0014_posting'),
+    ]
+
+    operations = [
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+        ('transactions', '0015_opening_postings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfermoney',
+            name='receiver_account',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.userbankaccount'),
+        ),
+        # * rows from before this get the migration time, they still page in id order
+        migrations.AddField(
+            model_name='transfermoney',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
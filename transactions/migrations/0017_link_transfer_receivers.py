@@ -0,0 +1,45 @@
+from django.db import migrations, transaction
+
+CHUNK_SIZE = 1000
+
+
+def link_receivers(apps, schema_editor):
+    """
+    Point receiver_account at the account whose account_no the old decimal
+    receiver column held. Runs one short transaction per chunk of transfers,
+    walking the table by pk, so a large table is never locked as a whole and a
+    rerun after an interruption picks up where it stopped.
+    """
+    TransferMoney = apps.get_model('transactions', 'TransferMoney')
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    db = schema_editor.connection.alias
+    last_pk = 0
+    while True:
+        chunk = list(
+            TransferMoney.objects.using(db).filter(pk__gt=last_pk, receiver_account__isnull=True)
+            .order_by('pk').only('pk', 'receiver')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        accounts = UserBankAccount.objects.using(db).in_bulk({int(row.receiver) for row in chunk}, field_name='account_no')
+        missing = [row.pk for row in chunk if int(row.receiver) not in accounts]
+        if missing:
+            raise RuntimeError(f'TransferMoney rows {missing} point at account numbers that do not exist')
+        for row in chunk:
+            row.receiver_account_id = accounts[int(row.receiver)].pk
+        with transaction.atomic(using=db):
+            TransferMoney.objects.using(db).bulk_update(chunk, ['receiver_account'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+    # * every chunk commits on its own, see link_receivers
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0016_transfermoney_receiver_account'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_receivers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+        ('transactions', '0017_link_transfer_receivers'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='transfermoney',
+            name='receiver',
+        ),
+        migrations.RenameField(
+            model_name='transfermoney',
+            old_name='receiver_account',
+            new_name='receiver',
+        ),
+        migrations.AlterField(
+            model_name='transfermoney',
+            name='receiver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='money_received', to='accounts.userbankaccount'),
+        ),
+        migrations.AddIndex(
+            model_name='transfermoney',
+            index=models.Index(fields=['receiver', 'timestamp'], name='transfer_receiver_ts_idx'),
+        ),
+    ]
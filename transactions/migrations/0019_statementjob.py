@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+        ('transactions', '0018_transfermoney_receiver_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('pdf', 'PDF')], default='csv', max_length=3)),
+                ('status', models.IntegerField(choices=[(1, 'Pending'), (2, 'Generating'), (3, 'Ready'), (4, 'Failed')], default=1)),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('generated_at', models.DateTimeField(blank=True, null=True)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_jobs', to='accounts.userbankaccount')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['status', 'requested_at'], name='transaction_status_c1f0df_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'month', 'format'), name='unique_statement')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_accountnumbersequence'),
+        ('transactions', '0019_statementjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance_after_transaction', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_type', models.IntegerField(choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Transfer Sent'), (6, 'Transfer Received')], null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='accounts.userbankaccount')),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['account', 'timestamp'], name='txn_archive_account_ts_idx')],
+            },
+        ),
+    ]
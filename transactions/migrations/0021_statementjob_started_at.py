@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0020_transactionarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statementjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+import heapq
+from decimal import Decimal
+from django.db import migrations, transaction
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+# * transaction_type -> DailyBalance field, as in transactions.snapshots
+SNAPSHOT_FIELDS = {
+    1: 'deposits',
+    2: 'withdrawals',
+    3: 'loans',
+    4: 'loans_paid',
+    5: 'transfers_sent',
+    6: 'transfers_received',
+}
+FIELDS = ['id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction']
+
+
+def backfill(apps, schema_editor):
+    """
+    Snapshots for the history from before DailyBalance existed, the same thing
+    snapshots.backfill does. One short transaction per account, so a rerun
+    after an interruption just rebuilds the accounts again.
+    """
+    Transactions = apps.get_model('transactions', 'Transactions')
+    TransactionArchive = apps.get_model('transactions', 'TransactionArchive')
+    DailyBalance = apps.get_model('transactions', 'DailyBalance')
+    db = schema_editor.connection.alias
+    accounts = set(Transactions.objects.using(db).values_list('account_id', flat=True).distinct())
+    accounts |= set(TransactionArchive.objects.using(db).values_list('account_id', flat=True).distinct())
+
+    for account_id in sorted(accounts):
+        rows = heapq.merge(
+            *(
+                model.objects.using(db).filter(account_id=account_id).order_by('timestamp', 'id')
+                .values_list(*FIELDS).iterator(chunk_size=CHUNK_SIZE)
+                for model in (TransactionArchive, Transactions)
+            ),
+            key=lambda row: (row[1], row[0]),
+        )
+        snapshots = []
+        current = None
+        closing = Decimal(0)
+        for pk, timestamp, txn_type, amount, balance_after in rows:
+            day = timezone.localdate(timestamp)
+            if current is None or current.date != day:
+                current = DailyBalance(account_id=account_id, date=day, opening_balance=closing, closing_balance=closing)
+                snapshots.append(current)
+            if txn_type in SNAPSHOT_FIELDS:
+                field = SNAPSHOT_FIELDS[txn_type]
+                setattr(current, field, getattr(current, field) + amount)
+            current.transaction_count += 1
+            current.closing_balance = closing = balance_after
+            current.last_transaction_id = pk
+
+        with transaction.atomic(using=db):
+            DailyBalance.objects.using(db).filter(account_id=account_id).delete()
+            DailyBalance.objects.using(db).bulk_create(snapshots, batch_size=CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+    # * every account commits on its own, see backfill
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0021_statementjob_started_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
 from accounts.models import UserBankAccount
-from .constants import TRANSACTION_TYPE
+from django.utils import timezone
+from .constants import (
+    TRANSACTION_TYPE, LOAN_STATUS, LOAN_REQUESTED, BOOKS, BOOK_CUSTOMER, POSTING_KINDS,
+    STATEMENT_STATUS, STATEMENT_PENDING, STATEMENT_FORMATS, STATEMENT_CSV,
+)
 
 class Transactions(models.Model):
     # * one account per transaction. many transactions on a single account
@@ -10,16 +14,162 @@ class Transactions(models.Model):
     balance_after_transaction = models.DecimalField(decimal_places=2, max_digits=12)
     transaction_type = models.IntegerField(choices=TRANSACTION_TYPE, null = True)
     timestamp = models.DateTimeField(auto_now_add=True)
-    loan_approve = models.BooleanField(default=False)
 
     class Meta: 
         ordering = ['timestamp']
+        indexes = [
+            # * TransactionReportView: account + timestamp range, already in timestamp order
+            models.Index(fields=['account', 'timestamp'], name='txn_account_timestamp_idx'),
+        ]
+
+class TransactionArchive(models.Model):
+    # * Transactions rows older than TRANSACTION_ARCHIVE_MONTHS, moved here by transactions.archive.
+    # * same id as the original row so (timestamp, id) cursors work across both tables
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(UserBankAccount, related_name="archived_transactions", on_delete=models.CASCADE)
+
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    balance_after_transaction = models.DecimalField(decimal_places=2, max_digits=12)
+    transaction_type = models.IntegerField(choices=TRANSACTION_TYPE, null = True)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['account', 'timestamp'], name='txn_archive_account_ts_idx'),
+        ]
+
+class Loan(models.Model):
+    # * status only changes through transactions.ledger, which also moves the money
+    account = models.ForeignKey(UserBankAccount, related_name="loans", on_delete=models.CASCADE)
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    status = models.CharField(max_length=10, choices=LOAN_STATUS, default=LOAN_REQUESTED)
+    timestamp = models.DateTimeField(auto_now_add=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    repaid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['timestamp']
+        indexes = [
+            # * LoanListView pages by (timestamp, id) per account, the admin and api filter by status
+            models.Index(fields=['account', 'timestamp'], name='loan_account_timestamp_idx'),
+            models.Index(fields=['status', 'timestamp'], name='loan_status_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"Loan {self.pk} of {self.account} ({self.status})"
+
 
 class TransferMoney(models.Model):
     sender = models.ForeignKey(UserBankAccount, related_name="money_sent", on_delete=models.DO_NOTHING)
-    # receiver = models.ForeignKey(UserBankAccount, related_name="money_received", on_delete=models.DO_NOTHING)
-    receiver = models.DecimalField(max_digits=6, decimal_places=0)
+    receiver = models.ForeignKey(UserBankAccount, related_name="money_received", on_delete=models.DO_NOTHING)
     amount = models.DecimalField(decimal_places=2, max_digits=12)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # * ReceivedTransferListView pages by (timestamp, id) per receiver
+            models.Index(fields=['receiver', 'timestamp'], name='transfer_receiver_ts_idx'),
+        ]
 
     def __str__(self):
         return f"from {self.sender} to {self.receiver}"
+
+
+class DailyBalance(models.Model):
+    # * one row per account per day, kept up to date from Transactions so reports never scan the raw history
+    account = models.ForeignKey(UserBankAccount, related_name="daily_balances", on_delete=models.CASCADE)
+    date = models.DateField()
+    opening_balance = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+    closing_balance = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+    deposits = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    withdrawals = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    loans = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    loans_paid = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    transfers_sent = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    transfers_received = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    transaction_count = models.PositiveIntegerField(default=0)
+    last_transaction_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='unique_daily_balance'),
+        ]
+
+    def __str__(self):
+        return f"{self.account} on {self.date}"
+
+
+
+class AppendOnlyError(Exception):
+    pass
+
+
+class PostingQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise AppendOnlyError('Postings can not be changed, post a correcting entry instead')
+
+    def delete(self):
+        raise AppendOnlyError('Postings can not be deleted, post a correcting entry instead')
+
+
+class Posting(models.Model):
+    """
+    One leg of a double-entry movement. Every entry has legs that sum to zero,
+    e.g. a deposit is -amount on the cash book and +amount on the customer's
+    account, so an account balance is the sum of its postings. Rows are only
+    ever inserted.
+    """
+    entry = models.UUIDField(db_index=True)
+    account = models.ForeignKey(UserBankAccount, related_name="postings", null=True, blank=True, on_delete=models.PROTECT)
+    book = models.CharField(max_length=10, choices=BOOKS, default=BOOK_CUSTOMER)
+    kind = models.IntegerField(choices=POSTING_KINDS)
+    amount = models.DecimalField(decimal_places=2, max_digits=14)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    objects = PostingQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # * reconcile_ledger sums amount per account in account order, straight off this index
+            models.Index(fields=['account', 'amount'], name='posting_account_amount_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise AppendOnlyError('Postings can not be changed, post a correcting entry instead')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise AppendOnlyError('Postings can not be deleted, post a correcting entry instead')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} on {self.account or self.get_book_display()}"
+
+
+class StatementJob(models.Model):
+    # * one row per (account, month, format). views only enqueue, the run_statement_jobs worker writes the file
+    account = models.ForeignKey(UserBankAccount, related_name="statement_jobs", on_delete=models.CASCADE)
+    month = models.DateField() # first day of the month
+    format = models.CharField(max_length=3, choices=STATEMENT_FORMATS, default=STATEMENT_CSV)
+    status = models.IntegerField(choices=STATEMENT_STATUS, default=STATEMENT_PENDING)
+    requested_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True) # when a worker claimed it
+    generated_at = models.DateTimeField(null=True, blank=True)
+    rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'month', 'format'], name='unique_statement'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'requested_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.account} statement for {self.month:%Y-%m} ({self.format})"
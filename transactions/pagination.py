@@ -0,0 +1,96 @@
+import base64
+from datetime import datetime
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(value):
+    # * a broken or tampered cursor just starts from the first page
+    if not value:
+        return None
+    try:
+        timestamp, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class LazyPage(SimpleLazyObject):
+    """
+    A page that is only fetched when first used, so a template serving it from
+    a fragment cache never queries for it. The model is known up front because
+    ListView asks for it before rendering.
+    """
+
+    def __init__(self, func, model):
+        super().__init__(func)
+        # * plain setattr would be forwarded to the page and fetch it
+        self.__dict__['model'] = model
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor pagination on (timestamp, id) for ListViews. Unlike OFFSET paging the
+    cost of a page does not grow with how deep into the history it is: every
+    page is one index range scan starting right after the previous page.
+    """
+    page_size = 50
+    cursor_param = 'cursor'
+    next_cursor = None
+
+    def keyset_slice(self, queryset):
+        queryset = queryset.order_by('timestamp', 'id')
+        cursor = decode_cursor(self.request.GET.get(self.cursor_param))
+        if cursor:
+            timestamp, pk = cursor
+            # * timestamp__gte keeps the (account, timestamp) index range, the Q breaks ties on id
+            queryset = queryset.filter(timestamp__gte=timestamp).filter(
+                Q(timestamp__gt=timestamp) | Q(id__gt=pk)
+            )
+        return queryset[:self.page_size + 1]
+
+    def keyset_page(self, rows):
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].pk)
+        return rows
+
+    def merge_pages(self, pages):
+        # * rows from several tables sharing one id sequence, e.g. Transactions and its archive
+        rows = [row for page in pages for row in page]
+        if len(pages) > 1:
+            rows.sort(key=lambda row: (row.timestamp, row.pk))
+        return rows
+
+    def paginate_keyset(self, queryset, *more):
+        return self.keyset_page(self.merge_pages([list(self.keyset_slice(qs)) for qs in (queryset, *more)]))
+
+    def lazy_paginate_keyset(self, queryset, *more):
+        return LazyPage(lambda: self.paginate_keyset(queryset, *more), queryset.model)
+
+    async def apaginate_keyset(self, queryset, *more):
+        pages = [[row async for row in self.keyset_slice(qs)] for qs in (queryset, *more)]
+        return self.keyset_page(self.merge_pages(pages))
+
+    def next_page_url(self):
+        if self.next_cursor is None:
+            # * a lazy page is fetched here at the latest, that is what sets next_cursor
+            len(self.object_list)
+        if not self.next_cursor:
+            return None
+        params = self.request.GET.copy()
+        params[self.cursor_param] = self.next_cursor
+        return f'{self.request.path}?{params.urlencode()}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({
+            'next_url': SimpleLazyObject(self.next_page_url),
+            'is_first_page': not self.request.GET.get(self.cursor_param),
+        })
+        return context
@@ -0,0 +1,85 @@
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Sum
+from accounts.models import UserBankAccount
+from core.account_cache import invalidate_account
+from .constants import BOOK_CUSTOMER
+from .models import Posting
+
+Drift = namedtuple('Drift', ['account_id', 'account_no', 'stored', 'computed'])
+
+
+def move(kind, source, target, amount):
+    """
+    The two legs of one movement of amount from source to target. Each side is a
+    UserBankAccount or the name of one of the bank's own books (BOOK_CASH, ...).
+    """
+    entry = uuid.uuid4()
+    return [_leg(entry, kind, source, -amount), _leg(entry, kind, target, amount)]
+
+
+def _leg(entry, kind, side, amount):
+    if isinstance(side, UserBankAccount):
+        return Posting(entry=entry, kind=kind, account=side, book=BOOK_CUSTOMER, amount=amount)
+    return Posting(entry=entry, kind=kind, book=side, amount=amount)
+
+
+def record_postings(postings, batch_size=1000):
+    return Posting.objects.bulk_create(postings, batch_size=batch_size)
+
+
+def account_total(account_id):
+    return Posting.objects.filter(account_id=account_id).aggregate(total=Sum('amount'))['total'] or Decimal(0)
+
+
+def reconcile(chunk_size=5000):
+    """
+    Recompute every account balance from its postings and yield a Drift for each
+    account whose stored balance differs. One GROUP BY over postings and one scan
+    of the accounts, both in account order and streamed with iterator(), are
+    merged like two sorted files, so memory stays flat however many postings
+    there are. Both reads run in one repeatable read transaction so a concurrent
+    transfer can not show up as drift.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        totals = (
+            Posting.objects.filter(account__isnull=False).values('account_id')
+            .annotate(total=Sum('amount')).order_by('account_id')
+            .values_list('account_id', 'total').iterator(chunk_size=chunk_size)
+        )
+        accounts = UserBankAccount.objects.order_by('pk').values_list('pk', 'account_no', 'balance').iterator(chunk_size=chunk_size)
+
+        pending = next(totals, None)
+        for pk, account_no, balance in accounts:
+            # * postings can not exist without their account (PROTECT), so totals never run ahead for long
+            while pending is not None and pending[0] < pk:
+                pending = next(totals, None)
+            computed = Decimal(0)
+            if pending is not None and pending[0] == pk:
+                computed = pending[1]
+                pending = next(totals, None)
+            if computed != balance:
+                yield Drift(pk, account_no, balance, computed)
+
+
+def unbalanced_entries(chunk_size=5000):
+    """Entries whose legs do not sum to zero, as (entry, total)."""
+    return (
+        Posting.objects.values('entry').annotate(total=Sum('amount')).exclude(total=0)
+        .values_list('entry', 'total').iterator(chunk_size=chunk_size)
+    )
+
+
+def repair_balance(account_id):
+    """Overwrite the stored balance with the one the postings give."""
+    with transaction.atomic():
+        user_id = UserBankAccount.objects.select_for_update().filter(pk=account_id).values_list('user_id', flat=True).get()
+        total = account_total(account_id)
+        UserBankAccount.objects.filter(pk=account_id).update(balance=total)
+        invalidate_account(user_id)
+    return total
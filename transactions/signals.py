@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from core.account_cache import invalidate_account
+from .models import Transactions, Loan
+from .snapshots import record_transactions, rebuild_day
+
+
+@receiver(post_save, sender=Transactions)
+def update_daily_balance(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_transactions([instance])
+    else:
+        rebuild_day(instance.account_id, timezone.localdate(instance.timestamp))
+
+
+@receiver(post_save, sender=Transactions)
+@receiver(post_delete, sender=Transactions)
+def invalidate_account_cache(sender, instance, **kwargs):
+    invalidate_account(instance.account.user_id)
+
+
+@receiver(post_save, sender=Loan)
+def invalidate_account_cache_for_loan(sender, instance, **kwargs):
+    # * status changes go through ledger._transition, which invalidates on its own
+    invalidate_account(instance.account.user_id)
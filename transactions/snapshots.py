@@ -0,0 +1,205 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum, Count, OuterRef, Subquery
+from django.utils import timezone
+from accounts.models import UserBankAccount
+from .constants import DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER_SENT, TRANSFER_RECEIVED
+from .models import Transactions, TransactionArchive, DailyBalance
+from .archive import merge_history
+
+SNAPSHOT_FIELDS = {
+    DEPOSIT: 'deposits',
+    WITHDRAWAL: 'withdrawals',
+    LOAN: 'loans',
+    LOAN_PAID: 'loans_paid',
+    TRANSFER_SENT: 'transfers_sent',
+    TRANSFER_RECEIVED: 'transfers_received',
+}
+
+
+def day_bounds(start_date, end_date):
+    """
+    [start, end) datetimes covering an inclusive date range. Filtering on these
+    instead of timestamp__date keeps the (account, timestamp) index usable.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def _day(txn):
+    return timezone.localdate(txn.timestamp)
+
+
+def opening_balance(account_id, day):
+    """Balance the account had when `day` started: the closing balance of its last snapshot before it."""
+    previous = (
+        DailyBalance.objects.filter(account_id=account_id, date__lt=day)
+        .order_by('-date').values_list('closing_balance', flat=True).first()
+    )
+    # * accounts are opened with a zero balance
+    return previous if previous is not None else Decimal(0)
+
+
+def _opening_balances(account_ids, day):
+    previous = DailyBalance.objects.filter(account_id=OuterRef('pk'), date__lt=day).order_by('-date')
+    rows = UserBankAccount.objects.filter(pk__in=account_ids).annotate(
+        previous=Subquery(previous.values('closing_balance')[:1])
+    ).values_list('pk', 'previous')
+    return {pk: previous if previous is not None else Decimal(0) for pk, previous in rows}
+
+
+def _snapshots_for(keys, lock=False):
+    queryset = DailyBalance.objects.filter(
+        account_id__in={account_id for account_id, day in keys},
+        date__in={day for account_id, day in keys},
+    )
+    if lock:
+        queryset = queryset.select_for_update().order_by('pk')
+    return {(s.account_id, s.date): s for s in queryset if (s.account_id, s.date) in keys}
+
+
+def record_transactions(txns):
+    """
+    Fold newly inserted Transactions rows into their day's snapshot with a fixed
+    number of queries, however many rows or accounts are involved. Used by the
+    post_save signal and called directly after bulk_create, which sends no signals.
+    """
+    groups = defaultdict(list)
+    for txn in txns:
+        groups[(txn.account_id, _day(txn))].append(txn)
+    if not groups:
+        return
+    keys = set(groups)
+
+    with transaction.atomic():
+        missing = keys - set(_snapshots_for(keys))
+        if missing:
+            new = []
+            for day in {day for account_id, day in missing}:
+                openings = _opening_balances({a for a, d in missing if d == day}, day)
+                new += [
+                    DailyBalance(account_id=a, date=day, opening_balance=openings[a], closing_balance=openings[a])
+                    for a, d in missing if d == day
+                ]
+            # * another request may create the same day first, that row is picked up below
+            DailyBalance.objects.bulk_create(new, ignore_conflicts=True)
+
+        snapshots = _snapshots_for(keys, lock=True)
+        for key, rows in groups.items():
+            snapshot = snapshots[key]
+            rows.sort(key=lambda txn: txn.pk)
+            sums = defaultdict(Decimal)
+            for txn in rows:
+                if txn.transaction_type in SNAPSHOT_FIELDS:
+                    sums[SNAPSHOT_FIELDS[txn.transaction_type]] += txn.amount
+            for field in SNAPSHOT_FIELDS.values():
+                setattr(snapshot, field, F(field) + sums[field])
+            snapshot.transaction_count = F('transaction_count') + len(rows)
+            last = rows[-1]
+            if snapshot.last_transaction_id is None or last.pk > snapshot.last_transaction_id:
+                snapshot.closing_balance = last.balance_after_transaction
+                snapshot.last_transaction_id = last.pk
+        DailyBalance.objects.bulk_update(
+            snapshots.values(),
+            [*SNAPSHOT_FIELDS.values(), 'transaction_count', 'closing_balance', 'last_transaction_id'],
+        )
+
+
+def rebuild_day(account_id, day):
+    """
+    Recompute one snapshot from that day's rows. The post_save signal calls it
+    whenever an existing Transactions row is saved again, record_transactions
+    only knows how to add new rows.
+    """
+    start, end = day_bounds(day, day)
+    rows = Transactions.objects.filter(account_id=account_id, timestamp__gte=start, timestamp__lt=end)
+    totals = {field: Decimal(0) for field in SNAPSHOT_FIELDS.values()}
+    for row in rows.values('transaction_type').annotate(total=Sum('amount')):
+        if row['transaction_type'] in SNAPSHOT_FIELDS:
+            totals[SNAPSHOT_FIELDS[row['transaction_type']]] = row['total']
+    last = rows.order_by('-id').values('id', 'balance_after_transaction').first()
+
+    with transaction.atomic():
+        if last is None:
+            DailyBalance.objects.filter(account_id=account_id, date=day).delete()
+            return
+        opening = opening_balance(account_id, day)
+        DailyBalance.objects.update_or_create(
+            account_id=account_id, date=day,
+            defaults={
+                'opening_balance': opening,
+                'closing_balance': last['balance_after_transaction'],
+                'last_transaction_id': last['id'],
+                'transaction_count': rows.count(),
+                **totals,
+            },
+        )
+
+
+def range_summary(account, start_date, end_date):
+    """
+    Totals for an inclusive date range, read from at most one snapshot per day.
+    """
+    snapshots = DailyBalance.objects.filter(account=account, date__gte=start_date, date__lte=end_date)
+    summary = snapshots.aggregate(
+        days=Count('id'),
+        transactions=Sum('transaction_count'),
+        **{field: Sum(field) for field in SNAPSHOT_FIELDS.values()},
+    )
+    for field in SNAPSHOT_FIELDS.values():
+        summary[field] = summary[field] or Decimal(0)
+    summary['total'] = sum(summary[field] for field in SNAPSHOT_FIELDS.values())
+    first = snapshots.order_by('date').values_list('opening_balance', flat=True).first()
+    last = snapshots.order_by('-date').values_list('closing_balance', flat=True).first()
+    summary['opening_balance'] = first if first is not None else opening_balance(account.pk, start_date)
+    summary['closing_balance'] = last if last is not None else summary['opening_balance']
+    return summary
+
+
+def backfill(account_ids=None, chunk_size=2000):
+    """
+    Rebuild snapshots from the full history, archived rows included, one account
+    at a time, streaming rows with iterator() so memory stays flat. Returns the
+    number of snapshot rows written.
+    """
+    accounts = Transactions.objects.order_by('account_id').values_list('account_id', flat=True).distinct()
+    archived = TransactionArchive.objects.order_by('account_id').values_list('account_id', flat=True).distinct()
+    if account_ids:
+        accounts = accounts.filter(account_id__in=account_ids)
+        archived = archived.filter(account_id__in=account_ids)
+    accounts = sorted(set(accounts) | set(archived))
+
+    written = 0
+    fields = ['id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction']
+    for account_id in accounts:
+        snapshots = []
+        current = None
+        closing = Decimal(0)
+        rows = merge_history(
+            Transactions.objects.filter(account_id=account_id).order_by('timestamp', 'id')
+            .values_list(*fields).iterator(chunk_size=chunk_size),
+            TransactionArchive.objects.filter(account_id=account_id).order_by('timestamp', 'id')
+            .values_list(*fields).iterator(chunk_size=chunk_size),
+            key=lambda row: (row[1], row[0]),
+        )
+        for pk, timestamp, txn_type, amount, balance_after in rows:
+            day = timezone.localdate(timestamp)
+            if current is None or current.date != day:
+                current = DailyBalance(account_id=account_id, date=day, opening_balance=closing)
+                snapshots.append(current)
+            if txn_type in SNAPSHOT_FIELDS:
+                field = SNAPSHOT_FIELDS[txn_type]
+                setattr(current, field, getattr(current, field) + amount)
+            current.transaction_count += 1
+            current.closing_balance = closing = balance_after
+            current.last_transaction_id = pk
+
+        with transaction.atomic():
+            DailyBalance.objects.filter(account_id=account_id).delete()
+            DailyBalance.objects.bulk_create(snapshots, batch_size=chunk_size)
+        written += len(snapshots)
+    return written
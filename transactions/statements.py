@@ -0,0 +1,276 @@
+import csv
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from accounts.models import UserBankAccount
+from core.pdf import TextPdfWriter
+from .constants import (
+    TRANSACTION_TYPE, STATEMENT_PENDING, STATEMENT_RUNNING, STATEMENT_DONE, STATEMENT_FAILED, STATEMENT_PDF,
+)
+from .models import Transactions, TransactionArchive, StatementJob
+from .archive import reaches_archive, merge_history
+from .snapshots import day_bounds, opening_balance
+
+#* Monthly statements are files on disk under STATEMENT_ROOT/<account id>/<YYYY-MM>.<format>.
+#* A statement generated after its month ended is final and is never written
+#* again; the current month is regenerated every time it is asked for.
+
+CHUNK_SIZE = 2000
+# * a job still running after this is claimed again, its worker is gone
+STATEMENT_LEASE = timedelta(minutes=30)
+TYPE_NAMES = dict(TRANSACTION_TYPE)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def previous_month(today=None):
+    return month_start(month_start(today or timezone.localdate()) - timedelta(days=1))
+
+
+def month_end(month):
+    # * first moment of the next month, the statement covers [month start, this)
+    return day_bounds(month, next_month(month) - timedelta(days=1))[1]
+
+
+def statement_path(account_id, month, fmt):
+    return Path(settings.STATEMENT_ROOT) / str(account_id) / f'{month:%Y-%m}.{fmt}'
+
+
+def is_final(job):
+    """A statement generated after its month closed can not change any more."""
+    return (
+        job.status == STATEMENT_DONE
+        and job.generated_at is not None
+        and job.generated_at >= month_end(job.month)
+        and statement_path(job.account_id, job.month, job.format).exists()
+    )
+
+
+def is_stale(job, now=None):
+    return job.started_at is None or job.started_at < (now or timezone.now()) - STATEMENT_LEASE
+
+
+def enqueue_statement(account, month, fmt):
+    """
+    Ask for a statement. A final one is handed back as is, anything else is put
+    (back) in the queue for the worker.
+    """
+    month = month_start(month)
+    job, created = StatementJob.objects.get_or_create(account=account, month=month, format=fmt)
+    if created or is_final(job) or job.status == STATEMENT_PENDING:
+        return job
+    if job.status == STATEMENT_RUNNING and not is_stale(job):
+        return job
+    job.status = STATEMENT_PENDING
+    job.requested_at = timezone.now()
+    job.error = ''
+    job.save(update_fields=['status', 'requested_at', 'error'])
+    return job
+
+
+def _statement_lines(account, month):
+    """(kind, values) tuples: a header, one row per transaction streamed in chunks, a footer."""
+    start, end = day_bounds(month, next_month(month) - timedelta(days=1))
+    opening = opening_balance(account.pk, month)
+    yield 'header', (account.account_no, account.user.get_full_name() or account.user.username, f'{month:%B %Y}', opening)
+    fields = ['timestamp', 'id', 'transaction_type', 'amount', 'balance_after_transaction']
+    rows = (
+        Transactions.objects.filter(account=account, timestamp__gte=start, timestamp__lt=end)
+        .order_by('timestamp', 'id').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+    )
+    if reaches_archive(start):
+        archived = (
+            TransactionArchive.objects.filter(account=account, timestamp__gte=start, timestamp__lt=end)
+            .order_by('timestamp', 'id').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        )
+        rows = merge_history(rows, archived, key=lambda row: row[:2])
+    closing, count = opening, 0
+    for timestamp, pk, transaction_type, amount, balance in rows:
+        closing, count = balance, count + 1
+        yield 'row', (timezone.localtime(timestamp), TYPE_NAMES.get(transaction_type, ''), amount, balance)
+    yield 'footer', (closing, count)
+
+
+def _write_csv(out, lines):
+    writer = csv.writer(out)
+    for kind, values in lines:
+        if kind == 'header':
+            account_no, name, period, opening = values
+            writer.writerow(['account', account_no])
+            writer.writerow(['name', name])
+            writer.writerow(['period', period])
+            writer.writerow(['opening_balance', opening])
+            writer.writerow(['timestamp', 'type', 'amount', 'balance_after_transaction'])
+        elif kind == 'row':
+            timestamp, name, amount, balance = values
+            writer.writerow([timestamp.isoformat(), name, amount, balance])
+        else:
+            closing, count = values
+            writer.writerow(['closing_balance', closing])
+            writer.writerow(['transactions', count])
+
+
+def _write_pdf(out, lines, title):
+    pdf = TextPdfWriter(out, title=title)
+    for kind, values in lines:
+        if kind == 'header':
+            account_no, name, period, opening = values
+            pdf.write_line(f'PayLater statement - {period}')
+            pdf.write_line(f'Account {account_no}, {name}')
+            pdf.write_line()
+            pdf.write_line(f'Opening balance: {opening:>14,.2f}')
+            pdf.write_line()
+            pdf.write_line(f'{"Date":<18}{"Type":<20}{"Amount":>14}{"Balance":>16}')
+        elif kind == 'row':
+            timestamp, name, amount, balance = values
+            pdf.write_line(f'{timestamp:%Y-%m-%d %H:%M}  {name:<20}{amount:>14,.2f}{balance:>16,.2f}')
+        else:
+            closing, count = values
+            pdf.write_line()
+            pdf.write_line(f'Closing balance: {closing:>14,.2f}   ({count} transactions)')
+    pdf.close()
+
+
+def write_statement(account, month, fmt):
+    """
+    Stream the account's transactions for the month into its statement file.
+    The file is written next to its final path and renamed into place, so a
+    reader never sees half a statement. Returns the number of transactions.
+    """
+    path = statement_path(account.pk, month, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+
+    def counted(lines):
+        nonlocal count
+        for kind, values in lines:
+            if kind == 'footer':
+                count = values[1]
+            yield kind, values
+
+    lines = counted(_statement_lines(account, month))
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.part')
+    try:
+        if fmt == STATEMENT_PDF:
+            with os.fdopen(fd, 'wb') as out:
+                _write_pdf(out, lines, f'Statement {account.account_no} {month:%Y-%m}')
+        else:
+            with os.fdopen(fd, 'w', newline='') as out:
+                _write_csv(out, lines)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return count
+
+
+def generate(job):
+    """Write the job's file unless it is final already, and record the outcome on the job."""
+    if is_final(job):
+        return job
+    started = timezone.now()
+    try:
+        job.rows = write_statement(job.account, job.month, job.format)
+    except Exception as exc:
+        job.status = STATEMENT_FAILED
+        job.error = repr(exc)
+    else:
+        job.status = STATEMENT_DONE
+        job.generated_at = started
+        job.error = ''
+    job.save(update_fields=['status', 'rows', 'generated_at', 'error'])
+    return job
+
+
+def run_pending_jobs(batch_size=20):
+    """
+    Claim and generate one batch of queued statements. Returns (done, failed).
+    Jobs left running by a worker that died are claimed again after STATEMENT_LEASE.
+    """
+    now = timezone.now()
+    stale = Q(started_at__lt=now - STATEMENT_LEASE) | Q(started_at__isnull=True)
+    due = Q(status=STATEMENT_PENDING) | Q(stale, status=STATEMENT_RUNNING)
+    with transaction.atomic():
+        # * skip_locked lets several workers share the queue without picking the same jobs
+        jobs = list(
+            StatementJob.objects.select_for_update(skip_locked=True)
+            .filter(due).select_related('account__user')
+            .order_by('requested_at', 'id')[:batch_size]
+        )
+        StatementJob.objects.filter(pk__in=[job.pk for job in jobs]).update(status=STATEMENT_RUNNING, started_at=now)
+    done = failed = 0
+    for job in jobs:
+        if generate(job).status == STATEMENT_DONE:
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def pregenerate_chunk(account_ids, month, formats):
+    """
+    Make sure every account in account_ids has a final statement for month.
+    Returns (generated, skipped). Runs in the pool workers of generate_statements.
+    """
+    final = {
+        (job.account_id, job.format)
+        for job in StatementJob.objects.filter(account_id__in=account_ids, month=month, format__in=formats, status=STATEMENT_DONE)
+        if is_final(job)
+    }
+    generated = skipped = 0
+    accounts = UserBankAccount.objects.filter(pk__in=account_ids).select_related('user').order_by('pk')
+    for account in accounts:
+        for fmt in formats:
+            if (account.pk, fmt) in final:
+                skipped += 1
+                continue
+            job, created = StatementJob.objects.get_or_create(account=account, month=month, format=fmt)
+            job.account = account
+            generate(job)
+            generated += 1
+    return generated, skipped
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _pool_chunk(account_ids, month_iso, formats):
+    try:
+        return pregenerate_chunk(account_ids, date.fromisoformat(month_iso), formats)
+    finally:
+        connections.close_all()
+
+
+def pregenerate(month, formats, workers=None, chunk_size=500):
+    """
+    Generate the month's statements for every account, chunk_size accounts per
+    task over a pool of worker processes. Yields (generated, skipped) per chunk.
+    workers=0 runs the chunks in this process.
+    """
+    if month >= month_start(timezone.localdate()):
+        raise ValueError(f'{month:%Y-%m} has not ended yet')
+    ids = list(UserBankAccount.objects.order_by('pk').values_list('pk', flat=True))
+    chunks = [ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size)]
+    if workers == 0:
+        for chunk in chunks:
+            yield pregenerate_chunk(chunk, month, formats)
+        return
+    # * only the month end command needs a process pool, web workers never import it
+    from concurrent.futures import ProcessPoolExecutor
+    # * each process opens its own db connection, an inherited one can not be shared
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        yield from pool.map(_pool_chunk, chunks, [month.isoformat()] * len(chunks), [formats] * len(chunks))
@@ -1,3 +1,867 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserBankAccount
+from core.bank_state import invalidate_bank_state
+from core.idempotency import purge_expired
+from core.models import Bank, OutboundEmail, IdempotencyKey
+from core.testing import QueryBudgetMixin
+from .bulk import BulkRow, decide_loans, parse_transfer_file, run_bulk_transfer, OK, UNKNOWN_RECEIVER, INVALID_AMOUNT, INSUFFICIENT_FUNDS
+from .constants import (
+    DEPOSIT, WITHDRAWAL, LOAN, LOAN_PAID, TRANSFER_RECEIVED, LOAN_REQUESTED, LOAN_APPROVED, LOAN_REPAID, LOAN_REJECTED, MAX_OPEN_LOANS,
+    STATEMENT_PENDING, STATEMENT_RUNNING, STATEMENT_DONE,
+)
+from .ledger import (
+    deposit, withdraw, transfer, request_loan, approve_loan, reject_loan, repay_loan,
+    InsufficientFunds, InvalidLoanState, LoanLimitReached,
+)
+from .forms import TransferMoneyForm
+from .archive import archive_cutoff
+from .models import Transactions, TransactionArchive, TransferMoney, DailyBalance, Loan, Posting, AppendOnlyError, StatementJob
+from .postings import reconcile, unbalanced_entries
+from .snapshots import range_summary, backfill
+from .statements import STATEMENT_LEASE, enqueue_statement, is_final, pregenerate, run_pending_jobs, statement_path
+from .views import TransactionReportView
 
-# Create your tests here.
+
+def make_account(username, balance=0):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass')
+    return UserBankAccount.objects.create(
+        user=user,
+        account_type='Savings',
+        account_no=10000 + user.id,
+        birth_date=date(1990, 1, 1),
+        gender='Male',
+        balance=balance,
+    )
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.alice = make_account('alice', 1000)
+        self.bob = make_account('bob', 0)
+
+    def test_deposit_and_withdraw_record_transactions(self):
+        txn = deposit(self.alice, Decimal('250'))
+        self.assertEqual(txn.balance_after_transaction, Decimal('1250'))
+        txn = withdraw(self.alice, Decimal('1000'))
+        self.assertEqual(txn.balance_after_transaction, Decimal('250'))
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('250'))
+
+    def test_overdraft_is_rejected_without_side_effects(self):
+        with self.assertRaises(InsufficientFunds):
+            transfer(self.alice, self.bob, Decimal('1000.01'))
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.balance, self.bob.balance), (Decimal('1000'), Decimal('0')))
+
+    def test_loan_is_credited_once_and_paid_once(self):
+        loan = request_loan(self.bob, Decimal(500))
+        with self.assertRaises(InvalidLoanState):
+            repay_loan(loan)
+        approve_loan(loan)
+        with self.assertRaises(InvalidLoanState):
+            approve_loan(loan)
+        self.assertEqual(self.bob.open_loans, 1)
+        deposit(self.bob, Decimal('100'))
+        repay_loan(loan)
+        with self.assertRaises(InvalidLoanState):
+            repay_loan(loan)
+        loan.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(loan.status, LOAN_REPAID)
+        self.assertEqual((self.bob.balance, self.bob.open_loans), (Decimal('100'), 0))
+        self.assertEqual(
+            list(self.bob.transactions.values_list('transaction_type', flat=True)), [LOAN, DEPOSIT, LOAN_PAID]
+        )
+
+    def test_failed_repayment_leaves_the_loan_open(self):
+        loan = approve_loan(request_loan(self.bob, Decimal(500)))
+        withdraw(self.bob, Decimal(400))
+        with self.assertRaises(InsufficientFunds):
+            repay_loan(loan)
+        loan.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((loan.status, self.bob.open_loans), (LOAN_APPROVED, 1))
+
+    def test_rejected_loan_moves_no_money(self):
+        loan = reject_loan(request_loan(self.bob, Decimal(500)))
+        with self.assertRaises(InvalidLoanState):
+            approve_loan(loan)
+        loan.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((loan.status, self.bob.balance), (LOAN_REJECTED, Decimal(0)))
+        self.assertFalse(self.bob.transactions.exists())
+
+    def test_loan_limit_is_read_from_the_account(self):
+        for _ in range(MAX_OPEN_LOANS):
+            approve_loan(request_loan(self.bob, Decimal(100)))
+        with self.assertNumQueries(0):
+            with self.assertRaises(LoanLimitReached):
+                request_loan(self.bob, Decimal(100))
+
+
+class BulkTransferTests(TestCase):
+    def setUp(self):
+        self.payer = make_account('payer', 1000)
+        self.staff = [make_account(f'staff{i}') for i in range(3)]
+
+    def test_report_and_balances(self):
+        lines = ['receiver,amount']
+        lines += [f'{account.account_no},100' for account in self.staff]
+        lines += [f'{self.staff[0].account_no},50', '99999,10', f'{self.staff[1].account_no},-5']
+        rows = parse_transfer_file(io.StringIO('\n'.join(lines)), 'csv')
+
+        with self.assertNumQueries(34):
+            rows = run_bulk_transfer(self.payer, rows, chunk_size=2)
+
+        self.assertEqual(
+            [row.status for row in rows],
+            [OK, OK, OK, OK, UNKNOWN_RECEIVER, INVALID_AMOUNT],
+        )
+        self.payer.refresh_from_db()
+        self.staff[0].refresh_from_db()
+        self.assertEqual(self.payer.balance, Decimal('650'))
+        self.assertEqual(self.staff[0].balance, Decimal('150'))
+        self.assertEqual(TransferMoney.objects.count(), 4)
+        last = self.staff[0].transactions.filter(transaction_type=TRANSFER_RECEIVED).last()
+        self.assertEqual(last.balance_after_transaction, Decimal('150'))
+        # * one mail per receiver and chunk plus a summary for the payer
+        self.assertEqual(OutboundEmail.objects.count(), 5)
+
+    def test_chunk_over_balance_is_skipped(self):
+        data = '\n'.join(f'{{"receiver": {a.account_no}, "amount": 600}}' for a in self.staff[:2])
+        rows = run_bulk_transfer(self.payer, parse_transfer_file(io.StringIO(data), 'jsonl'), notify=False)
+        self.assertEqual([row.status for row in rows], [INSUFFICIENT_FUNDS, INSUFFICIENT_FUNDS])
+        self.payer.refresh_from_db()
+        self.assertEqual(self.payer.balance, Decimal('1000'))
+
+
+class BulkLoanDecisionTests(TestCase):
+    def setUp(self):
+        self.accounts = [make_account(f'user{i}', 100) for i in range(4)]
+        self.loans = [request_loan(account, Decimal(50 + i)) for account in self.accounts for i in range(2)]
+
+    def test_approve_in_chunks(self):
+        approve_loan(self.loans[0])
+        batches = list(decide_loans([loan.pk for loan in self.loans], LOAN_APPROVED, chunk_size=3))
+        self.assertEqual([(b.selected, b.decided) for b in batches], [(3, 2), (3, 3), (2, 2)])
+
+        for account in self.accounts:
+            account.refresh_from_db()
+            self.assertEqual((account.balance, account.open_loans), (Decimal(201), 2))
+        self.assertEqual(Loan.objects.filter(status=LOAN_APPROVED).count(), 8)
+        self.assertEqual(list(
+            self.accounts[0].transactions.order_by('pk').values_list('balance_after_transaction', flat=True)
+        ), [Decimal(150), Decimal(201)])
+        self.assertEqual(OutboundEmail.objects.filter(subject='Loan Approved').count(), 7)
+        self.assertEqual(range_summary(self.accounts[0], date.today(), date.today())['closing_balance'], Decimal(201))
+
+    def test_query_count_does_not_grow_with_the_chunk(self):
+        # * lock loans, claim, lock accounts, bulk credit, history + snapshots, mails, plus savepoints
+        with self.assertNumQueries(16):
+            list(decide_loans([loan.pk for loan in self.loans], LOAN_APPROVED))
+
+    def test_reject_moves_no_money(self):
+        out = io.StringIO()
+        call_command('decide_loans', 'reject', '--account', str(self.accounts[0].account_no), stdout=out, stderr=io.StringIO())
+        self.assertIn('batch 1: 2/2 rejected', out.getvalue())
+        self.assertEqual(Loan.objects.filter(status=LOAN_REJECTED).count(), 2)
+        self.accounts[0].refresh_from_db()
+        self.assertEqual(self.accounts[0].balance, Decimal(100))
+        self.assertFalse(Transactions.objects.exists())
+
+    def test_admin_approval_respects_the_freeze(self):
+        invalidate_bank_state()
+        self.addCleanup(invalidate_bank_state)
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pass')
+        self.client.force_login(admin_user)
+        loan = self.loans[0]
+        Bank.objects.create(is_frozen=True)
+        self.client.post(reverse('admin:transactions_loan_change', args=[loan.pk]), {
+            'account': loan.account_id, 'amount': loan.amount, 'status': LOAN_APPROVED,
+        })
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, LOAN_REQUESTED)
+        self.assertFalse(Transactions.objects.exists())
+
+        # * history rows are only written by the ledger
+        approve_loan(self.loans[1])
+        txn = Transactions.objects.get()
+        self.assertEqual(self.client.get(reverse('admin:transactions_transactions_add')).status_code, 403)
+        self.assertEqual(self.client.post(reverse('admin:transactions_transactions_delete', args=[txn.pk]), {'post': 'yes'}).status_code, 403)
+        self.assertTrue(Transactions.objects.filter(pk=txn.pk).exists())
+
+    def test_admin_can_not_rewrite_decided_loans(self):
+        admin_user = User.objects.create_superuser('root', 'root@example.com', 'pass')
+        self.client.force_login(admin_user)
+        loan = approve_loan(self.loans[0])
+        self.client.post(reverse('admin:transactions_loan_change', args=[loan.pk]), {
+            'account': self.accounts[1].pk, 'amount': 999, 'status': LOAN_APPROVED,
+        })
+        loan.refresh_from_db()
+        self.assertEqual((loan.account_id, loan.amount), (self.accounts[0].pk, Decimal(50)))
+        self.assertEqual(self.client.post(reverse('admin:transactions_loan_delete', args=[loan.pk]), {'post': 'yes'}).status_code, 403)
+
+        requested = self.loans[1]
+        self.client.post(reverse('admin:transactions_loan_delete', args=[requested.pk]), {'post': 'yes'})
+        self.assertFalse(Loan.objects.filter(pk=requested.pk).exists())
+        changelist = self.client.get(reverse('admin:transactions_loan_changelist'))
+        actions = [name for name, label in changelist.context['action_form'].fields['action'].choices]
+        self.assertNotIn('delete_selected', actions)
+
+
+class PostingLedgerTests(TestCase):
+    def setUp(self):
+        self.alice = make_account('alice')
+        self.bob = make_account('bob')
+
+    def test_every_movement_is_a_balanced_entry(self):
+        deposit(self.alice, Decimal(1000))
+        withdraw(self.alice, Decimal(100))
+        transfer(self.alice, self.bob, Decimal(300))
+        loan = approve_loan(request_loan(self.bob, Decimal(500)))
+        repay_loan(loan)
+        rows = [BulkRow(1, self.bob.account_no, Decimal(50))]
+        run_bulk_transfer(self.alice, rows, notify=False)
+
+        self.assertEqual(Posting.objects.count(), 12)
+        self.assertEqual(list(unbalanced_entries()), [])
+        self.assertEqual(list(reconcile()), [])
+        self.assertEqual(sum(self.alice.postings.values_list('amount', flat=True)), Decimal(550))
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        deposit(self.alice, Decimal(1000))
+        deposit(self.bob, Decimal(200))
+        UserBankAccount.objects.filter(pk=self.bob.pk).update(balance=Decimal(999))
+        drifts = list(reconcile())
+        self.assertEqual([(d.account_no, d.stored, d.computed) for d in drifts], [(self.bob.account_no, Decimal(999), Decimal(200))])
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_ledger', stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('reconcile_ledger', '--repair', stdout=io.StringIO(), stderr=io.StringIO())
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.balance, Decimal(200))
+
+    def test_reconcile_query_count_is_fixed(self):
+        for i in range(20):
+            deposit(make_account(f'user{i}'), Decimal(100))
+        with self.assertNumQueries(4):
+            self.assertEqual(list(reconcile(chunk_size=7)), [])
+
+    def test_postings_are_append_only(self):
+        deposit(self.alice, Decimal(100))
+        posting = Posting.objects.first()
+        with self.assertRaises(AppendOnlyError):
+            posting.save()
+        with self.assertRaises(AppendOnlyError):
+            posting.delete()
+        with self.assertRaises(AppendOnlyError):
+            Posting.objects.update(amount=0)
+
+
+class DailyBalanceTests(TestCase):
+    def setUp(self):
+        self.alice = make_account('alice', 0)
+        self.bob = make_account('bob', 0)
+        deposit(self.alice, Decimal('500'))
+        withdraw(self.alice, Decimal('120'))
+        transfer(self.alice, self.bob, Decimal('80'))
+
+    def test_snapshot_follows_writes(self):
+        snapshot = DailyBalance.objects.get(account=self.alice)
+        self.assertEqual(snapshot.opening_balance, 0)
+        self.assertEqual(snapshot.closing_balance, Decimal('300'))
+        self.assertEqual((snapshot.deposits, snapshot.withdrawals, snapshot.transfers_sent), (500, 120, 80))
+        self.assertEqual(snapshot.transaction_count, 3)
+
+    def test_range_summary_and_backfill_agree(self):
+        today = DailyBalance.objects.get(account=self.alice).date
+        live = range_summary(self.alice, today, today)
+        self.assertEqual(live['total'], Decimal('700'))
+        DailyBalance.objects.all().delete()
+        self.assertEqual(backfill(), 2)
+        self.assertEqual(range_summary(self.alice, today, today), live)
+
+
+class ReportPaginationTests(TestCase):
+    def setUp(self):
+        self.account = make_account('alice', 0)
+        for i in range(7):
+            deposit(self.account, Decimal(100 + i))
+        self.client.force_login(self.account.user)
+
+    def test_pages_cover_history_once(self):
+        seen = []
+        url = reverse('transaction_report')
+        with mock.patch.object(TransactionReportView, 'page_size', 3):
+            while url:
+                response = self.client.get(url)
+                seen += [t.amount for t in response.context['object_list']]
+                url = response.context['next_url']
+        self.assertEqual(seen, [Decimal(100 + i) for i in range(7)])
+
+    def test_streaming_export(self):
+        response = self.client.get(reverse('transaction_export'), {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 8)
+        response = self.client.get(reverse('transaction_export'), {'format': 'json'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['amount'] for row in rows], [f'{100 + i}.00' for i in range(7)])
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        invalidate_bank_state()
+        cache.clear()
+        self.account = make_account('alice', 0)
+        for i in range(3):
+            deposit(self.account, Decimal(100 + i))
+        self.client.force_login(self.account.user)
+
+    def get(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_cached_report_skips_the_page_query(self):
+        for params in ({}, {'start_date': '2020-01-01', 'end_date': '2100-01-01'}):
+            first, cold = self.get('transaction_report', **params)
+            second, warm = self.get('transaction_report', **params)
+            self.assertLess(warm, cold)
+            self.assertContains(second, '102.00')
+            self.assertEqual(first.content, second.content)
+
+    def test_account_change_shows_up(self):
+        self.get('transaction_report')
+        deposit(self.account, Decimal(777))
+        response, _ = self.get('transaction_report')
+        self.assertContains(response, '777.00')
+
+    def test_disabled(self):
+        _, cold = self.get('loan_list')
+        with override_settings(PAGE_CACHE_ENABLED=False):
+            _, uncached = self.get('loan_list')
+        self.assertEqual(uncached, cold)
+
+    def test_failed_payment_gets_a_new_pay_link(self):
+        loan = approve_loan(request_loan(self.account, Decimal(5000)))
+        withdraw(self.account, Decimal(5000))
+        first, _ = self.get('loan_list')
+        link = first.content.decode().split('idempotency_key=')[1].split("'")[0]
+        self.assertContains(self.get('loan_list')[0], link)
+        self.client.get(reverse('pay', args=[loan.pk]), {'idempotency_key': link})
+        second, _ = self.get('loan_list')
+        self.assertNotIn(link, second.content.decode())
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        invalidate_bank_state()
+        cache.clear() # rate limit buckets of earlier tests
+        self.alice = make_account('alice', 5000)
+        self.bob = make_account('bob', 0)
+        for i in range(5):
+            deposit(self.alice, Decimal(100))
+        self.client.force_login(self.alice.user)
+
+    def test_every_url_declares_a_budget(self):
+        from . import urls
+        self.assertAllUrlsBudgeted(urls.urlpatterns)
+
+    def test_pages(self):
+        for name in ['deposit_money', 'withdraw_money', 'transfer', 'loan_request', 'loan_list',
+                     'transaction_report', 'transaction_export', 'bulk_transfer', 'received_transfers']:
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Server-Timing', response)
+            self.assertWithinQueryBudget(response)
+        response = self.client.get(reverse('transaction_report'), {'start_date': '2020-01-01', 'end_date': '2030-12-31'})
+        self.assertWithinQueryBudget(response)
+
+    def test_money_moving_posts(self):
+        posts = [
+            ('deposit_money', {'amount': 200, 'transaction_type': DEPOSIT}),
+            ('withdraw_money', {'amount': 500, 'transaction_type': WITHDRAWAL}),
+            ('transfer', {'receiver': self.bob.account_no, 'amount': 100}),
+            ('loan_request', {'amount': 100}),
+        ]
+        for name, data in posts:
+            response = self.client.post(reverse(name), data)
+            self.assertEqual(response.status_code, 302, name)
+            self.assertWithinQueryBudget(response)
+
+        loan = Loan.objects.get()
+        approve_loan(loan)
+        response = self.client.get(reverse('pay', args=[loan.pk]))
+        self.assertWithinQueryBudget(response)
+
+    def test_kill_switch_blocks_money_movement(self):
+        Bank.objects.create(is_frozen=True)
+        posts = [
+            ('withdraw_money', {'amount': 500, 'transaction_type': WITHDRAWAL}),
+            ('transfer', {'receiver': self.bob.account_no, 'amount': 100}),
+            ('loan_request', {'amount': 100}),
+        ]
+        for name, data in posts:
+            response = self.client.post(reverse(name), data)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertContains(response, 'temporarily suspended')
+        # * deposits still go through
+        response = self.client.post(reverse('deposit_money'), {'amount': 200, 'transaction_type': DEPOSIT})
+        self.assertEqual(response.status_code, 302)
+
+
+class TransferReceiverTests(TestCase):
+    def setUp(self):
+        invalidate_bank_state()
+        cache.clear()
+        self.alice = make_account('alice', 1000)
+        self.bob = make_account('bob', 0)
+        self.client.force_login(self.alice.user)
+
+    def test_form_lookup_is_reused_by_the_view(self):
+        response = self.client.post(reverse('transfer'), {'receiver': self.bob.account_no, 'amount': 100})
+        self.assertEqual(response.status_code, 302)
+        transfer_row = TransferMoney.objects.get()
+        self.assertEqual((transfer_row.sender, transfer_row.receiver), (self.alice, self.bob))
+        self.assertEqual(self.bob.money_received.count(), 1)
+
+        form = TransferMoneyForm({'receiver': self.bob.account_no, 'amount': 100}, sender=self.alice)
+        self.assertTrue(form.is_valid())
+        # * the view sends the receiver email from this instance
+        with self.assertNumQueries(0):
+            self.assertEqual(form.cleaned_data['receiver'].user.email, 'bob@example.com')
+
+    def test_unknown_receiver(self):
+        response = self.client.post(reverse('transfer'), {'receiver': 999999, 'amount': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Account not found!')
+        self.assertFalse(TransferMoney.objects.exists())
+
+    def test_received_transfers_page(self):
+        transfer(self.alice, self.bob, Decimal(40))
+        make_account('carol')
+        self.client.force_login(self.bob.user)
+        response = self.client.get(reverse('received_transfers'))
+        self.assertContains(response, str(self.alice.account_no))
+        self.assertEqual([row.amount for row in response.context['transfers']], [Decimal(40)])
+        self.client.force_login(self.alice.user)
+        self.assertEqual(list(self.client.get(reverse('received_transfers')).context['transfers']), [])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        invalidate_bank_state()
+        cache.clear()
+        self.alice = make_account('alice', 1000)
+        self.bob = make_account('bob', 0)
+        self.client.force_login(self.alice.user)
+
+    def test_retried_posts_move_money_once(self):
+        posts = [
+            ('deposit_money', {'amount': 200, 'transaction_type': DEPOSIT}),
+            ('withdraw_money', {'amount': 500, 'transaction_type': WITHDRAWAL}),
+            ('transfer', {'receiver': self.bob.account_no, 'amount': 100}),
+        ]
+        for name, data in posts:
+            first = self.client.post(reverse(name), data, headers={'Idempotency-Key': f'key-{name}'})
+            retry = self.client.post(reverse(name), data, headers={'Idempotency-Key': f'key-{name}'})
+            self.assertEqual(first.status_code, 302)
+            self.assertEqual((retry.status_code, retry['Location']), (302, first['Location']))
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('600'))
+
+    def test_form_token_and_loan_payment(self):
+        loan = approve_loan(request_loan(self.alice, Decimal(100)))
+        url = reverse('pay', args=[loan.pk])
+        self.client.get(url, {'idempotency_key': 'pay-1'})
+        response = self.client.get(url, {'idempotency_key': 'pay-1'})
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('1000'))
+
+    def test_rejected_request_frees_the_key(self):
+        data = {'amount': 5000, 'transaction_type': WITHDRAWAL, 'idempotency_key': 'k'}
+        self.assertEqual(self.client.post(reverse('withdraw_money'), data).status_code, 200)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        data['amount'] = 500
+        self.assertEqual(self.client.post(reverse('withdraw_money'), data).status_code, 302)
+
+    def test_in_flight_and_mismatched_keys(self):
+        IdempotencyKey.objects.create(user=self.alice.user, key='busy', path=reverse('deposit_money'))
+        data = {'amount': 200, 'transaction_type': DEPOSIT}
+        self.assertEqual(self.client.post(reverse('deposit_money'), data, headers={'Idempotency-Key': 'busy'}).status_code, 409)
+        self.assertEqual(self.client.post(reverse('transfer'), data, headers={'Idempotency-Key': 'busy'}).status_code, 422)
+
+    def test_abandoned_claim_is_taken_over_after_its_lease(self):
+        IdempotencyKey.objects.create(user=self.alice.user, key='dead', path=reverse('deposit_money'))
+        IdempotencyKey.objects.update(claimed_at=timezone.now() - timedelta(seconds=301))
+        data = {'amount': 200, 'transaction_type': DEPOSIT}
+        self.assertEqual(self.client.post(reverse('deposit_money'), data, headers={'Idempotency-Key': 'dead'}).status_code, 302)
+        self.assertTrue(IdempotencyKey.objects.get(key='dead').completed)
+        retry = self.client.post(reverse('deposit_money'), data, headers={'Idempotency-Key': 'dead'})
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('1200'))
+
+    def test_purge(self):
+        IdempotencyKey.objects.create(user=self.alice.user, key='old', path='/')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        IdempotencyKey.objects.create(user=self.alice.user, key='new', path='/')
+        self.assertEqual(purge_expired(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class AsyncViewTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        invalidate_bank_state()
+        cache.clear()
+        self.alice = make_account('alice', 1000)
+        self.bob = make_account('bob', 0)
+        self.async_client.force_login(self.alice.user)
+
+    async def test_money_moves_through_the_async_views(self):
+        response = await self.async_client.post(reverse('async_deposit_money'), {'amount': 200, 'transaction_type': DEPOSIT})
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget(response)
+        response = await self.async_client.post(reverse('async_withdraw_money'), {'amount': 500, 'transaction_type': WITHDRAWAL})
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.post(reverse('async_transfer'), {'receiver': self.bob.account_no, 'amount': 100})
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget(response)
+
+        await self.alice.arefresh_from_db()
+        await self.bob.arefresh_from_db()
+        self.assertEqual((self.alice.balance, self.bob.balance), (Decimal('600'), Decimal('100')))
+        self.assertEqual(await OutboundEmail.objects.acount(), 4)
+
+        response = await self.async_client.get(reverse('async_transaction_report'))
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(len(response.context['object_list']), 3)
+
+    async def test_invalid_form_and_retry(self):
+        response = await self.async_client.post(reverse('async_withdraw_money'), {'amount': 5000, 'transaction_type': WITHDRAWAL})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+
+        data = {'amount': 200, 'transaction_type': DEPOSIT}
+        headers = {'Idempotency-Key': 'async-1'}
+        await self.async_client.post(reverse('async_deposit_money'), data, headers=headers)
+        response = await self.async_client.post(reverse('async_deposit_money'), data, headers=headers)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        await self.alice.arefresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('1200'))
+
+    async def test_login_required(self):
+        response = await AsyncClient().get(reverse('async_deposit_money'))
+        self.assertEqual(response.status_code, 302)
+
+
+class QueryPlanTests(TestCase):
+    # * below this size a full scan is legitimately the cheapest plan
+    row_threshold = 5000
+    accounts = 50
+    watched_tables = ('transactions_transactions', 'transactions_dailybalance', 'transactions_loan')
+
+    @classmethod
+    def setUpTestData(cls):
+        accounts = [make_account(f'user{i}', 1000) for i in range(cls.accounts)]
+        cls.account = accounts[0]
+        Transactions.objects.bulk_create(
+            Transactions(
+                account=accounts[i % cls.accounts], amount=10, balance_after_transaction=1000,
+                transaction_type=(DEPOSIT, LOAN)[i % 7 == 0],
+            )
+            for i in range(cls.row_threshold)
+        )
+        Loan.objects.bulk_create(
+            Loan(account=accounts[i % cls.accounts], amount=10, status=(LOAN_APPROVED, LOAN_REPAID)[i % 3 == 0])
+            for i in range(cls.row_threshold)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.account.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute('EXPLAIN ' + sql)
+            return [row[0] for row in cursor.fetchall()]
+
+    def assertNoFullScans(self, method, url, data=None, index_ordered=False):
+        with CaptureQueriesContext(connection) as ctx:
+            getattr(self.client, method)(url, data or {})
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(f'"{t}"' in sql for t in self.watched_tables):
+                continue
+            plan = self.explain(sql)
+            checked += 1
+            for line in plan:
+                full_scan = (
+                    line.startswith('SCAN') if connection.vendor == 'sqlite' else 'Seq Scan' in line
+                )
+                self.assertFalse(
+                    full_scan and any(t in line for t in self.watched_tables),
+                    f'{url} falls back to a full scan:\n{sql}\n' + '\n'.join(plan),
+                )
+                if index_ordered and '"transactions_transactions"' in sql:
+                    # * the history list must come out of the index already sorted
+                    sort = 'TEMP B-TREE' in line if connection.vendor == 'sqlite' else 'Sort' in line
+                    self.assertFalse(sort, f'{url} sorts in memory:\n{sql}\n' + '\n'.join(plan))
+        self.assertGreater(checked, 0, f'no watched queries ran for {url}')
+
+    def test_report(self):
+        self.assertNoFullScans('get', reverse('transaction_report'), index_ordered=True)
+
+    def test_report_date_range(self):
+        self.assertNoFullScans('get', reverse('transaction_report'), {'start_date': '2020-01-01', 'end_date': '2030-12-31'}, index_ordered=True)
+
+    def test_report_next_page(self):
+        first = self.client.get(reverse('transaction_report'))
+        self.assertNoFullScans('get', first.context['next_url'], index_ordered=True)
+
+    def test_loan_list(self):
+        self.assertNoFullScans('get', reverse('loan_list'))
+
+    def test_loan_request_limit_check(self):
+        # * the limit comes from UserBankAccount.open_loans, the loan table is only written to
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('loan_request'), {'amount': 100})
+        reads = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and '"transactions_loan"' in q['sql']]
+        self.assertEqual(reads, [])
+        self.assertEqual(Loan.objects.filter(account=self.account).count(), self.row_threshold // self.accounts + 1)
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    threads = 8
+    rounds = 25
+
+    def setUp(self):
+        # * deferred sqlite transactions fail with "database is locked" instead of waiting
+        options = connection.settings_dict['OPTIONS']
+        if connection.vendor == 'sqlite' and options.get('transaction_mode') != 'IMMEDIATE':
+            self.skipTest('concurrent writers need postgres or sqlite with transaction_mode IMMEDIATE')
+
+    def run_concurrently(self, work):
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(self.rounds):
+                    work(n, i)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(self.threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_no_lost_updates_under_concurrent_deposits(self):
+        account = make_account('alice', 0)
+
+        def work(n, i):
+            deposit(UserBankAccount.objects.get(pk=account.pk), Decimal('1'))
+
+        self.run_concurrently(work)
+        account.refresh_from_db()
+        self.assertEqual(account.balance, self.threads * self.rounds)
+        self.assertEqual(account.transactions.count(), self.threads * self.rounds)
+
+    def test_opposite_transfers_conserve_money(self):
+        alice = make_account('alice', 1000)
+        bob = make_account('bob', 1000)
+
+        def work(n, i):
+            # * half the threads send alice -> bob, the other half bob -> alice
+            sender, receiver = (alice, bob) if n % 2 else (bob, alice)
+            sender = UserBankAccount.objects.get(pk=sender.pk)
+            receiver = UserBankAccount.objects.get(pk=receiver.pk)
+            try:
+                transfer(sender, receiver, Decimal('7'))
+            except InsufficientFunds:
+                pass
+
+        self.run_concurrently(work)
+        alice.refresh_from_db()
+        bob.refresh_from_db()
+        self.assertEqual(alice.balance + bob.balance, Decimal('2000'))
+        self.assertGreaterEqual(min(alice.balance, bob.balance), 0)
+
+
+class StatementTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(STATEMENT_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.alice = make_account('alice')
+        self.last_month = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+        deposit(self.alice, Decimal(300))
+        Transactions.objects.update(timestamp=timezone.make_aware(datetime.combine(self.last_month, datetime.min.time()).replace(hour=12)))
+        backfill()
+        deposit(self.alice, Decimal(50))
+
+    def test_request_queues_a_job_the_worker_writes(self):
+        self.client.force_login(self.alice.user)
+        response = self.client.post(reverse('statements'), {'month': f'{self.last_month:%Y-%m}', 'format': 'csv'})
+        self.assertRedirects(response, reverse('statements'))
+        job = StatementJob.objects.get()
+        self.assertEqual(job.status, STATEMENT_PENDING)
+
+        self.assertEqual(run_pending_jobs(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows), (STATEMENT_DONE, 1))
+        lines = statement_path(self.alice.pk, self.last_month, 'csv').read_text().splitlines()
+        self.assertEqual(lines[-2:], ['closing_balance,300.00', 'transactions,1'])
+
+        response = self.client.get(reverse('statement_download', args=[job.pk]))
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), lines)
+        self.client.force_login(make_account('bob').user)
+        self.assertEqual(self.client.get(reverse('statement_download', args=[job.pk])).status_code, 404)
+
+    def test_jobs_of_a_dead_worker_are_claimed_again(self):
+        job = enqueue_statement(self.alice, self.last_month, 'csv')
+        StatementJob.objects.filter(pk=job.pk).update(status=STATEMENT_RUNNING, started_at=timezone.now())
+        self.assertEqual(enqueue_statement(self.alice, self.last_month, 'csv').status, STATEMENT_RUNNING)
+        self.assertEqual(run_pending_jobs(), (0, 0))
+
+        StatementJob.objects.update(started_at=timezone.now() - STATEMENT_LEASE - timedelta(minutes=1))
+        self.assertEqual(enqueue_statement(self.alice, self.last_month, 'csv').status, STATEMENT_PENDING)
+        StatementJob.objects.update(status=STATEMENT_RUNNING)
+        self.assertEqual(run_pending_jobs(), (1, 0))
+        self.assertEqual(StatementJob.objects.get().status, STATEMENT_DONE)
+
+    def test_closed_months_are_never_recomputed(self):
+        job = enqueue_statement(self.alice, self.last_month, 'pdf')
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertTrue(is_final(job))
+
+        with mock.patch('transactions.statements.write_statement') as write:
+            self.assertEqual(enqueue_statement(self.alice, self.last_month, 'pdf').status, STATEMENT_DONE)
+            self.assertEqual(run_pending_jobs(), (0, 0))
+            self.assertEqual(list(pregenerate(self.last_month, ['pdf'], workers=0)), [(0, 1)])
+        write.assert_not_called()
+
+    def test_current_month_is_regenerated(self):
+        this_month = timezone.localdate().replace(day=1)
+        job = enqueue_statement(self.alice, this_month, 'csv')
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertFalse(is_final(job))
+        self.assertEqual(enqueue_statement(self.alice, this_month, 'csv').status, STATEMENT_PENDING)
+        with self.assertRaises(ValueError):
+            list(pregenerate(this_month, ['csv'], workers=0))
+
+    def test_pregenerate_command(self):
+        make_account('bob')
+        out = io.StringIO()
+        call_command('generate_statements', '--month', f'{self.last_month:%Y-%m}', '--workers', '0', stdout=out, stderr=io.StringIO())
+        self.assertIn('4 generated, 0 already final', out.getvalue())
+        self.assertTrue(statement_path(self.alice.pk, self.last_month, 'pdf').read_bytes().startswith(b'%PDF'))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = make_account('alice')
+        for i in range(5):
+            deposit(self.alice, Decimal(100 + i))
+        # * the first three are from well before the archive cutoff
+        self.old = archive_cutoff() - timedelta(days=40)
+        for i, txn in enumerate(Transactions.objects.order_by('id')[:3]):
+            Transactions.objects.filter(pk=txn.pk).update(timestamp=self.old + timedelta(hours=i))
+        backfill()
+        self.client.force_login(self.alice.user)
+
+    def archive(self, *args):
+        out = io.StringIO()
+        call_command('archive_transactions', *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def amounts(self, response):
+        return [t.amount for t in response.context['object_list']]
+
+    def test_old_rows_move_in_chunks(self):
+        ids = list(Transactions.objects.order_by('id').values_list('id', flat=True))
+        snapshots = list(DailyBalance.objects.values_list('date', 'closing_balance', 'transaction_count'))
+        self.assertIn('3 rows', self.archive('--chunk-size', '2'))
+        self.assertEqual(list(TransactionArchive.objects.order_by('id').values_list('id', flat=True)), ids[:3])
+        self.assertEqual(list(Transactions.objects.order_by('id').values_list('id', flat=True)), ids[3:])
+        self.assertIn('0 rows', self.archive())
+
+        # * the snapshots rebuilt from both tables come out the same
+        backfill()
+        self.assertEqual(list(DailyBalance.objects.values_list('date', 'closing_balance', 'transaction_count')), snapshots)
+
+    def test_months_below_the_setting_are_refused(self):
+        with override_settings(TRANSACTION_ARCHIVE_MONTHS=6), self.assertRaises(CommandError):
+            self.archive('--months', '3')
+        self.assertEqual(TransactionArchive.objects.count(), 0)
+
+    def test_report_pages_over_both_tables(self):
+        self.archive()
+        seen = []
+        url = reverse('transaction_report')
+        with mock.patch.object(TransactionReportView, 'page_size', 2):
+            while url:
+                response = self.client.get(url)
+                seen += self.amounts(response)
+                url = response.context['next_url']
+        self.assertEqual(seen, [Decimal(100 + i) for i in range(5)])
+
+        old = timezone.localdate(self.old)
+        response = self.client.get(reverse('transaction_report'), {'start_date': old, 'end_date': old})
+        self.assertEqual(self.amounts(response), [Decimal(100), Decimal(101), Decimal(102)])
+
+    def test_recent_ranges_do_not_read_the_archive(self):
+        self.archive()
+        today = timezone.localdate()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('transaction_report'), {'start_date': today, 'end_date': today})
+        self.assertEqual(self.amounts(response), [Decimal(103), Decimal(104)])
+        self.assertFalse([q for q in queries if 'transactionarchive' in q['sql']])
+
+    def test_export_and_statement_include_archived_rows(self):
+        self.archive()
+        response = self.client.get(reverse('transaction_export'), {'format': 'json'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['amount'] for row in rows], [f'{100 + i}.00' for i in range(5)])
+
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        month = timezone.localdate(self.old).replace(day=1)
+        with override_settings(STATEMENT_ROOT=root):
+            list(pregenerate(month, ['csv'], workers=0))
+            lines = statement_path(self.alice.pk, month, 'csv').read_text().splitlines()
+        self.assertEqual(lines[-1], 'transactions,3')
@@ -1,15 +1,36 @@
 from django.urls import path
-from .views import DepositMoneyView, WithdrawMoneyView, TransactionReportView,LoanRequestView,LoanListView,PayLoanView, TransferMoneyView
+from core.middleware import query_budget
+from core.ratelimit import rate_limit
+from core.replicas import read_from_replica
+from .async_views import AsyncDepositMoneyView, AsyncWithdrawMoneyView, AsyncTransferMoneyView, AsyncTransactionReportView
+from .views import DepositMoneyView, WithdrawMoneyView, TransactionReportView,LoanRequestView,LoanListView,PayLoanView, TransferMoneyView, ReceivedTransferListView, BulkTransferView, TransactionExportView, StatementView, StatementDownloadView
 
 
 # app_name = 'transactions'
+#* query_budget: ei url koyta query chalate pare, beshi hole QueryCountMiddleware log kore / test fail kore
+#* headroom policy: kono headroom nai, budget = QUERY_BUDGET_STRICT=true diye test suite e mapa worst case.
+#* notun query lagle same commit e budget barano ar niche karon lekha; N+1 jate shathe shathe dhora pore
+#* taka move kora url e Idempotency-Key thakle aro 4-6 ta query lage, mara claim ta lease por take over korle aro 3 ta
+#* report er range archive_cutoff er age theke shuru hole TransactionArchive er ekta query beshi
+#* rate_limit: user+ip proti token bucket, beshi hole form/db er age 429; async url gulo sync er bucket share kore
+#* read_from_replica: GET gulo replica theke pore, nijer write er por kichukkhon default theke
 urlpatterns = [
-    path("deposit/", DepositMoneyView.as_view(), name="deposit_money"),
-    path("report/", TransactionReportView.as_view(), name="transaction_report"),
-    path("withdraw/", WithdrawMoneyView.as_view(), name="withdraw_money"),
-    path("loan_request/", LoanRequestView.as_view(), name="loan_request"),
-    path("loans/", LoanListView.as_view(), name="loan_list"),
-    path("loans/<int:loan_id>/", PayLoanView.as_view(), name="pay"),
-    path("transfer/", TransferMoneyView.as_view(), name="transfer"),
-
-]
\ No newline at end of file
+    path("deposit/", rate_limit(query_budget(DepositMoneyView.as_view(), 25), '20/m', scope='deposit'), name="deposit_money"),
+    path("report/", read_from_replica(query_budget(TransactionReportView.as_view(), 9)), name="transaction_report"),
+    path("report/export/", read_from_replica(query_budget(TransactionExportView.as_view(), 4)), name="transaction_export"),
+    path("withdraw/", rate_limit(query_budget(WithdrawMoneyView.as_view(), 23), '20/m', scope='withdraw'), name="withdraw_money"),
+    path("loan_request/", rate_limit(query_budget(LoanRequestView.as_view(), 18), '5/m'), name="loan_request"),
+    path("loans/", read_from_replica(query_budget(LoanListView.as_view(), 6)), name="loan_list"),
+    path("loans/<int:loan_id>/", rate_limit(query_budget(PayLoanView.as_view(), 30), '10/m', methods=('GET', 'POST')), name="pay"),
+    path("transfer/", rate_limit(query_budget(TransferMoneyView.as_view(), 30), '10/m', scope='transfer'), name="transfer"),
+    path("transfer/received/", read_from_replica(query_budget(ReceivedTransferListView.as_view(), 6)), name="received_transfers"),
+    # * about 10 queries per chunk of CHUNK_SIZE rows
+    path("transfer/bulk/", rate_limit(query_budget(BulkTransferView.as_view(), 106), '2/m', burst=3), name="bulk_transfer"),
+    path("statements/", rate_limit(query_budget(StatementView.as_view(), 8), '10/h'), name="statements"),
+    path("statements/<int:job_id>/", query_budget(StatementDownloadView.as_view(), 4), name="statement_download"),
+    #* ASGI deploy er jonno async version, same form ar template
+    path("async/deposit/", rate_limit(query_budget(AsyncDepositMoneyView.as_view(), 25), '20/m', scope='deposit'), name="async_deposit_money"),
+    path("async/withdraw/", rate_limit(query_budget(AsyncWithdrawMoneyView.as_view(), 23), '20/m', scope='withdraw'), name="async_withdraw_money"),
+    path("async/transfer/", rate_limit(query_budget(AsyncTransferMoneyView.as_view(), 30), '10/m', scope='transfer'), name="async_transfer"),
+    path("async/report/", read_from_replica(query_budget(AsyncTransactionReportView.as_view(), 9)), name="async_transaction_report"),
+]
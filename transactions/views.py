@@ -3,35 +3,37 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.shortcuts import get_object_or_404, redirect
 from django.views import View
-from django.http import HttpResponse
-from django.views.generic import CreateView, ListView
-from transactions.constants import DEPOSIT, WITHDRAWAL,LOAN, LOAN_PAID
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views.generic import CreateView, ListView, FormView
+from transactions.constants import DEPOSIT, WITHDRAWAL, LOAN_APPROVED, STATEMENT_DONE
 from datetime import datetime
-from django.db.models import Sum
+import csv
+import json
 from transactions.forms import (
     DepositForm,
     WithdrawForm,
     LoanRequestForm,
-    TransferMoneyForm
+    TransferMoneyForm,
+    BulkTransferForm,
+    StatementForm,
 )
-from transactions.models import Transactions, TransferMoney
-from accounts.models import UserBankAccount
-from django.core.mail import EmailMessage, EmailMultiAlternatives
-from django.template.loader import render_to_string
+from transactions.models import Transactions, TransactionArchive, TransferMoney, Loan, StatementJob
+from accounts.middleware import refresh_account
+from transactions.ledger import deposit, withdraw, transfer, request_loan, repay_loan, InsufficientFunds, InvalidLoanState, LoanLimitReached
+from transactions.bulk import parse_transfer_file, run_bulk_transfer, OK
+from transactions.snapshots import range_summary, day_bounds
+from transactions.pagination import KeysetPaginationMixin, decode_cursor
+from transactions.archive import reaches_archive, merge_history
+from transactions.statements import enqueue_statement, statement_path
+from transactions.emails import send_transaction_email
+from core.account_cache import invalidate_account
+from core.idempotency import IdempotentMixin, new_idempotency_key
 
 
-def send_transaction_email(user, amount, subject, template):
-        message = render_to_string(template, {
-            'user' : user,
-            'amount' : amount,
-        })
-        send_email = EmailMultiAlternatives(subject, '', to=[user.email])
-        send_email.attach_alternative(message, "text/html")
-        send_email.send()
-
-class TransactionCreateMixin(LoginRequiredMixin, CreateView):
+class TransactionCreateMixin(LoginRequiredMixin, IdempotentMixin, CreateView):
     template_name = 'transactions/transaction_form.html'
     model = Transactions
     title = ''
@@ -40,7 +42,7 @@ class TransactionCreateMixin(LoginRequiredMixin, CreateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs.update({
-            'account': self.request.user.account
+            'account': self.request.account
         })
         return kwargs
 
@@ -63,23 +65,18 @@ class DepositMoneyView(TransactionCreateMixin):
 
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
-        account = self.request.user.account
+        account = self.request.account
         # if not account.initial_deposit_date:
         #     now = timezone.now()
         #     account.initial_deposit_date = now
-        account.balance += amount 
-        account.save(
-            update_fields=[
-                'balance'
-            ]
-        )
+        self.object = deposit(account, amount)
         messages.success(
             self.request,
             f'{"{:,.2f}".format(float(amount))}$ was deposited to your account.'
         )
 
         send_transaction_email(self.request.user, amount, "Deposit Message",'transactions/deposit_email.html')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 class WithdrawMoneyView(TransactionCreateMixin):
     form_class = WithdrawForm
@@ -92,10 +89,13 @@ class WithdrawMoneyView(TransactionCreateMixin):
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
 
-        self.request.user.account.balance -= form.cleaned_data.get('amount')
-        # balance = 300
-        # amount = 5000
-        self.request.user.account.save(update_fields=['balance'])
+        try:
+            self.object = withdraw(self.request.account, amount)
+        except InsufficientFunds:
+            #* clean_amount er pore onno request balance kome gele
+            refresh_account(self.request)
+            form.add_error('amount', 'You can not withdraw more than your account balance')
+            return self.form_invalid(form)
 
         messages.success(
             self.request,
@@ -103,21 +103,19 @@ class WithdrawMoneyView(TransactionCreateMixin):
         )
 
         send_transaction_email(self.request.user, amount, "Withdrawal Message",'transactions/withdraw_email.html')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
 class LoanRequestView(TransactionCreateMixin):
+    model = Loan
     form_class = LoanRequestForm
     title = 'Request For Loan'
- 
-    def get_initial(self):
-        initial = {'transaction_type': LOAN}
-        return initial
 
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
-        current_loan_count = Transactions.objects.filter(
-            account=self.request.user.account,transaction_type=3,loan_approve=True).count()
-        if current_loan_count >= 3:
+        try:
+            #* open_loans account er column, protibar loan gona lage na
+            self.object = request_loan(self.request.account, amount)
+        except LoanLimitReached:
             return HttpResponse("You have cross the loan limits")
         messages.success(
             self.request,
@@ -125,82 +123,119 @@ class LoanRequestView(TransactionCreateMixin):
         )
 
         send_transaction_email(self.request.user, amount, "Loan Request",'transactions/loan_email.html')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
     
-class TransactionReportView(LoginRequiredMixin, ListView):
+def get_date_range(request):
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+    if not (start_date_str and end_date_str):
+        return None
+    try:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    return start_date, end_date
+
+
+class TransactionReportView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = 'transactions/transaction_report.html'
     model = Transactions
     balance = 0 # filter korar pore ba age amar total balance ke show korbe
+    summary = None
     
     #Todo: a QuerySet is a representation of a database query. It allows you to interact with your database by abstracting the details of the SQL queries. QuerySets are used to retrieve, filter, and manipulate data from the database.
     def get_queryset(self):
-        queryset = super().get_queryset().filter(
-            account=self.request.user.account
-        )
-        start_date_str = self.request.GET.get('start_date')
-        end_date_str = self.request.GET.get('end_date')
-        
-        if start_date_str and end_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            
-            #* gte = greater than equal. lte = less than equal.
-            queryset = queryset.filter(timestamp__date__gte=start_date, timestamp__date__lte=end_date)
-            self.balance = Transactions.objects.filter(
-                timestamp__date__gte=start_date, timestamp__date__lte=end_date
-            ).aggregate(Sum('amount'))['amount__sum']
-            #Todo: aggregate method diye aggregate function(sum, min, max, avg) use kora jai.
+        queryset = self.filter_report(super().get_queryset())
+        if self.date_range:
+            #* DailyBalance snapshot theke total, protidin e ekta row tai transaction er sonkhya matter kore na
+            #* lazy, report fragment cache e thakle query hoy na
+            self.summary = SimpleLazyObject(lambda: range_summary(self.request.account, *self.date_range))
+            self.balance = SimpleLazyObject(lambda: self.summary['total'])
         else:
-            self.balance = self.request.user.account.balance
+            self.balance = self.request.account.balance
        
-        return queryset.distinct() # unique queryset hote hobe
+        #* puro history na, ek page (timestamp, id) cursor er pore theke
+        return self.lazy_paginate_keyset(queryset, *self.archived)
+
+    def filter_report(self, queryset):
+        queryset = queryset.filter(account=self.request.account)
+        self.date_range = get_date_range(self.request)
+        start = end = None
+        
+        if self.date_range:
+            #* gte = greater than equal. lte = less than equal.
+            start, end = day_bounds(*self.date_range)
+            queryset = queryset.filter(timestamp__gte=start, timestamp__lt=end)
+        self.archived = self.archive_for(start, end)
+        return queryset
+
+    def archive_for(self, start, end):
+        #* archive table e tokhoni jay jokhon range (ba cursor er porer page) archive_cutoff er age theke shuru
+        cursor = decode_cursor(self.request.GET.get(self.cursor_param))
+        if cursor and timezone.is_aware(cursor[0]) and (start is None or cursor[0] > start):
+            start = cursor[0]
+        if not reaches_archive(start):
+            return ()
+        archived = TransactionArchive.objects.filter(account=self.request.account)
+        if end is not None:
+            archived = archived.filter(timestamp__gte=start, timestamp__lt=end)
+        return (archived,)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
-            'account': self.request.user.account
+            'account': self.request.account,
+            'summary': self.summary,
         })
 
         return context
     
         
-class PayLoanView(LoginRequiredMixin, View):
+class PayLoanView(LoginRequiredMixin, IdempotentMixin, View):
+    #* pay link ta GET, tai GET er key o check hobe
+    idempotent_methods = ('GET', 'POST')
+
     def get(self, request, loan_id):
-        loan = get_object_or_404(Transactions, id=loan_id)
-        if loan.loan_approve:
-            user_account = loan.account
+        loan = get_object_or_404(Loan, id=loan_id, account=request.account)
+        # * repay_loan syncs the balance on this object, which is the one the templates show
+        loan.account = request.account
+        if loan.status == LOAN_APPROVED:
                 # Reduce the loan amount from the user's balance
                 # 5000, 500 + 5000 = 5500
                 # balance = 3000, loan = 5000
-            if loan.amount < user_account.balance:
-                user_account.balance -= loan.amount
-                loan.balance_after_transaction = user_account.balance
-                user_account.save()
-                loan.loan_approved = True
-                loan.transaction_type = LOAN_PAID
-                loan.save()
-                return redirect('loan_list')
-            else:
+            try:
+                repay_loan(loan)
+            except InsufficientFunds:
+                refresh_account(request)
                 messages.error(
             self.request,
             f'Loan amount is greater than available balance'
         )
+                #* cached loan list er pay link e ei key ache, retry korle shudhu replay hoto. version bump = notun key
+                invalidate_account(request.user.pk)
+            except InvalidLoanState:
+                messages.error(self.request, 'This loan is already paid')
 
         return redirect('loan_list')
 
 
-class LoanListView(LoginRequiredMixin,ListView):
-    model = Transactions
+class LoanListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    model = Loan
     template_name = 'transactions/loan_request.html'
     context_object_name = 'loans' # loan list ta ei loans context er moddhe thakbe
     
     def get_queryset(self):
-        user_account = self.request.user.account
-        queryset = Transactions.objects.filter(account=user_account,transaction_type=3)
-        print(queryset)
-        return queryset
+        user_account = self.request.account
+        queryset = Loan.objects.filter(account=user_account)
+        return self.lazy_paginate_keyset(queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['idempotency_key'] = new_idempotency_key()
+        return context
     
-class TransferMoneyView(LoginRequiredMixin,CreateView):
+class TransferMoneyView(LoginRequiredMixin, IdempotentMixin, CreateView):
     model = TransferMoney
     form_class = TransferMoneyForm
     template_name = 'transactions/transfer.html'
@@ -209,28 +244,26 @@ class TransferMoneyView(LoginRequiredMixin,CreateView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs.update({'sender' : self.request.user.account})
+        kwargs.update({'sender' : self.request.account})
         return kwargs
     
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
-        receiver = form.cleaned_data.get('receiver')
-        self.request.user.account.balance -= amount
-        self.request.user.account.save(update_fields=['balance'])
-
-        receiver_account = UserBankAccount.objects.get(account_no = receiver)
-        print(receiver_account)
-        receiver_account.balance += amount
-        receiver_account.save(update_fields=['balance'])   
+        receiver_account = form.cleaned_data.get('receiver')
+        try:
+            self.object = transfer(self.request.account, receiver_account, amount)
+        except InsufficientFunds:
+            refresh_account(self.request)
+            form.add_error('amount', 'Enter a valid amount!')
+            return self.form_invalid(form)
 
         messages.success(
             self.request,
-            f'Successfully sent {"{:,.2f}".format(float(amount))}$ to {receiver}.'
+            f'Successfully sent {"{:,.2f}".format(float(amount))}$ to {receiver_account.account_no}.'
         )
-        # print(receiver_account.user.email)
         send_transaction_email(self.request.user, amount, "Money Transferred",'transactions/transfer_email.html')
         send_transaction_email(receiver_account.user, amount, "Money Received!",'transactions/receiver_email.html')
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs) # template e context data pass kora
@@ -239,4 +272,120 @@ class TransferMoneyView(LoginRequiredMixin,CreateView):
         })
         return context
 
-    
\ No newline at end of file
+
+class ReceivedTransferListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    model = TransferMoney
+    template_name = 'transactions/received_transfers.html'
+    context_object_name = 'transfers'
+
+    def get_queryset(self):
+        queryset = TransferMoney.objects.filter(receiver=self.request.account).select_related('sender__user')
+        return self.paginate_keyset(queryset)
+
+
+class BulkTransferView(LoginRequiredMixin, IdempotentMixin, FormView):
+    form_class = BulkTransferForm
+    template_name = 'transactions/bulk_transfer.html'
+
+    def form_valid(self, form):
+        rows = parse_transfer_file(form.cleaned_data['file'], form.file_format)
+        rows = run_bulk_transfer(self.request.account, rows)
+        report = [row.as_dict() for row in rows]
+        summary = {
+            'total': len(report),
+            'ok': sum(1 for row in report if row['status'] == OK),
+        }
+        summary['failed'] = summary['total'] - summary['ok']
+        if self.request.GET.get('format') == 'json':
+            response = JsonResponse({'summary': summary, 'rows': report})
+        else:
+            response = self.render_to_response(self.get_context_data(form=form, report=report, summary=summary))
+        response.bulk_completed = True
+        return response
+
+    def is_idempotent_success(self, response):
+        # * the report page is the success response here, a replay shows the same report
+        return getattr(response, 'bulk_completed', False)
+
+
+class Echo:
+    # * csv.writer needs a file, this one just hands each line back to the generator
+    def write(self, value):
+        return value
+
+
+class TransactionExportView(LoginRequiredMixin, View):
+    chunk_size = 2000
+    fields = ['id', 'timestamp', 'transaction_type', 'amount', 'balance_after_transaction']
+
+    def get(self, request):
+        queryset = Transactions.objects.filter(account=request.account).order_by('timestamp', 'id')
+        date_range = get_date_range(request)
+        start = None
+        if date_range:
+            start, end = day_bounds(*date_range)
+            queryset = queryset.filter(timestamp__gte=start, timestamp__lt=end)
+        rows = queryset.values_list(*self.fields).iterator(chunk_size=self.chunk_size)
+        if reaches_archive(start):
+            archived = TransactionArchive.objects.filter(account=request.account).order_by('timestamp', 'id')
+            if date_range:
+                archived = archived.filter(timestamp__gte=start, timestamp__lt=end)
+            archived = archived.values_list(*self.fields).iterator(chunk_size=self.chunk_size)
+            rows = merge_history(rows, archived, key=lambda row: (row[1], row[0]))
+
+        if request.GET.get('format') == 'json':
+            response = StreamingHttpResponse(self.stream_json(rows), content_type='application/json')
+            filename = 'transactions.json'
+        else:
+            response = StreamingHttpResponse(self.stream_csv(rows), content_type='text/csv')
+            filename = 'transactions.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def stream_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fields)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def stream_json(self, rows):
+        yield '['
+        separator = ''
+        for row in rows:
+            record = dict(zip(self.fields, row))
+            record['timestamp'] = record['timestamp'].isoformat()
+            record['amount'] = str(record['amount'])
+            record['balance_after_transaction'] = str(record['balance_after_transaction'])
+            yield separator + json.dumps(record)
+            separator = ','
+        yield ']'
+
+
+class StatementView(LoginRequiredMixin, FormView):
+    form_class = StatementForm
+    template_name = 'transactions/statements.html'
+    success_url = reverse_lazy('statements')
+
+    def form_valid(self, form):
+        #* file ta ekhane banay na, run_statement_jobs worker banabe
+        job = enqueue_statement(self.request.account, form.cleaned_data['month'], form.cleaned_data['format'])
+        if job.status == STATEMENT_DONE:
+            messages.success(self.request, f'Your statement for {job.month:%B %Y} is ready.')
+        else:
+            messages.success(self.request, f'Your statement for {job.month:%B %Y} is being generated.')
+        return super().form_valid(form)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['jobs'] = StatementJob.objects.filter(account=self.request.account)[:24]
+        return context
+
+
+class StatementDownloadView(LoginRequiredMixin, View):
+    def get(self, request, job_id):
+        job = get_object_or_404(StatementJob, id=job_id, account=request.account, status=STATEMENT_DONE)
+        path = statement_path(job.account_id, job.month, job.format)
+        if not path.exists():
+            raise Http404('Statement file is missing')
+        return FileResponse(path.open('rb'), as_attachment=True, filename=f'statement-{job.month:%Y-%m}.{job.format}')
+